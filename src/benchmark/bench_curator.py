@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比 BeautifulSoup 与 lxml 两种HTML清理器的整理耗时，并检查生成的 Markdown 是否一致
+
+语料默认取知识库页面存储中的页面，也可以用 --html-dir 指定一个 .html 文件目录作为固定语料。
+
+python src/benchmark/bench_curator.py --db-name cesium --limit 500
+python src/benchmark/bench_curator.py --db-name cesium --html-dir /path/to/html
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.database.curator import LXML_AVAILABLE, PageCurator
+
+logger = Logger("bench_curator")
+
+
+def load_corpus(curator: PageCurator, html_dir: str = None, limit: int = None):
+    """读取语料，返回 [(名称, HTML字符串), ...]"""
+    pages = []
+    if html_dir:
+        for name in sorted(os.listdir(html_dir)):
+            if name.endswith(('.html', '.htm')):
+                with open(os.path.join(html_dir, name), 'rb') as f:
+                    pages.append((name, f.read().decode('utf-8', errors='ignore')))
+            if limit and len(pages) >= limit:
+                break
+    else:
+        for url, content in curator.store.iter_pages(unique=True):
+            pages.append((url, content.decode('utf-8', errors='ignore')))
+            if limit and len(pages) >= limit:
+                break
+    return pages
+
+
+def bench_cleaner(curator: PageCurator, clean, pages, repeat: int):
+    """返回 (每页清理耗时, 每页清理+转换耗时, Markdown列表)，耗时取 repeat 次中的最小值"""
+    clean_times, total_times, markdowns = [], [], []
+    for _, html in pages:
+        best_clean, best_total = float('inf'), float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cleaned = clean(html)
+            cleaned_at = time.perf_counter()
+            markdown = curator.html_to_markdown(cleaned)
+            end = time.perf_counter()
+            best_clean = min(best_clean, cleaned_at - start)
+            best_total = min(best_total, end - start)
+        clean_times.append(best_clean)
+        total_times.append(best_total)
+        markdowns.append(markdown)
+    return clean_times, total_times, markdowns
+
+
+def normalize(markdown: str) -> str:
+    return ' '.join(markdown.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML清理器基准测试")
+    parser.add_argument("--db-name", type=str, required=True, help="知识库名称")
+    parser.add_argument("--html-dir", type=str, default=None, help="固定语料目录（.html 文件），不指定时使用页面存储")
+    parser.add_argument("--limit", type=int, default=None, help="最多测试的页面数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个页面重复次数，取最小耗时")
+    parser.add_argument("--show-diff", type=int, default=5, help="列出的不一致页面数")
+    args = parser.parse_args()
+
+    if not LXML_AVAILABLE:
+        logger.error("未安装 lxml，无法对比")
+        return
+
+    config = ConfigLoader()
+    input_dir = os.path.join(config.project_root, "data", "database", args.db_name, "downloaded_sites")
+    curator = PageCurator(input_dir, config, db_name=args.db_name)
+    pages = load_corpus(curator, args.html_dir, args.limit)
+    if not pages:
+        logger.error("语料为空")
+        return
+    total_bytes = sum(len(html) for _, html in pages)
+
+    results = {}
+    for name, clean in (("bs4", curator.clean_html_bs4), ("lxml", curator.clean_html_lxml)):
+        results[name] = bench_cleaner(curator, clean, pages, args.repeat)
+
+    logger.info(f"语料: {len(pages)} 个页面, {total_bytes / 1024 / 1024:.2f} MB")
+    logger.info(f"{'':<8}{'清理p50(ms)':>14}{'清理p95(ms)':>14}{'清理总计(s)':>14}{'含转换(s)':>12}{'页/秒':>10}")
+    for name, (clean_times, total_times, _) in results.items():
+        logger.info(
+            f"{name:<8}{np.percentile(clean_times, 50) * 1000:>14.2f}{np.percentile(clean_times, 95) * 1000:>14.2f}"
+            f"{sum(clean_times):>14.3f}{sum(total_times):>12.3f}{len(pages) / sum(total_times):>10.1f}"
+        )
+    speedup = sum(results["bs4"][0]) / sum(results["lxml"][0])
+    logger.info(f"lxml 清理加速比: {speedup:.2f}x")
+
+    bs4_markdowns, lxml_markdowns = results["bs4"][2], results["lxml"][2]
+    exact = sum(a == b for a, b in zip(bs4_markdowns, lxml_markdowns))
+    same = [normalize(a) == normalize(b) for a, b in zip(bs4_markdowns, lxml_markdowns)]
+    logger.info(f"Markdown 完全一致: {exact}/{len(pages)}, 忽略空白后一致: {sum(same)}/{len(pages)}")
+    for (name, _), equal in zip(pages, same):
+        if args.show_diff <= 0:
+            break
+        if not equal:
+            logger.info(f"不一致: {name}")
+            args.show_diff -= 1
+
+
+if __name__ == "__main__":
+    main()
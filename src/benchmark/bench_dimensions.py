@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比较 text-embedding-3 系列截短到不同维度后的 recall@k、检索延迟和索引大小，用于选择知识库的 embedding 维度
+
+text-embedding-3 的截短向量等价于完整向量取前 d 维后重新归一化，因此只需一个按完整维度构建的知识库。
+向量优先从 mmap 索引读取，没有 mmap 索引时从 Chroma 读取。
+
+python src/benchmark/bench_dimensions.py --db-name cesium --model text-embedding-3-large --dims 256,512,1024
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.utils.vector_index import MMAP_INDEX_DIR, META_FILE, read_store_meta
+from src.utils.index_versions import resolve_store_path
+from src.benchmark.bench_quantization import recall_at_k
+
+logger = Logger("bench_dimensions")
+
+
+def load_vectors(persist_directory: str) -> np.ndarray:
+    index_dir = os.path.join(persist_directory, MMAP_INDEX_DIR)
+    if os.path.exists(os.path.join(index_dir, META_FILE)):
+        return np.asarray(np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r"), dtype=np.float32)
+
+    from langchain_chroma import Chroma
+    vectordb = Chroma(persist_directory=persist_directory, embedding_function=None)
+    return np.asarray(vectordb._collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    truncated = vectors[:, :dim]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.where(norms == 0, 1.0, norms)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ matrix.T
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding维度截短的 recall/延迟对比")
+    parser.add_argument("--db-name", type=str, required=True, help="知识库名称")
+    parser.add_argument("--model", type=str, required=True, help="embedding模型名称")
+    parser.add_argument("--dims", type=str, default="256,512,1024", help="逗号分隔的候选维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量（从知识库切片中抽样）")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 中的 k")
+    args = parser.parse_args()
+
+    config = ConfigLoader()
+    persist_directory = resolve_store_path(os.path.join(config.project_root, "data", "database", args.db_name, "chroma_openai", args.model))
+    store_meta = read_store_meta(persist_directory)
+    if store_meta.get("dimensions"):
+        logger.warning(f"知识库已按 {store_meta['dimensions']} 维构建，只能比较更小的维度")
+
+    vectors = truncate(load_vectors(persist_directory), None)
+    full_dim = vectors.shape[1]
+    k = min(args.k, len(vectors) - 1)
+
+    # 以知识库中的切片作为查询，排除其自身
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+
+    def search(matrix):
+        start = time.perf_counter()
+        ids = top_k(matrix, matrix[query_ids], k + 1)
+        elapsed = time.perf_counter() - start
+        ids = np.array([[i for i in row if i != q][:k] for row, q in zip(ids, query_ids)])
+        return ids, elapsed
+
+    baseline_ids, baseline_time = search(vectors)
+    logger.info(f"知识库规模: {len(vectors)} 条, 完整维度 {full_dim}")
+    logger.info(f"{'维度':>8}{'recall@' + str(k):>12}{'ms/查询':>12}{'float32(MB)':>14}")
+    logger.info(f"{full_dim:>8}{1.0:>12.4f}{baseline_time * 1000 / len(query_ids):>12.3f}{vectors.nbytes / 2**20:>14.2f}")
+
+    for dim in sorted(int(d) for d in args.dims.split(",")):
+        if dim >= full_dim:
+            continue
+        matrix = truncate(vectors, dim)
+        ids, elapsed = search(matrix)
+        logger.info(
+            f"{dim:>8}{recall_at_k(ids, baseline_ids):>12.4f}"
+            f"{elapsed * 1000 / len(query_ids):>12.3f}{matrix.nbytes / 2**20:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
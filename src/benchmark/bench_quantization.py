@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测量 int8 / binary 量化粗排 + 全精度精排相对未量化基线的 recall@k、延迟和内存占用
+
+直接读取已构建的 mmap 索引中的向量，在内存中生成各量化方式的编码，不需要重新构建索引。
+
+python src/benchmark/bench_quantization.py --db-name cesium --model text-embedding-3-large --k 10
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.utils.vector_index import MMAP_INDEX_DIR, MmapVectorIndex, QuantizedCodes, rescore
+from src.utils.index_versions import resolve_store_path
+from src.benchmark.bench_vector_index import sample_queries
+
+logger = Logger("bench_quantization")
+
+
+def recall_at_k(result_ids: np.ndarray, baseline_ids: np.ndarray) -> float:
+    k = baseline_ids.shape[1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(result_ids, baseline_ids)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量化索引 recall@k 基准测试")
+    parser.add_argument("--db-name", type=str, required=True, help="知识库名称")
+    parser.add_argument("--model", type=str, required=True, help="embedding模型名称")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 中的 k")
+    parser.add_argument("--rescore-factors", type=str, default="1,2,4,8", help="逗号分隔的精排倍数")
+    args = parser.parse_args()
+
+    config = ConfigLoader()
+    model_dir = os.path.join(config.project_root, "data", "database", args.db_name, "chroma_openai", args.model)
+    index_dir = os.path.join(resolve_store_path(model_dir), MMAP_INDEX_DIR)
+    index = MmapVectorIndex(index_dir, use_hnsw=False)
+    queries = index._prepare_queries(sample_queries(index, args.queries))
+    factors = [int(f) for f in args.rescore_factors.split(",")]
+
+    start = time.perf_counter()
+    _, baseline_ids = index._exact_search(queries, args.k)
+    baseline_time = time.perf_counter() - start
+    full_bytes = index.count * index.dim * 4
+
+    logger.info(f"索引规模: {index.count} 条, 维度 {index.dim}")
+    logger.info(f"{'量化':<10}{'倍数':>6}{'recall@' + str(args.k):>12}{'ms/查询':>12}{'内存(MB)':>12}")
+    logger.info(f"{'float32':<10}{'-':>6}{1.0:>12.4f}{baseline_time * 1000 / len(queries):>12.3f}{full_bytes / 2**20:>12.2f}")
+
+    for kind in ("int8", "binary"):
+        codes = QuantizedCodes.build(kind, index.vectors)
+        for factor in factors:
+            start = time.perf_counter()
+            candidates = codes.shortlist(queries, args.k * factor)
+            _, ids = rescore(index.vectors, queries, candidates, args.k)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"{kind:<10}{factor:>6}{recall_at_k(ids, baseline_ids):>12.4f}"
+                f"{elapsed * 1000 / len(queries):>12.3f}{codes.nbytes / 2**20:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
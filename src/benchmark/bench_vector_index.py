@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对比 Chroma 与 mmap 向量索引的加载耗时、单条查询延迟和批量查询吞吐
+
+需要先在 config.json 中开启 vectordb.mmap_index.enabled 并构建数据库，使两种索引同时存在。
+
+python src/benchmark/bench_vector_index.py --db-name cesium --model text-embedding-3-small
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.utils.vector_index import MMAP_INDEX_DIR, MmapVectorIndex
+from src.utils.index_versions import resolve_store_path
+
+logger = Logger("bench_vector_index")
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def sample_queries(index: MmapVectorIndex, num_queries: int, seed: int = 0) -> np.ndarray:
+    """从索引中随机取向量并加入噪声，作为查询向量"""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, index.count, size=num_queries)
+    queries = np.asarray(index.vectors[ids], dtype=np.float32)
+    queries += rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    return queries
+
+
+def bench_chroma(persist_directory: str, queries: np.ndarray, k: int):
+    from langchain_chroma import Chroma
+
+    start = time.perf_counter()
+    vectordb = Chroma(persist_directory=persist_directory, embedding_function=None)
+    vectordb._collection.count()
+    load_time = time.perf_counter() - start
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = vectordb.similarity_search_by_vector(query.tolist(), k=k)
+        latencies.append(time.perf_counter() - start)
+        results.append([(doc.metadata.get("source"), doc.page_content) for doc in docs])
+    return load_time, latencies, results
+
+
+def bench_mmap(index_dir: str, queries: np.ndarray, k: int, batch_size: int):
+    start = time.perf_counter()
+    index = MmapVectorIndex(index_dir)
+    load_time = time.perf_counter() - start
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.similarity_search_by_vectors([query], k=k)[0]
+        latencies.append(time.perf_counter() - start)
+        results.append([(doc.metadata.get("source"), doc.page_content) for doc, _ in hits])
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        index.search(queries[i:i + batch_size], k=k)
+    batch_time = time.perf_counter() - start
+    return index, load_time, latencies, results, batch_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs mmap 向量索引基准测试")
+    parser.add_argument("--db-name", type=str, required=True, help="知识库名称")
+    parser.add_argument("--model", type=str, required=True, help="embedding模型名称")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--k", type=int, default=5, help="每个查询返回的文档数")
+    parser.add_argument("--batch-size", type=int, default=32, help="mmap批量查询的批大小")
+    args = parser.parse_args()
+
+    config = ConfigLoader()
+    persist_directory = resolve_store_path(os.path.join(config.project_root, "data", "database", args.db_name, "chroma_openai", args.model))
+    index_dir = os.path.join(persist_directory, MMAP_INDEX_DIR)
+
+    queries = sample_queries(MmapVectorIndex(index_dir), args.queries)
+    index, mmap_load, mmap_latencies, mmap_results, batch_time = bench_mmap(index_dir, queries, args.k, args.batch_size)
+    chroma_load, chroma_latencies, chroma_results = bench_chroma(persist_directory, queries, args.k)
+
+    overlap = np.mean([
+        len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(mmap_results, chroma_results)
+    ])
+
+    logger.info(f"索引规模: {index.count} 条, 维度 {index.dim}, 精度 {index.meta['dtype']}")
+    logger.info(f"{'':<8}{'加载(ms)':>12}{'p50(ms)':>12}{'p95(ms)':>12}")
+    logger.info(f"{'chroma':<8}{chroma_load * 1000:>12.2f}{percentile_ms(chroma_latencies, 50):>12.2f}{percentile_ms(chroma_latencies, 95):>12.2f}")
+    logger.info(f"{'mmap':<8}{mmap_load * 1000:>12.2f}{percentile_ms(mmap_latencies, 50):>12.2f}{percentile_ms(mmap_latencies, 95):>12.2f}")
+    logger.info(f"mmap 批量查询吞吐: {len(queries) / batch_time:.1f} 查询/秒 (batch_size={args.batch_size})")
+    logger.info(f"top-{args.k} 结果与 Chroma 的重合率: {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
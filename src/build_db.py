@@ -1,65 +1,155 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from database.vectorizator import process
+from database.vectorizator import process, refresh
 from database.downloader import SimpleAsyncDownloader
 from database.curator import PageCurator
 from database.init_db import init_db
 from database.links_extractor import LinksExtractor
+from database.async_links_extractor import AsyncLinksExtractor
+from database import pipeline
+from database import deduplicator
 from utils.config_loader import ConfigLoader
 from utils.logger import Logger
+# 与 database 下各模块上报统计时使用同一个模块对象
+from src.utils import build_metrics
 import argparse
 import os
 import asyncio
 
-async def download_urls(db_name: str, file_path: str, delay: float = 1.0, max_connections: int = 10):
+async def download_urls(db_name: str, file_path: str, delay: float = 1.0, max_connections: int = 10, refresh: bool = False):
     """
     下载URL列表中的网页内容
+    :return: 下载器，刷新模式下通过 changed_urls 获取有变化的页面
     """
-    downloader = SimpleAsyncDownloader(delay=delay, max_connections=max_connections, db_name=db_name)
+    downloader = SimpleAsyncDownloader(delay=delay, max_connections=max_connections, db_name=db_name, refresh=refresh)
     if os.path.exists(file_path):
         logger.info(f"开始从文件加载URL: {file_path}")
         await downloader.run(file_path)
     else:
         logger.error(f"文件不存在：{file_path}")
         raise FileNotFoundError(f"URL文件不存在：{file_path}")
+    return downloader
 
-async def build_rag_database(db_name: str, file_path: str, embeddings_model: str, required_prefix: str = ""):
+def save_build_report(db_name: str, status: str, error: str = None):
+    """结束本次构建的统计，打印各阶段汇总并把报告保存到 data/database/{db_name}/build_reports/"""
+    metrics = build_metrics.end_build(status, error)
+    if metrics is None:
+        return
+    logger = Logger("build_db")
+    metrics.log_summary()
+    path = metrics.save(os.path.join(ConfigLoader().project_root, "data", "database", db_name))
+    logger.info(f"构建报告已保存: {path}")
+
+async def refresh_rag_database(db_name: str, embeddings_model: dict, index_options: dict = None):
+    """
+    增量刷新已构建的RAG数据库：对已提取的链接发送条件请求，只重新整理和向量化内容有变化的页面
+    """
+    logger = Logger("build_db")
+    metrics = build_metrics.start_build(db_name, mode="refresh", model=embeddings_model.get("model"))
+    status, error = "failed", None
+
+    try:
+        logger.info("开始刷新网页内容...")
+        extracted_links_path = os.path.join("data", "database", db_name, "urls", "extracted_links.txt")
+        with metrics.stage("download"):
+            downloader = await download_urls(db_name, extracted_links_path, refresh=True)
+        if not downloader.changed_urls:
+            logger.info("没有页面发生变化，无需更新向量库")
+            status = "success"
+            return
+
+        logger.info(f"整理 {len(downloader.changed_urls)} 个有变化的页面...")
+        input_dir = os.path.join("data", "database", db_name, "downloaded_sites")
+        curator = PageCurator(input_dir, ConfigLoader(), db_name=db_name)
+        with metrics.stage("curate"):
+            changed_docs = curator.process_pages(downloader.changed_urls)
+        curated_dir = os.path.join(ConfigLoader().project_root, "data", "database", db_name, "curated")
+        previous_duplicates = deduplicator.load_duplicates(curated_dir)
+        with metrics.stage("dedup"):
+            duplicates = deduplicator.process(db_name)
+        # 近重复状态变化的页面即使内容未变也要重新向量化（不再重复）或删除向量（成为重复）
+        flipped = deduplicator.changed_pages(previous_duplicates, duplicates)
+        if flipped:
+            logger.info(f"{len(flipped)} 个页面的近重复状态发生变化，一并更新")
+        paths = list(dict.fromkeys(changed_docs + [os.path.join(curated_dir, name) for name in sorted(flipped)]))
+
+        logger.info("更新向量库...")
+        refresh(db_name, embeddings_model, paths, index_options)
+        logger.info("RAG数据库刷新完成！")
+        status = "success"
+    except Exception as e:
+        logger.error(f"刷新RAG数据库时发生错误: {str(e)}")
+        error = str(e)
+        raise
+    finally:
+        save_build_report(db_name, status, error)
+
+async def build_rag_database(db_name: str, file_path: str, embeddings_model: str, required_prefix: str = "", index_options: dict = None, streaming: bool = False, single_fetch: bool = False, crawler: str = "thread", resume: bool = False, rebuild: bool = False):
     """
     从URL文件构建RAG数据库的完整流程
+    :param streaming: 为 True 时各阶段以流水线方式同时运行
+    :param single_fetch: 为 True 时链接提取阶段直接保存页面，下载阶段跳过已保存的URL
+    :param crawler: 链接提取引擎，thread（多线程 requests）或 async（asyncio + aiohttp）
+    :param resume: 为 True 时从爬取检查点继续上次中断的链接提取
+    :param rebuild: 为 True 时重新整理全部页面并完整构建向量库，否则按整理清单和切片清单增量构建
     """
     logger = Logger("build_db")
+    metrics = build_metrics.start_build(db_name, mode="streaming" if streaming else "batch",
+                                        model=embeddings_model.get("model"), rebuild=rebuild)
+    status, error = "failed", None
     
     try:
         # 1. 初始化数据库目录结构
         logger.info("初始化数据库目录结构...")
         init_db(db_name)
+
+        if streaming:
+            logger.info("以流水线模式构建: 提取、下载、整理、向量化同时进行...")
+            await asyncio.to_thread(pipeline.process, db_name, file_path, embeddings_model, required_prefix, index_options, crawler, resume, rebuild)
+            logger.info("RAG数据库构建完成！")
+            status = "success"
+            return
         
         # 2. 提取URL
         logger.info("开始提取URL...")
-        extractor = LinksExtractor(db_name=db_name, file_path=file_path, required_prefix=required_prefix)
-        extractor.process()
+        extractor_cls = AsyncLinksExtractor if crawler == "async" else LinksExtractor
+        extractor = extractor_cls(db_name=db_name, file_path=file_path, required_prefix=required_prefix, save_pages=single_fetch, resume=resume)
+        # 异步爬虫在独立线程中运行自己的事件循环
+        with metrics.stage("extract"):
+            await asyncio.to_thread(extractor.process)
         
         # 3. 下载网页内容
         logger.info("开始下载网页内容...")
         extracted_links_path = os.path.join("data", "database", db_name, "urls", "extracted_links.txt")
-        await download_urls(db_name, extracted_links_path)
+        with metrics.stage("download"):
+            await download_urls(db_name, extracted_links_path)
         
         # 4. 处理下载的内容
         logger.info("处理下载的内容...")
         input_dir = os.path.join("data", "database", db_name, "downloaded_sites")
         curator = PageCurator(input_dir, ConfigLoader(), db_name=db_name)
-        curator.process_directory(max_workers=8)
+        with metrics.stage("curate"):
+            curator.process_directory(force=rebuild)
+
+        # 5. 近重复页面检测
+        logger.info("检测近重复页面...")
+        with metrics.stage("dedup"):
+            deduplicator.process(db_name)
         
-        # 5. 向量化存储
+        # 6. 向量化存储
         logger.info("开始向量化存储...")
-        process(db_name, embeddings_model)
+        process(db_name, embeddings_model, index_options, rebuild)
         
         logger.info("RAG数据库构建完成！")
+        status = "success"
         
     except Exception as e:
         logger.error(f"构建RAG数据库时发生错误: {str(e)}")
+        error = str(e)
         raise
+    finally:
+        save_build_report(db_name, status, error)
 
 if __name__ == "__main__":
     config = ConfigLoader()
@@ -69,7 +159,21 @@ if __name__ == "__main__":
     parser.add_argument('--db-name', type=str, default='default', help='用于构建数据库的名称')
     parser.add_argument('--file-path', type=str, default='./websites.txt', help='包含URL的文件路径')
     parser.add_argument('--required-prefix', type=str, default='', help='URL前缀')
+    parser.add_argument('--quantization', type=str, default=None, choices=['none', 'int8', 'binary'], help='mmap索引的量化方式，默认使用config.json中的配置')
+    parser.add_argument('--rescore-factor', type=int, default=None, help='量化粗排候选数与k的倍数')
+    parser.add_argument('--streaming', action='store_true', help='流水线模式：提取、下载、整理和向量化同时进行')
+    parser.add_argument('--crawler', type=str, default='thread', choices=['thread', 'async'], help='链接提取引擎：thread（多线程）或 async（asyncio + aiohttp）')
+    parser.add_argument('--single-fetch', action='store_true', help='链接提取时直接保存页面，下载阶段不再重复请求')
+    parser.add_argument('--resume', action='store_true', help='从 urls/crawl_state.sqlite 检查点继续上次中断的爬取')
+    parser.add_argument('--rebuild', action='store_true', help='重新整理全部页面并完整构建向量库，默认只整理变化的页面、只为新增或变化的切片计算向量')
+    parser.add_argument('--refresh', action='store_true', help='增量刷新已构建的知识库：条件请求已下载的页面，只更新有变化的页面')
+    parser.add_argument('--embedding-dim', type=int, default=None, help='截短后的向量维度（仅text-embedding-3系列及本地模型），默认沿用已有向量库的维度，首次构建使用完整维度')
     args = parser.parse_args()
+    # 不支持的组合直接报错，避免以与参数不同的方式构建
+    if args.streaming and args.single_fetch:
+        parser.error("--streaming 不支持 --single-fetch：流水线中链接一经发现就交给下载阶段，无法在提取时保存页面")
+    if args.refresh and (args.streaming or args.rebuild or args.single_fetch or args.resume):
+        parser.error("--refresh 只刷新已下载的页面，不能与 --streaming、--rebuild、--single-fetch 或 --resume 同时使用")
     
     db_name = args.db_name
     file_path = args.file_path
@@ -78,6 +182,15 @@ if __name__ == "__main__":
     logger.info(f"db_name: {db_name}")
     logger.info(f"file_path: {file_path}")
     logger.info(f"required_prefix: {required_prefix}")
+
+    # 知识库级别的索引配置
+    index_options = {}
+    if args.quantization is not None:
+        index_options["quantization"] = args.quantization
+    if args.rescore_factor is not None:
+        index_options["rescore_factor"] = args.rescore_factor
+    if args.embedding_dim is not None:
+        index_options["embedding_dim"] = args.embedding_dim
     
     # 选择embedding模型
     logger.info("请选择embedding模型:")
@@ -92,5 +205,9 @@ if __name__ == "__main__":
     embeddings_model = config.embedding_model_list[embedding_model_name]
     logger.info(f"embeddings_model: {embeddings_model}")
 
+    if args.refresh:
+        asyncio.run(refresh_rag_database(db_name, embeddings_model, index_options))
+        exit()
+
     # 执行完整的RAG数据库构建流程
-    asyncio.run(build_rag_database(db_name, file_path, embeddings_model, required_prefix))
\ No newline at end of file
+    asyncio.run(build_rag_database(db_name, file_path, embeddings_model, required_prefix, index_options, args.streaming, args.single_fetch, args.crawler, args.resume, args.rebuild))
\ No newline at end of file
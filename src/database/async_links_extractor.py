@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import asyncio
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Set
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.database.links_extractor import LinksExtractor
+from src.utils import build_metrics
+
+
+class AsyncLinksExtractor(LinksExtractor):
+    """
+    基于 asyncio + aiohttp 的链接提取器
+
+    与 LinksExtractor 使用相同的输入输出文件，区别在于爬取引擎：
+    - 单个事件循环管理大量并发连接，连接池按主机限制并发数
+    - HTML 解析放在线程池中执行，不阻塞事件循环
+    - 通过 queue.join() 判断所有页面（包括处理中派生的新页面）都已完成，而不是依赖队列超时
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, db_name: str, max_depth: int = 3, concurrency: int = 1000, per_host: int = 8,
+                 parse_workers: int = 8, max_retries: int = 3, report_interval: float = 5.0, **kwargs):
+        """
+        :param concurrency: 全局最大并发连接数
+        :param per_host: 单个主机的最大并发连接数
+        :param parse_workers: 解析HTML的线程数
+        :param max_retries: 请求失败（超时、429、5xx）时的最大重试次数
+        :param report_interval: 打印爬取速率的间隔（秒）
+        """
+        super().__init__(db_name, max_depth=max_depth, num_threads=concurrency, **kwargs)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.parse_workers = parse_workers
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.pages_done = 0
+        self.in_flight = 0
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str):
+        """请求页面，对超时和可重试的状态码做指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.get(url) as resp:
+                    if resp.status in self.RETRY_STATUS and attempt < self.max_retries:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    resp.raise_for_status()
+                    body = await resp.read()
+                    return body, resp.status, resp.headers, body.decode(resp.charset or 'utf-8', errors='replace')
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def process_page_async(self, session: aiohttp.ClientSession, url: str, executor: ThreadPoolExecutor) -> Set[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            self.logger.info(f'正在处理: {url}')
+            body, status, headers, text = await self.fetch(session, url)
+            build_metrics.current().add("extract", items=1, bytes=len(body))
+            if self.save_pages:
+                await loop.run_in_executor(executor, self.save_page, url, body, status, headers)
+            return await loop.run_in_executor(executor, self.extract_links, url, text)
+        except Exception as e:
+            await loop.run_in_executor(executor, self.record_error, url, f'处理失败: {e!r}')
+            return set()
+
+    async def async_worker(self, session: aiohttp.ClientSession, task_queue: asyncio.Queue, executor: ThreadPoolExecutor):
+        while True:
+            url, depth = await task_queue.get()
+            try:
+                if depth > self.max_depth:
+                    self.checkpoint.mark_done(url)
+                    continue
+                self.in_flight += 1
+                links = await self.process_page_async(session, url, executor)
+                self.in_flight -= 1
+                self.pages_done += 1
+                self.all_links.update(links)
+
+                if depth < self.max_depth:
+                    for link in self.enqueue_links(links, depth + 1):
+                        task_queue.put_nowait((link, depth + 1))
+                self.checkpoint.mark_done(url)
+            except Exception as e:
+                self.logger.error(f"爬取协程发生错误: {e}")
+            finally:
+                task_queue.task_done()
+
+    async def reporter(self, task_queue: asyncio.Queue):
+        last_done, last_time = 0, time.time()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.time()
+            rate = (self.pages_done - last_done) / (now - last_time)
+            last_done, last_time = self.pages_done, now
+            self.logger.info(
+                f"当前状态: 待处理URL: {task_queue.qsize()}, 处理中: {self.in_flight}, "
+                f"已完成页面: {self.pages_done}, 已发现链接: {len(self.existing_links)}, "
+                f"爬取速率: {rate:.2f} 页面/秒"
+            )
+
+    async def crawl(self, start_urls: List[str]) -> Set[str]:
+        task_queue: asyncio.Queue = asyncio.Queue()
+        for url, depth in self.init_frontier(start_urls):
+            task_queue.put_nowait((url, depth))
+        self.logger.info(f"已添加 {task_queue.qsize()} 个起始URL到队列")
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ssl=False, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=30)
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.parse_workers, thread_name_prefix="crawl-parse") as executor:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.HEADERS) as session:
+                workers = [asyncio.create_task(self.async_worker(session, task_queue, executor)) for _ in range(self.concurrency)]
+                reporter = asyncio.create_task(self.reporter(task_queue))
+                # 所有任务（包括处理过程中新加入的）完成后 join 返回
+                await task_queue.join()
+                for task in workers + [reporter]:
+                    task.cancel()
+                await asyncio.gather(*workers, reporter, return_exceptions=True)
+
+        elapsed = time.time() - start_time
+        self.logger.info(f"所有URL处理完毕，共 {self.pages_done} 个页面，平均 {self.pages_done / max(elapsed, 1e-6):.2f} 页面/秒")
+        return self.all_links
+
+    def parallel_bfs_crawler(self, start_urls: List[str]) -> Set[str]:
+        """覆盖线程版爬虫，process() 的其余流程与输出文件保持不变"""
+        try:
+            return asyncio.run(self.crawl(start_urls))
+        except KeyboardInterrupt:
+            self.logger.warning("接收到中断信号，正在停止...")
+            return self.all_links
+        finally:
+            self.checkpoint.flush()
+
+
+if __name__ == '__main__':
+    extractor = AsyncLinksExtractor("cesium")
+    extractor.process()
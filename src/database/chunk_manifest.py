@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+MANIFEST_FILE = "chunk_manifest.json"
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ChunkManifest:
+    """
+    知识库的切片清单，保存在向量库版本目录（chroma_openai/<model>/versions/<版本>）下的 chunk_manifest.json
+
+    记录每个源文件切出的 (切片哈希, 向量ID)。向量ID由源文件、切片哈希和该切片在文件内出现的序号决定，
+    内容不变的切片在每次构建中得到相同的ID，增量构建时只需要对比新旧两份清单的ID集合。
+
+    开启切片去重时向量ID只由切片哈希决定，内容完全相同的切片共用一个向量，
+    清单中每个出现位置都指向这个规范向量；只要还有一处引用，向量就不会被删除。
+    """
+
+    def __init__(self, persist_path: str):
+        self.path = os.path.join(persist_path, MANIFEST_FILE)
+        self.sources: Dict[str, List[List[str]]] = defaultdict(list)
+        self._occurrences: Dict[tuple, int] = defaultdict(int)
+
+    @classmethod
+    def load(cls, persist_path: str) -> Optional["ChunkManifest"]:
+        """读取已有清单，不存在或损坏时返回 None"""
+        manifest = cls(persist_path)
+        if not os.path.exists(manifest.path):
+            return None
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        for source, entries in data.get("sources", {}).items():
+            manifest.sources[source] = entries
+        return manifest
+
+    def assign(self, docs, dedup: bool = False) -> List[str]:
+        """
+        为一批切片分配向量ID并登记到清单
+        :param dedup: 为 True 时内容相同的切片得到相同的ID
+        """
+        ids = []
+        for doc in docs:
+            source = doc.metadata.get("source", "")
+            digest = chunk_hash(doc.page_content)
+            if dedup:
+                vector_id = hashlib.sha1(digest.encode("utf-8")).hexdigest()
+                self.sources[source].append([digest, vector_id])
+                ids.append(vector_id)
+                continue
+            n = self._occurrences[(source, digest)]
+            self._occurrences[(source, digest)] += 1
+            vector_id = hashlib.sha1(f"{source}\0{digest}\0{n}".encode("utf-8")).hexdigest()
+            self.sources[source].append([digest, vector_id])
+            ids.append(vector_id)
+        return ids
+
+    def discard(self, ids):
+        """移除未成功写入向量库的切片"""
+        ids = set(ids)
+        for source in list(self.sources):
+            self.sources[source] = [entry for entry in self.sources[source] if entry[1] not in ids]
+
+    def ids(self) -> Set[str]:
+        return {vector_id for entries in self.sources.values() for _, vector_id in entries}
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.sources.values())
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "sources": self.sources}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
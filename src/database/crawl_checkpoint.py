@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import sqlite3
+from threading import Lock
+from typing import Iterable, List, Set, Tuple
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.logger import Logger
+
+PENDING = 0
+DONE = 1
+
+
+class CrawlCheckpoint:
+    """
+    爬取进度检查点，保存在 urls/crawl_state.sqlite 中
+
+    frontier 表记录每个已入队的URL、深度和状态（待处理/已完成），所有入队过的URL即为已访问集合。
+    变更先写入内存缓冲区，按条数或时间间隔批量提交；同一批变更在一个事务中按顺序写入，
+    因此某个页面标记为已完成时，它派生出的新链接一定已经持久化。
+    """
+
+    def __init__(self, path: str, flush_every: int = 500, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.logger = Logger("crawl_checkpoint")
+        self.lock = Lock()
+        self.buffer: List[Tuple[str, tuple]] = []
+        self.last_flush = time.time()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY, depth INTEGER NOT NULL, status INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    def reset(self):
+        """清空检查点，开始新的爬取"""
+        with self.lock:
+            self.buffer.clear()
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.commit()
+        self.logger.info(f"已清空爬取检查点: {self.path}")
+
+    def load(self) -> Tuple[Set[str], List[Tuple[str, int]]]:
+        """
+        读取检查点
+        :return: (已访问URL集合, 待处理的 (url, depth) 列表)
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT url, depth, status FROM frontier").fetchall()
+        visited = {url for url, _, _ in rows}
+        pending = [(url, depth) for url, depth, status in rows if status == PENDING]
+        if rows:
+            self.logger.info(f"读取爬取检查点 {self.path}: 已访问 {len(visited)} 个URL，待处理 {len(pending)} 个URL")
+        return visited, pending
+
+    def add_pending(self, items: Iterable[Tuple[str, int]]):
+        """登记新入队的URL"""
+        with self.lock:
+            self.buffer.extend(("pending", item) for item in items)
+            self._maybe_flush()
+
+    def mark_done(self, url: str):
+        """登记已处理完成的URL"""
+        with self.lock:
+            self.buffer.append(("done", (url,)))
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.buffer) >= self.flush_every or time.time() - self.last_flush >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            with self.conn:
+                for op, args in self.buffer:
+                    if op == "pending":
+                        self.conn.execute(
+                            "INSERT OR IGNORE INTO frontier (url, depth, status) VALUES (?, ?, ?)", (*args, PENDING)
+                        )
+                    else:
+                        self.conn.execute("UPDATE frontier SET status = ? WHERE url = ?", (DONE, *args))
+            self.logger.debug(f"爬取检查点已写入 {len(self.buffer)} 条变更")
+            self.buffer.clear()
+        self.last_flush = time.time()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -3,17 +3,22 @@
 
 import os
 import re
+import json
 import argparse
 import sys
 # 添加项目根目录到系统路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from threading import Lock
 from src.utils.config_loader import ConfigLoader
 from tqdm import tqdm
 
 from src.utils.logger import Logger
+from src.database.page_store import PageStore, read_blob, url_key
+from src.utils.curated_pack import CuratedPackWriter
+from src.utils import build_metrics
 
 try:
     import html2text
@@ -21,19 +26,151 @@ try:
 except ImportError:
     H2T_AVAILABLE = False
 
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
 # 初始化Logger
 logger = Logger("curator")
 
-class PageCurator:
-    def __init__(self, input_dir, config, db_name=""):
-        self.input_dir = input_dir
-        self.config = config
-        self.output_dir = os.path.join(self.config.project_root, "data", "database", db_name, "curated")
-        logger.info(f"初始化PageCurator: 输入目录={input_dir}, 输出目录={self.output_dir}")
+# 整理清单：记录每个URL整理时的页面内容哈希，用于跳过未变化的页面
+CURATION_MANIFEST = "curation_manifest.json"
+
+# lxml 清理器使用的预编译选择器，与 clean_html 中的 CSS 选择器一一对应
+DROP_TAGS = frozenset(['script', 'style', 'iframe', 'noscript', 'nav'])
+BOILERPLATE_CLASSES = frozenset([
+    'nav', 'navigation', 'navbar', 'sidebar', 'menu', 'header', 'footer', 'search', 'pagination',
+    'wy-nav-side', 'wy-side-scroll', 'wy-side-nav-search', 'wy-menu', 'rst-versions', 'wy-nav-top',
+    'toc', 'breadcrumb', 'toctree', 'contents'
+])
+BOILERPLATE_IDS = frozenset(['table-of-contents'])
+BOILERPLATE_ROLES = frozenset(['search', 'navigation', 'contentinfo'])
+NAV_KEYWORDS = re.compile(r'search|next|prev|index|home|contact|about', re.IGNORECASE)
+KEEP_EMPTY_TAGS = frozenset(['br', 'img'])
+# 主内容候选 (标签, 属性, 值)，按优先级排列
+MAIN_CANDIDATES = [
+    ('main', None, None), ('article', None, None), (None, 'id', 'content'), (None, 'class', 'content'),
+    (None, 'class', 'main-content'), (None, 'class', 'document'), (None, 'class', 'section'),
+]
+NON_ASCII = re.compile(r'[^\x00-\x7F]+')
+
+
+def _is_boilerplate(el, classes):
+    if el.tag in DROP_TAGS or not classes.isdisjoint(BOILERPLATE_CLASSES):
+        return True
+    return el.get('id') in BOILERPLATE_IDS or el.get('role') in BOILERPLATE_ROLES
+
+
+def _remove(el):
+    """删除元素及其子树，保留元素后面的文本"""
+    parent = el.getparent()
+    if parent is None:
+        return
+    if el.tail:
+        previous = el.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + el.tail
+        else:
+            parent.text = (parent.text or '') + el.tail
+    parent.remove(el)
+
+
+def _replace_with_text(el):
+    """把元素替换为其纯文本"""
+    text = el.text_content() + (el.tail or '')
+    el.clear()
+    el.tail = text
+    _remove(el)
+
+
+def _walk(el, candidates):
+    """
+    一次遍历完成清理：删除样板元素、展开导航链接、删除空元素，并记录主内容候选
+    :return: 删除空子元素之前 el 是否为空（与 BeautifulSoup 版本的先序判断一致）
+    """
+    empty_children = []
+    for child in list(el):
+        if not isinstance(child.tag, str):
+            # 注释、处理指令
+            continue
+        classes = set(child.get('class', '').split())
+        if _is_boilerplate(child, classes):
+            _remove(child)
+            continue
+        for i, (tag, attr, value) in enumerate(MAIN_CANDIDATES):
+            if child.tag == tag if tag else (value in classes if attr == 'class' else child.get(attr) == value):
+                candidates[i].append(child)
+        empty = _walk(child, candidates)
+        if child.tag == 'a':
+            href = child.get('href', '')
+            if href.startswith('http') or NAV_KEYWORDS.search(href) or NAV_KEYWORDS.search(child.text_content()):
+                _replace_with_text(child)
+                continue
+        if empty and child.tag not in KEEP_EMPTY_TAGS:
+            empty_children.append(child)
+    was_empty = not el.text and len(el) == 0
+    for child in empty_children:
+        _remove(child)
+    return was_empty
+
+
+class PageRenderer:
+    """
+    页面渲染：读取页面 blob、清理HTML并转换为 Markdown
+
+    只依赖配置和 blob 目录，不加载页面清单、整理清单，也不写出结果；
+    进程池的工作进程只持有这一部分，清单和输出都留在主进程
+    """
+
+    def __init__(self, blobs_dir, config):
+        self.blobs_dir = blobs_dir
+        # HTML 清理器：lxml（单次遍历）或 bs4
+        self.cleaner = config.get("curator.cleaner", "lxml")
+        if self.cleaner == "lxml" and not LXML_AVAILABLE:
+            logger.warning("未安装 lxml，改用 BeautifulSoup 清理HTML")
+            self.cleaner = "bs4"
+
+    def read_page(self, url, record=None):
+        """按页面清单中的记录读取页面内容"""
+        if not record:
+            raise KeyError(f"缺少页面记录: {url}")
+        return read_blob(self.blobs_dir, record)
 
     def clean_html(self, html):
+        if self.cleaner == "lxml":
+            return self.clean_html_lxml(html)
+        return self.clean_html_bs4(html)
+
+    def clean_html_lxml(self, html):
+        """
+        与 clean_html_bs4 规则相同的 lxml 实现：C 解析器，预编译选择器，一次遍历完成全部清理
+        """
+        logger.debug("开始清理HTML内容（lxml）")
+        html = NON_ASCII.sub('', html)
+        if not html.strip():
+            return ''
+        # 去除非ASCII字符后按字节解析，避免带编码声明的字符串解析报错
+        root = lxml.html.document_fromstring(html.encode('ascii'))
+        candidates = [[] for _ in MAIN_CANDIDATES]
+        _walk(root, candidates)
+
+        # 选主内容区域，跳过遍历中作为空元素删除的候选
+        main_content = next(
+            (el for matches in candidates for el in matches if el.getparent() is not None), None
+        )
+        if main_content is None:
+            main_content = root.find('body')
+        if main_content is None:
+            main_content = root
+        result = lxml.html.tostring(main_content, encoding='unicode', with_tail=False)
+        logger.debug(f"HTML清理完成，内容大小: {len(result)} 字符")
+        return result
+
+    def clean_html_bs4(self, html):
         logger.debug("开始清理HTML内容")
-        html = re.sub(r'[^\x00-\x7F]+', '', html) 
+        html = NON_ASCII.sub('', html)
         soup = BeautifulSoup(html, 'html.parser')
 
         for tag in soup(['script','style','iframe','noscript']):
@@ -107,75 +244,258 @@ class PageCurator:
             logger.debug(f"备用方法转换完成，内容大小: {len(result)} 字符")
             return result
 
-    def process_file(self, filepath):
-        filename = os.path.basename(filepath)
+    def render_page(self, url, record=None):
+        """
+        把页面存储中的单个页面转换为 Markdown
+        :param record: 页面在清单中的记录，传入时不再查询清单（进程池中的清单可能是旧的）
+        :return: Markdown 内容，失败时返回 None
+        """
         try:
-            logger.debug(f"开始处理文件: {filepath}")
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                html_content = f.read()
+            logger.debug(f"开始处理页面: {url}")
+            content = self.read_page(url, record)
+            html_content = content.decode('utf-8', errors='ignore')
             
-            logger.debug(f"文件 {filename} 读取成功，大小: {len(html_content)} 字符")
+            logger.debug(f"页面 {url} 读取成功，大小: {len(html_content)} 字符")
             cleaned = self.clean_html(html_content)
-            markdown = self.html_to_markdown(cleaned)
-            
-            rel_path = os.path.relpath(filepath, self.input_dir)
-            out_path = os.path.join(self.output_dir, rel_path)
-            out_path = os.path.splitext(out_path)[0] + '.md'
-            os.makedirs(os.path.dirname(out_path), exist_ok=True)
-            
-            with open(out_path, 'w', encoding='utf-8') as f:
-                f.write(markdown)
-            
-            logger.debug(f"文件 {filename} 处理完成，已保存到: {out_path}")
-            return True
+            return self.html_to_markdown(cleaned)
+        except Exception as e:
+            logger.error(f"处理页面 {url} 失败: {str(e)}")
+            return None
+
+
+class PageCurator(PageRenderer):
+    def __init__(self, input_dir, config, db_name=""):
+        self.input_dir = input_dir
+        self.config = config
+        self.output_dir = os.path.join(self.config.project_root, "data", "database", db_name, "curated")
+        self.db_name = db_name
+        self.store = PageStore(db_name)
+        super().__init__(self.store.blobs_dir, config)
+        # 整理执行方式：thread（线程池）或 process（进程池）
+        self.executor = config.get("curator.executor", "thread")
+        self.max_workers = config.get("curator.max_workers")
+        self.chunksize = config.get("curator.chunksize")
+        # 输出格式：files（每个页面一个 .md 文件）或 pack（打包写入 curated/packs/ 分片）
+        self.output_format = config.get("curator.output_format", "files")
+        self.pack = None
+        if self.output_format == "pack":
+            self.pack = CuratedPackWriter(self.output_dir, shard_size=config.get("curator.pack_shard_mb", 256) * 1024 * 1024)
+        self.manifest_path = os.path.join(self.output_dir, CURATION_MANIFEST)
+        self.manifest_lock = Lock()
+        self.manifest = self.load_manifest()
+        logger.info(f"初始化PageCurator: 输入目录={input_dir}, 输出目录={self.output_dir}")
+
+    def read_page(self, url, record=None):
+        """主进程持有页面清单，没有传入记录时按URL查询"""
+        return self.store.read_record(record) if record else self.store.read(url)
+
+    def write_output(self, url, markdown):
+        """
+        保存整理结果：files 格式写入 curated/<URL哈希>.md，pack 格式追加到分片
+        :return: 整理结果的 source 路径，失败时返回 False
+        """
+        try:
+            if self.pack is not None:
+                out_path = self.pack.put(url_key(url), markdown)
+            else:
+                out_path = self.output_path(url)
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                # 写临时文件后原子替换，已发布版本的 curated 快照与旧文件共享硬链接，不能原地改写
+                tmp_path = out_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(markdown)
+                os.replace(tmp_path, out_path)
+            logger.debug(f"页面 {url} 处理完成，已保存到: {out_path}")
+            build_metrics.current().add("curate", items=1, bytes=len(markdown.encode('utf-8')))
+            return out_path
         except Exception as e:
-            logger.error(f"处理文件 {filename} 失败: {str(e)}")
+            logger.error(f"保存页面 {url} 失败: {str(e)}")
+            return False
+
+    def process_page(self, url, record=None):
+        """
+        整理页面存储中的单个页面
+        :return: 整理结果的 source 路径，失败时返回 False
+        """
+        markdown = self.render_page(url, record)
+        if markdown is None:
             return False
+        return self.write_output(url, markdown)
 
-    def process_directory(self, max_workers=8):
-        logger.info(f"开始处理目录: {self.input_dir}")
+    def load_manifest(self):
+        """
+        读取整理清单 {url: 内容哈希}，清理器不同时整理结果可能不同，视为空清单
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if data.get("cleaner") != self.cleaner:
+            logger.info(f"整理清单由 {data.get('cleaner')} 清理器生成，当前为 {self.cleaner}，全部页面重新整理")
+            return {}
+        return data.get("pages", {})
+
+    def save_manifest(self):
         os.makedirs(self.output_dir, exist_ok=True)
-        html_files = []
-        
-        # 获取所有HTML文件
-        for root, dirs, files in os.walk(self.input_dir):
-            for fn in files:
-                if fn.endswith('.html'):
-                    html_files.append(os.path.join(root, fn))
-        
-        total_files = len(html_files)
-        logger.info(f"找到 {total_files} 个HTML文件需要处理")
-        
-        if total_files == 0:
-            logger.warning(f"在 {self.input_dir} 中未找到HTML文件")
+        tmp_path = self.manifest_path + ".tmp"
+        # 先落盘打包内容，再写入整理清单
+        if self.pack is not None:
+            self.pack.save()
+        with self.manifest_lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": 1, "cleaner": self.cleaner, "pages": self.manifest}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+
+    def mark_curated(self, url, record=None):
+        """登记已整理的页面"""
+        record = record or self.store.get(url)
+        if record:
+            with self.manifest_lock:
+                self.manifest[url] = record.get("content_hash")
+
+    def output_path(self, url):
+        """整理结果的 source 路径，pack 格式下是不存在的虚拟路径，两种格式相同"""
+        return os.path.join(self.output_dir, url_key(url) + '.md')
+
+    def has_output(self, url):
+        if self.pack is not None:
+            return url_key(url) in self.pack
+        return os.path.exists(self.output_path(url))
+
+    def is_current(self, url, record=None):
+        """页面内容与上次整理时相同且整理结果仍然存在"""
+        record = record or self.store.get(url)
+        return bool(record and record.get("content_hash") and self.manifest.get(url) == record["content_hash"]
+                    and self.has_output(url))
+
+    def remove_orphans(self, urls):
+        """
+        删除不再对应任何待整理页面的整理结果和清单条目
+        切换输出格式后，旧格式的全部结果视为失效
+        """
+        keys = {url_key(url) for url in urls}
+        removed = 0
+        if os.path.isdir(self.output_dir):
+            for name in os.listdir(self.output_dir):
+                if name.endswith('.md') and (self.pack is not None or name[:-3] not in keys):
+                    os.remove(os.path.join(self.output_dir, name))
+                    removed += 1
+        if self.pack is not None:
+            for key in self.pack.keys():
+                if key not in keys:
+                    self.pack.remove(key)
+                    removed += 1
+        else:
+            stale = CuratedPackWriter(self.output_dir)
+            removed += len(stale.keys())
+            stale.clear()
+        urls = set(urls)
+        with self.manifest_lock:
+            for url in [url for url in self.manifest if url not in urls]:
+                del self.manifest[url]
+        return removed
+
+    def process_directory(self, max_workers=None, force=False):
+        """
+        增量整理页面存储：只整理新增或内容变化的页面，并删除失效的整理结果
+        :param force: 为 True 时忽略整理清单，全部重新整理
+        """
+        logger.info(f"开始处理页面存储: {self.input_dir}")
+        # 内容相同的URL只整理一次
+        urls = [url for url, record in self.store.iter_records(unique=True)
+                if (record.get("content_type") or "text/html").startswith(("text/html", "application/xhtml+xml"))]
+        logger.info(f"找到 {len(urls)} 个HTML页面")
+
+        removed = self.remove_orphans(urls)
+        if removed:
+            logger.info(f"删除 {removed} 个失效的整理结果")
+        if force:
+            self.manifest.clear()
+        pending = [url for url in urls if not self.is_current(url)]
+        logger.info(f"{len(urls) - len(pending)} 个页面未变化，{len(pending)} 个页面需要整理")
+
+        if not pending:
+            self.save_manifest()
+            if not urls:
+                logger.warning(f"在 {self.input_dir} 中未找到HTML页面")
             return
 
-        processed, failed = 0, 0
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.process_file, f) for f in html_files]
-            
+        self.process_pages(pending, max_workers=max_workers)
+
+    def create_process_pool(self, max_workers=None):
+        """创建整理用的进程池，每个工作进程初始化一个只负责渲染的 PageRenderer 并在所有任务中复用"""
+        return ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(self.blobs_dir,),
+        )
+
+    def process_pages(self, urls, max_workers=None):
+        """
+        整理指定的页面，刷新模式下只整理有变化的页面
+        executor 为 process 时使用进程池，HTML 解析不受 GIL 限制，可以用满所有 CPU 核心
+        :return: 生成的Markdown文件路径列表
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        total_files = len(urls)
+        out_paths, failed = [], 0
+        records = [self.store.get(url) for url in urls]
+        curated = {self.output_path(url): (url, record) for url, record in zip(urls, records)}
+        if self.executor == "process":
+            max_workers = max_workers or self.max_workers or os.cpu_count()
+            # 按块提交任务，减少进程间通信次数
+            chunksize = self.chunksize or max(1, min(64, total_files // (max_workers * 4)))
+            pool = self.create_process_pool(max_workers)
+            # 工作进程只负责转换，结果由主进程按提交顺序写出
+            results = (self.write_output(url, markdown) if markdown is not None else False for url, markdown in
+                       zip(urls, pool.map(curate_page, urls, records, chunksize=chunksize)))
+        else:
+            max_workers = max_workers or self.max_workers or 8
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+            results = (future.result() for future in
+                       as_completed([pool.submit(self.process_page, url, record) for url, record in zip(urls, records)]))
+        logger.info(f"使用 {max_workers} 个{'进程' if self.executor == 'process' else '线程'}整理页面")
+
+        with pool:
             # 使用tqdm创建进度条
             with tqdm(total=total_files, desc="处理HTML文件") as pbar:
-                for future in as_completed(futures):
-                    if future.result():
-                        processed += 1
+                for out_path in results:
+                    if out_path:
+                        out_paths.append(out_path)
+                        self.mark_curated(*curated[out_path])
                     else:
                         failed += 1
+                        build_metrics.current().add("curate", errors=1)
                     pbar.update(1)
+        self.save_manifest()
+
+        logger.info(f"目录处理完成: 总共处理 {len(out_paths)} 个文件, 失败 {failed} 个.")
+        print(f"总共处理 {len(out_paths)} 个文件, 失败 {failed} 个.")
+        return out_paths
+
+
+# 进程池模式下每个工作进程持有一个 PageRenderer，配置和日志只在进程启动时初始化一次
+_worker_renderer = None
+
+
+def _init_worker(blobs_dir):
+    global _worker_renderer
+    _worker_renderer = PageRenderer(blobs_dir, ConfigLoader())
+
 
-        logger.info(f"目录处理完成: 总共处理 {processed} 个文件, 失败 {failed} 个.")
-        print(f"总共处理 {processed} 个文件, 失败 {failed} 个.")
+def curate_page(url, record=None):
+    """进程池任务：用当前工作进程的 PageRenderer 把单个页面转换为 Markdown，由主进程写出"""
+    return _worker_renderer.render_page(url, record)
 
 def process(db_name: str):
     config = ConfigLoader()
     data_dir = os.path.join(config.project_root, "data", "database", db_name)
     input_dir = os.path.join(data_dir, "downloaded_sites")
 
-    max_threads = 20
-    
-    logger.info(f"启动页面整理器，使用 {max_threads} 个线程")
+    logger.info("启动页面整理器")
     curator = PageCurator(input_dir, config, db_name=db_name)
-    curator.process_directory(max_workers=max_threads)
+    curator.process_directory()
 
 if __name__ == "__main__":
     process("cesium")
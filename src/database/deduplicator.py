@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import json
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+import numpy as np
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.utils import build_metrics
+from src.utils.curated_pack import CuratedPackReader, has_pack
+from src.database.page_store import url_key
+from src.database.curator import CURATION_MANIFEST
+
+logger = Logger("deduplicator")
+
+DUPLICATES_FILE = "duplicates.json"
+TOKEN_RE = re.compile(r"\w+")
+# 2^61 - 1，MinHash 的模数
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+SHINGLE_BASE = np.uint64(1000003)
+
+
+def load_duplicates(curated_dir: str) -> Dict[str, str]:
+    """读取近重复页面表 {重复页面: 规范页面}，路径相对于 curated 目录"""
+    path = os.path.join(curated_dir, DUPLICATES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("pages", {})
+
+
+def changed_pages(before: Dict[str, str], after: Dict[str, str]) -> Set[str]:
+    """
+    比较两次检测的近重复页面表，返回状态有变化的页面：新成为或不再是近重复，或对应的规范页面改变。
+    增量刷新时这些页面内容可能没有变化，也需要重新向量化或删除向量
+    """
+    return {name for name in before.keys() | after.keys() if before.get(name) != after.get(name)}
+
+
+class PageDeduplicator:
+    """
+    MinHash + LSH 近重复页面检测
+
+    页面按词切分后取 shingle_size 个连续词作为 shingle，用 num_perm 个哈希函数计算 MinHash 签名，
+    签名分成若干段做局部敏感哈希，只与至少一段完全相同的规范页面比较估计的 Jaccard 相似度。
+    相似度不低于 threshold 的页面记为规范页面的重复。签名和 shingle 哈希都用 numpy 向量化计算。
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # 每段 rows 行：段内全部相同的概率为 s^rows，rows 越大候选越少
+        self.rows = 4 if num_perm % 4 == 0 else 1
+        self.bands = num_perm // self.rows
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, (1 << 61) - 1, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, (1 << 61) - 1, size=(num_perm, 1), dtype=np.uint64)
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.duplicates: Dict[str, str] = {}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        tokens = TOKEN_RE.findall(text.lower())
+        if not tokens:
+            return None
+        hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens))
+        k = min(self.shingle_size, len(hashes))
+        # 多项式滚动哈希，溢出按 2^64 取模
+        shingles = np.zeros(len(hashes) - k + 1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for i in range(k):
+                shingles = shingles * SHINGLE_BASE + hashes[i:len(hashes) - k + 1 + i]
+            shingles = np.unique(shingles >> np.uint64(32))
+            # (a * x + b) mod p，x < 2^32，a * x 在 uint64 中回绕，仍是一族足够均匀的哈希函数
+            return ((self.a * shingles + self.b) % MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def check(self, key: str, text: str) -> Optional[str]:
+        """
+        检测页面是否与已登记的规范页面近重复
+        :return: 近重复时返回规范页面，否则把该页面登记为规范页面并返回 None
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        bands = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = {c for band, bucket in zip(bands, self.buckets) for c in bucket.get(band, ())}
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = float(np.mean(self.signatures[candidate] == signature))
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is not None:
+            self.duplicates[key] = best
+            return best
+        self.signatures[key] = signature
+        for band, bucket in zip(bands, self.buckets):
+            bucket[band].append(key)
+        return None
+
+    def save(self, curated_dir: str):
+        path = os.path.join(curated_dir, DUPLICATES_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"threshold": self.threshold, "num_perm": self.num_perm, "shingle_size": self.shingle_size,
+                       "pages": self.duplicates}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _iter_curated(curated_dir: str, urls: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+    """
+    按规范优先的顺序遍历整理结果：URL 较短的页面优先，其次按字典序
+    :return: (相对 curated 目录的路径, 文本)
+    """
+    names = []
+    for root, dirs, files in os.walk(curated_dir):
+        for name in files:
+            if name.endswith((".md", ".txt")):
+                names.append(os.path.relpath(os.path.join(root, name), curated_dir))
+    reader = CuratedPackReader(curated_dir) if has_pack(curated_dir) else None
+    if reader is not None:
+        names.extend(key + ".md" for key in reader.entries)
+
+    def order(name):
+        url = urls.get(os.path.splitext(os.path.basename(name))[0], name)
+        return len(url), url
+
+    try:
+        for name in sorted(set(names), key=order):
+            path = os.path.join(curated_dir, name)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    yield name, f.read()
+            elif reader is not None:
+                yield name, reader.get(os.path.splitext(name)[0])
+    finally:
+        if reader is not None:
+            reader.close()
+
+
+def process(db_name: str):
+    """在整理和向量化之间检测近重复页面，结果写入 curated/duplicates.json"""
+    config = ConfigLoader()
+    options = config.get("dedup", {}) or {}
+    curated_dir = os.path.join(config.project_root, "data", "database", db_name, "curated")
+    if not options.get("pages", False) or not os.path.isdir(curated_dir):
+        if os.path.exists(os.path.join(curated_dir, DUPLICATES_FILE)):
+            os.remove(os.path.join(curated_dir, DUPLICATES_FILE))
+        return {}
+
+    # 整理清单中的URL决定规范页面的优先顺序
+    urls = {}
+    manifest_path = os.path.join(curated_dir, CURATION_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            urls = {url_key(url): url for url in json.load(f).get("pages", {})}
+
+    deduplicator = PageDeduplicator(
+        threshold=options.get("threshold", 0.9),
+        num_perm=options.get("num_perm", 64),
+        shingle_size=options.get("shingle_size", 5),
+    )
+    total = 0
+    metrics = build_metrics.current()
+    for name, text in _iter_curated(curated_dir, urls):
+        total += 1
+        metrics.add("dedup", items=1, bytes=len(text.encode("utf-8")))
+        canonical = deduplicator.check(name, text)
+        if canonical is not None:
+            logger.debug(f"近重复页面: {name} -> {canonical}")
+    deduplicator.save(curated_dir)
+    logger.info(f"近重复检测完成: {total} 个页面，其中 {len(deduplicator.duplicates)} 个为近重复，不参与向量化")
+    return deduplicator.duplicates
+
+
+if __name__ == "__main__":
+    process("cesium")
@@ -2,7 +2,7 @@ import os
 import aiohttp
 import asyncio
 import aiofiles
-from urllib.parse import urlparse
+import hashlib
 import time
 import sys
 
@@ -12,72 +12,248 @@ sys.path.append(project_root)
 
 from src.utils.config_loader import ConfigLoader
 from src.utils.logger import Logger
+from src.utils import build_metrics
+from src.database.page_store import PageStore
+from src.database.host_scheduler import HostScheduler
 
 config = ConfigLoader()
 logger = Logger("downloader")
 
 class SimpleAsyncDownloader:
-    def __init__(self, delay=1.0, max_connections=10, db_name=""):
+    def __init__(self, delay=1.0, max_connections=10, db_name="", per_host=2, max_retries=3,
+                 num_workers=None, queue_size=1000, report_interval=5.0, refresh=False):
+        """
+        :param delay: 同一主机两次请求的平均间隔（秒），即每个主机令牌桶的速率为 1/delay
+        :param max_connections: 全局最大并发连接数
+        :param per_host: 单个主机的最大并发连接数
+        :param max_retries: 收到 429/503 时的最大重试次数
+        :param num_workers: run() 中的下载协程数，默认为 max_connections 的两倍，等待主机令牌时其他协程可以继续请求其他主机
+        :param queue_size: run() 中待下载URL队列的容量
+        :param report_interval: 打印下载进度的间隔（秒）
+        :param refresh: 刷新模式，对已保存的页面携带 ETag / Last-Modified 发送条件请求，内容有变化时才覆盖
+        """
         self.delay = delay
         self.semaphore = asyncio.Semaphore(max_connections)
-        self.last_request_time = {}
+        self.scheduler = HostScheduler(rate=1.0 / delay if delay > 0 else 1000.0, max_connections_per_host=per_host)
+        self.max_retries = max_retries
+        self.num_workers = num_workers or max_connections * 2
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        # 只下载允许的内容类型，单个响应不超过 max_bytes 字节
+        self.allowed_content_types = {t.lower() for t in config.get("downloader.allowed_content_types", ["text/html", "application/xhtml+xml"])}
+        self.max_bytes = config.get("downloader.max_bytes", 10 * 1024 * 1024)
+        self.chunk_size = config.get("downloader.chunk_size", 64 * 1024)
         self.total_downloaded = 0
         self.skipped = 0
-        self.downloaded_sites_dir = os.path.join(config.project_root, "data", "database", db_name, "downloaded_sites")
         self.logger = Logger("downloader")
+        # 页面按内容哈希压缩保存，链接提取器爬取时已保存的页面也登记在这里，下载时直接跳过
+        self.store = PageStore(db_name)
+        self.captured = 0
+        self.refresh = refresh
+        self.unchanged = 0
+        # 刷新模式下内容有变化（或新增）的页面，下游只需要重新整理和向量化这些页面
+        self.changed_urls = []
+        self.changes_file = os.path.join(config.project_root, "data", "database", db_name, "urls", "changed_pages.txt")
+
+    def _conditional_headers(self, meta):
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
 
     async def fetch_and_save(self, session, url):
-        filepath = os.path.join(self.downloaded_sites_dir, url.split("/")[-1])
-        if not os.path.exists(filepath):
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-        # 已存在跳过
-        if os.path.exists(filepath):
-            self.logger.info(f"已存在，跳过：{url}")
-            self.skipped += 1
-            return
-
-        # 限速
-        domain = urlparse(url).netloc
-        now = time.time()
-        last = self.last_request_time.get(domain, 0)
-        if now - last < self.delay:
-            await asyncio.sleep(self.delay - (now - last))
-        self.last_request_time[domain] = time.time()
+        """
+        下载单个URL并存入页面存储
+        :return: URL（新下载或已保存），失败时返回 None
+        """
+        result = await self._fetch_and_save(session, url)
+        build_metrics.current().add("download", items=1, errors=int(result is None))
+        return result
+
+    async def _fetch_and_save(self, session, url):
+        previous = self.store.get(url) or {}
+        headers = {}
+        if self.store.has(url):
+            if self.refresh:
+                headers = self._conditional_headers(previous)
+            elif previous.get("fetched_by") == "links_extractor":
+                self.logger.info(f"爬取时已保存，跳过：{url}")
+                self.captured += 1
+                return url
+            else:
+                self.logger.info(f"已存在，跳过：{url}")
+                self.skipped += 1
+                return url
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                # 先按主机排队取得连接和令牌，再占用全局连接，慢主机不会挡住其他主机
+                async with self.scheduler.slot(url), self.semaphore:
+                    async with session.get(url, timeout=10, headers=headers) as resp:
+                        if self.scheduler.feedback(url, resp.status, resp.headers.get("Retry-After")) and attempt < self.max_retries:
+                            self.logger.warning(f"服务器要求降速：{url}，状态码：{resp.status}，第 {attempt + 1} 次重试")
+                            continue
+                        if resp.status == 304:
+                            self.logger.info(f"未修改：{url}")
+                            self.unchanged += 1
+                            return url
+                        if resp.status == 200:
+                            reason = self._reject_reason(resp)
+                            if reason:
+                                self.logger.warning(f"已过滤：{url}，{reason}")
+                                self.rejected += 1
+                                return None
+                            result = await self._stream_to_file(resp)
+                            if result is None:
+                                self.logger.warning(f"已过滤：{url}，响应超过 {self.max_bytes} 字节")
+                                self.rejected += 1
+                                return None
+                            tmp_path, content_hash = result
+                            if self.refresh and content_hash == previous.get("content_hash"):
+                                # 服务器不支持条件请求时，按内容哈希判断是否变化
+                                self.logger.info(f"内容未变化：{url}")
+                                self.unchanged += 1
+                            else:
+                                self.logger.info(f"下载成功：{url}")
+                                self.total_downloaded += 1
+                                self.changed_urls.append(url)
+                            # 压缩写入 blob，内容相同的页面只保存一份
+                            await asyncio.to_thread(
+                                self.store.put_file,
+                                url,
+                                tmp_path,
+                                content_hash,
+                                status=resp.status,
+                                content_type=resp.headers.get("Content-Type"),
+                                etag=resp.headers.get("ETag"),
+                                last_modified=resp.headers.get("Last-Modified"),
+                                fetched_by="downloader",
+                            )
+                            return url
+                        else:
+                            self.logger.warning(f"请求失败：{url}，状态码：{resp.status}")
+                            return None
+            except Exception as e:
+                self.logger.error(f"下载出错：{url}，错误：{e}")
+                return None
 
+    def _reject_reason(self, resp):
+        """根据响应头判断是否跳过下载，返回跳过原因"""
+        content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if self.allowed_content_types and content_type and content_type not in self.allowed_content_types:
+            return f"Content-Type 为 {content_type}"
+        if self.max_bytes and resp.content_length and resp.content_length > self.max_bytes:
+            return f"Content-Length {resp.content_length} 超过 {self.max_bytes} 字节"
+        return None
+
+    async def _stream_to_file(self, resp):
+        """
+        分块写入页面存储的临时文件
+        :return: (临时文件路径, 内容的 sha256)，超过 max_bytes 时删除临时文件并返回 None
+        """
+        tmp_path = self.store.temp_path()
+        size = 0
+        digest = hashlib.sha256()
         try:
-            async with self.semaphore:
-                async with session.get(url, timeout=10) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                        async with aiofiles.open(filepath, 'wb') as f:
-                            await f.write(content)
-                        self.logger.info(f"下载成功：{url}")
-                        self.total_downloaded += 1
-                    else:
-                        self.logger.warning(f"请求失败：{url}，状态码：{resp.status}")
-        except Exception as e:
-            self.logger.error(f"下载出错：{url}，错误：{e}")
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    size += len(chunk)
+                    # 没有 Content-Length 或声明不实时，在读取过程中截断
+                    if self.max_bytes and size > self.max_bytes:
+                        break
+                    digest.update(chunk)
+                    await f.write(chunk)
+            if self.max_bytes and size > self.max_bytes:
+                os.remove(tmp_path)
+                return None
+            build_metrics.current().add("download", bytes=size)
+            return tmp_path, digest.hexdigest()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def _reader(self, url_list_file, task_queue: asyncio.Queue):
+        """逐行读取URL放入有界队列，队列满时等待下载协程消费"""
+        with open(url_list_file, 'r') as f:
+            for line in f:
+                url = line.strip()
+                if url:
+                    await task_queue.put(url)
+        for _ in range(self.num_workers):
+            await task_queue.put(None)
+
+    async def _worker(self, session, task_queue: asyncio.Queue):
+        while True:
+            url = await task_queue.get()
+            if url is None:
+                break
+            if await self.fetch_and_save(session, url) is None:
+                self.failed += 1
+            self.processed += 1
+
+    async def _reporter(self, total: int):
+        last_done, last_time = 0, time.time()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.time()
+            rate = (self.processed - last_done) / (now - last_time)
+            last_done, last_time = self.processed, now
+            eta = (total - self.processed) / rate if rate > 0 else float('inf')
+            self.logger.info(
+                f"下载进度: {self.processed}/{total}，下载 {self.total_downloaded}，跳过 {self.skipped + self.captured + self.unchanged}，"
+                f"失败 {self.failed}，速率 {rate:.2f} 个/秒，预计剩余 {eta:.0f} 秒"
+            )
 
     async def run(self, url_list_file):
+        """
+        流式下载：URL 文件按行读入有界队列，由固定数量的下载协程消费，内存占用与链接总数无关
+        """
+        # 旧版本按URL最后一段保存的页面先导入页面存储，之后按已保存跳过，不必重新下载
+        self.store.import_legacy(url_list_file)
+        # 只统计行数用于进度估计，不在内存中保存URL
         with open(url_list_file, 'r') as f:
-            urls = [line.strip() for line in f if line.strip()]
+            total = sum(1 for line in f if line.strip())
+        self.logger.info(f"共 {total} 个URL，下载协程数: {self.num_workers}")
 
+        start_time = time.time()
+        task_queue = asyncio.Queue(maxsize=self.queue_size)
         async with aiohttp.ClientSession() as session:
-            tasks = [self.fetch_and_save(session, url) for url in urls]
-            await asyncio.gather(*tasks)
+            reporter = asyncio.create_task(self._reporter(total))
+            try:
+                await asyncio.gather(
+                    self._reader(url_list_file, task_queue),
+                    *[self._worker(session, task_queue) for _ in range(self.num_workers)],
+                )
+            finally:
+                reporter.cancel()
+
+        if self.refresh:
+            with open(self.changes_file, 'w', encoding='utf-8') as f:
+                for url in self.changed_urls:
+                    f.write(f"{url}\n")
+            self.logger.info(f"刷新完成：{len(self.changed_urls)} 个页面有变化，{self.unchanged} 个未变化，列表已保存至: {self.changes_file}")
 
-        self.logger.info(f"\n下载完成：共 {self.total_downloaded} 个页面，跳过 {self.skipped} 个")
+        elapsed = time.time() - start_time
+        self.logger.info(
+            f"\n下载完成：共 {self.total_downloaded} 个页面，跳过 {self.skipped} 个，爬取时已保存 {self.captured} 个，"
+            f"失败 {self.failed} 个（其中按类型或大小过滤 {self.rejected} 个），耗时 {elapsed:.2f} 秒，平均 {self.processed / max(elapsed, 1e-6):.2f} 个/秒"
+        )
 
 def process(db_name: str):
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--delay", "-d", type=float, default=1.0)
     parser.add_argument("--max", "-m", type=int, default=10)
+    parser.add_argument("--per-host", type=int, default=2)
     args = parser.parse_args()
 
-    downloader = SimpleAsyncDownloader(delay=args.delay, max_connections=args.max, db_name=db_name)
+    downloader = SimpleAsyncDownloader(delay=args.delay, max_connections=args.max, db_name=db_name, per_host=args.per_host)
     file_path = os.path.join(config.project_root, "data", "database", db_name, "urls", "extracted_links.txt")
     if os.path.exists(file_path):
         logger.info(f"开始从文件加载URL: {file_path}")
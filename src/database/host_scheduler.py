@@ -0,0 +1,105 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头，支持秒数和 HTTP 日期两种格式
+    :return: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    """单个主机的令牌桶、连接数上限和退避状态"""
+
+    def __init__(self, rate: float, burst: int, max_connections: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.connections = asyncio.Semaphore(max_connections)
+        self.backoff_until = 0.0
+        self.failures = 0
+
+    def reserve(self) -> float:
+        """
+        预定一个令牌，返回需要等待的秒数
+        检查与扣减之间没有 await，同一事件循环内的协程不会同时通过检查
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.backoff_until - now)
+
+
+class HostScheduler:
+    """
+    按主机调度请求
+
+    - 每个主机一个令牌桶，平均速率为 rate 次/秒，允许 burst 次突发
+    - 每个主机最多 max_connections_per_host 个并发连接，慢主机不会占满全局连接
+    - 收到 429/503 时该主机速率减半并暂停（优先使用 Retry-After），之后每次成功逐步恢复到初始速率
+    总吞吐随主机数量线性增长，而单个主机的请求频率始终受限。
+    """
+
+    BACKOFF_STATUS = {429, 503}
+
+    def __init__(self, rate: float = 1.0, burst: int = 1, max_connections_per_host: int = 2,
+                 min_rate: float = 0.05, max_backoff: float = 300.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_connections_per_host = max_connections_per_host
+        self.min_rate = min_rate
+        self.max_backoff = max_backoff
+        self.hosts: Dict[str, HostState] = {}
+
+    def _state(self, url: str) -> HostState:
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.rate, self.burst, self.max_connections_per_host)
+        return self.hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """占用目标主机的一个连接并等待令牌"""
+        state = self._state(url)
+        async with state.connections:
+            wait = state.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield
+
+    def feedback(self, url: str, status: Optional[int], retry_after: Optional[str] = None) -> bool:
+        """
+        根据响应调整主机速率
+        :return: 是否为需要退避重试的响应
+        """
+        state = self._state(url)
+        if status in self.BACKOFF_STATUS:
+            state.failures += 1
+            state.rate = max(self.min_rate, state.rate / 2)
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = 2 ** state.failures
+            state.backoff_until = max(state.backoff_until, time.monotonic() + min(delay, self.max_backoff))
+            return True
+        if status is not None and status < 400:
+            state.failures = 0
+            state.rate = min(state.base_rate, state.rate + state.base_rate * 0.1)
+        return False
@@ -13,9 +13,12 @@ from urllib.parse import urljoin
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from threading import Thread, Lock
-from typing import List, Set
+from typing import List, Set, Tuple
 from src.utils.config_loader import ConfigLoader
 from src.utils.logger import Logger
+from src.utils import build_metrics
+from src.database.page_store import PageStore
+from src.database.crawl_checkpoint import CrawlCheckpoint
 
 # 禁用SSL验证警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -36,18 +39,24 @@ class LinksExtractor:
         'Cache-Control': 'max-age=0',
     }
 
-    def __init__(self, db_name: str, max_depth: int = 3, num_threads: int = 20, file_path: str = None, required_prefix: str = None):
+    def __init__(self, db_name: str, max_depth: int = 3, num_threads: int = 20, file_path: str = None, required_prefix: str = None, link_callback=None, save_pages: bool = False, resume: bool = False):
         """
         初始化链接提取器
         :param db_name: 数据库名称
         :param max_depth: 最大爬取深度
         :param num_threads: 并发线程数
+        :param link_callback: 发现新链接时的回调，参数为链接URL，用于流水线构建时把链接实时交给下游
+        :param save_pages: 是否把爬取时获取的页面直接保存到页面存储（downloaded_sites），下载器会跳过这些URL
+        :param resume: 是否从 urls/crawl_state.sqlite 中的检查点继续上次中断的爬取
         """
         self.config = ConfigLoader()
         self.data_dir = os.path.join(self.config.project_root, 'data', 'database', db_name)
         self.max_depth = max_depth
         self.num_threads = num_threads
         self.required_prefix = required_prefix
+        self.link_callback = link_callback
+        self.save_pages = save_pages
+        self.resume = resume
         self.logger = Logger("links_extractor")
         
         # 设置文件路径
@@ -55,6 +64,8 @@ class LinksExtractor:
         self.urls_file = os.path.join(self.urls_dir, 'urls_to_extract.txt')
         self.output_file = os.path.join(self.urls_dir, "extracted_links.txt")
         self.error_file = os.path.join(self.urls_dir, "error_links.txt")
+        self.page_store = PageStore(db_name) if save_pages else None
+        self.checkpoint_file = os.path.join(self.urls_dir, 'crawl_state.sqlite')
         
         # 初始化锁
         self.file_lock = Lock()
@@ -68,6 +79,7 @@ class LinksExtractor:
         
         # 确保目录存在
         os.makedirs(self.urls_dir, exist_ok=True)
+        self.checkpoint = CrawlCheckpoint(self.checkpoint_file)
         
         # 如果file_path存在，则将file_path中的URL写入urls_to_extract.txt文件
         if file_path:
@@ -122,6 +134,85 @@ class LinksExtractor:
                     self.visited_urls.add(link)
         return unvisited
 
+    def init_frontier(self, start_urls: List[str]) -> List[Tuple[str, int]]:
+        """
+        确定初始待爬取队列
+        resume 时从检查点恢复已访问集合和未完成的URL，否则清空检查点从起始URL开始
+        """
+        if self.resume:
+            visited, pending = self.checkpoint.load()
+            if visited:
+                with self.visited_lock:
+                    self.visited_urls.update(visited)
+                self.logger.info(f"从检查点恢复: 已访问 {len(visited)} 个URL，待处理 {len(pending)} 个URL")
+                return pending
+            self.logger.info("未找到爬取检查点，从起始URL开始爬取")
+        self.checkpoint.reset()
+        frontier = [(url, 1) for url in self.get_unvisited_urls(set(start_urls))]
+        self.checkpoint.add_pending(frontier)
+        return frontier
+
+    def enqueue_links(self, links: Set[str], depth: int) -> List[str]:
+        """
+        筛选未访问的链接并登记到检查点，返回需要加入队列的链接
+        """
+        unvisited = self.get_unvisited_urls(links)
+        self.checkpoint.add_pending((link, depth) for link in unvisited)
+        return unvisited
+
+    def save_page(self, url: str, content: bytes, status: int, headers):
+        """
+        把已获取的页面写入页面存储并登记响应元数据，避免下载器再次请求
+        """
+        if self.required_prefix and not url.startswith(self.required_prefix):
+            return
+        self.page_store.put_bytes(
+            url,
+            content,
+            status=status,
+            content_type=headers.get('Content-Type'),
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            fetched_by="links_extractor",
+        )
+
+    def extract_links(self, url: str, html: str) -> Set[str]:
+        """
+        从页面HTML中提取符合前缀的链接，新链接追加写入输出文件
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        found_links = set()
+        new_links_count = 0
+
+        for a in soup.find_all('a'):
+            href = a.get('href')
+            if not href or href.startswith('javascript:') or href.startswith('#'):
+                continue
+
+            absolute_url = urljoin(url, href).split('#')[0]
+            if absolute_url.startswith(self.required_prefix):
+                found_links.add(absolute_url)
+                with self.file_lock:
+                    is_new = absolute_url not in self.existing_links
+                    if is_new:
+                        self.existing_links.add(absolute_url)
+                        new_links_count += 1
+                        with open(self.output_file, 'a', encoding='utf-8') as f:
+                            f.write(f'{absolute_url}\n')
+                # 回调放在锁外，下游队列已满时只阻塞当前线程
+                if is_new and self.link_callback:
+                    self.link_callback(absolute_url)
+
+        self.logger.info(f'在 {url} 中找到 {len(found_links)} 个链接，其中 {new_links_count} 个为新链接')
+        return found_links
+
+    def record_error(self, url: str, error_message: str):
+        self.logger.error(f'处理失败 {url}: {error_message}')
+        build_metrics.current().add("extract", errors=1)
+        with self.file_lock:
+            with open(self.error_file, 'a', encoding='utf-8') as f:
+                f.write(f'{url}\t{error_message}\n')
+
     def process_page(
         self,
         url: str,
@@ -134,35 +225,13 @@ class LinksExtractor:
             self.logger.info(f'正在处理: {url}')
             response = session.get(url, timeout=30)
             response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            found_links = set()
-            new_links_count = 0
-
-            for a in soup.find_all('a'):
-                href = a.get('href')
-                if not href or href.startswith('javascript:') or href.startswith('#'):
-                    continue
-
-                absolute_url = urljoin(url, href).split('#')[0]
-                if absolute_url.startswith(self.required_prefix):
-                    found_links.add(absolute_url)
-                    with self.file_lock:
-                        if absolute_url not in self.existing_links:
-                            self.existing_links.add(absolute_url)
-                            new_links_count += 1
-                            with open(self.output_file, 'a', encoding='utf-8') as f:
-                                f.write(f'{absolute_url}\n')
-
-            self.logger.info(f'在 {url} 中找到 {len(found_links)} 个链接，其中 {new_links_count} 个为新链接')
-            return found_links
+            build_metrics.current().add("extract", items=1, bytes=len(response.content))
+            if self.save_pages:
+                self.save_page(url, response.content, response.status_code, response.headers)
+            return self.extract_links(url, response.text)
 
         except Exception as e:
-            error_message = f'处理失败: {e}'
-            self.logger.error(f'处理失败 {url}: {error_message}')
-            with self.file_lock:
-                with open(self.error_file, 'a', encoding='utf-8') as f:
-                    f.write(f'{url}\t{error_message}\n')
+            self.record_error(url, f'处理失败: {e}')
             return set()
 
     def worker(
@@ -177,6 +246,7 @@ class LinksExtractor:
             try:
                 url, depth = task_queue.get(timeout=5)
                 if depth > self.max_depth:
+                    self.checkpoint.mark_done(url)
                     task_queue.task_done()
                     continue
 
@@ -185,13 +255,15 @@ class LinksExtractor:
                     self.all_links.update(links)
 
                 if depth < self.max_depth:
-                    unvisited = self.get_unvisited_urls(links)
+                    unvisited = self.enqueue_links(links, depth + 1)
                     for link in unvisited:
                         task_queue.put((link, depth + 1))
                     self.logger.info(f'处理 {url} 完成，深度: {depth}，新增 {len(unvisited)} 个链接到队列')
                 else:
                     self.logger.info(f'处理 {url} 完成，达到最大深度 {depth}，不再继续爬取')
 
+                # 新链接先于当前页面的完成状态写入检查点
+                self.checkpoint.mark_done(url)
                 task_queue.task_done()
                 time.sleep(0.5)
 
@@ -211,10 +283,9 @@ class LinksExtractor:
         task_queue = queue.Queue()
         sessions = [self.create_session() for _ in range(self.num_threads)]
 
-        # 将初始URL放入队列
-        to_visit = self.get_unvisited_urls(set(start_urls))
-        for url in to_visit:
-            task_queue.put((url, 1))
+        # 将初始URL（或检查点中未完成的URL）放入队列
+        for url, depth in self.init_frontier(start_urls):
+            task_queue.put((url, depth))
         self.logger.info(f"已添加 {task_queue.qsize()} 个起始URL到队列")
 
         # 启动工作线程
@@ -270,6 +341,7 @@ class LinksExtractor:
             if t.is_alive():
                 t.join(1)
 
+        self.checkpoint.flush()
         return self.all_links
 
     def process(self, required_prefix: str = ""):
@@ -0,0 +1,58 @@
+import os
+import json
+import sys
+import time
+from threading import Lock
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+
+
+class PageMetaStore:
+    """
+    已保存页面的响应元数据，也是 PageStore 的 URL -> blob 清单
+
+    存储在 urls/page_meta.jsonl 中，每行一条记录，同一URL后写入的记录覆盖先前的记录。
+    链接提取器在爬取时保存的页面和下载器下载的页面都会登记在这里，下载器据此跳过已抓取的URL。
+    """
+
+    def __init__(self, db_name: str):
+        config = ConfigLoader()
+        self.path = os.path.join(config.project_root, "data", "database", db_name, "urls", "page_meta.jsonl")
+        self.lock = Lock()
+        self.records = {}
+        self.load()
+
+    def load(self):
+        self.records.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时可能留下不完整的最后一行
+                    continue
+                self.records[record["url"]] = record
+
+    def record(self, url: str, **meta):
+        """登记一条页面元数据并追加写入文件"""
+        record = {"url": url, "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S"), **meta}
+        with self.lock:
+            self.records[url] = record
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    def get(self, url: str):
+        return self.records.get(url)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.records
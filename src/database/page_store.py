@@ -0,0 +1,228 @@
+import io
+import os
+import sys
+import gzip
+import shutil
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.database.page_meta import PageMetaStore
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+BLOBS_DIR = "blobs"
+TMP_DIR = "tmp"
+# 旧版本页面导入完成的标记文件
+LEGACY_MARKER = ".legacy_imported"
+COMPRESSION_SUFFIX = {"zstd": ".zst", "gzip": ".gz", "none": ".raw"}
+
+logger = Logger("page_store")
+
+
+def url_key(url: str) -> str:
+    """URL 的哈希键，用于命名与URL一一对应的文件（如 curated 下的 Markdown）"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def blob_path(blobs_dir: str, content_hash: str, compression: str) -> str:
+    return os.path.join(blobs_dir, content_hash[:2], content_hash + COMPRESSION_SUFFIX[compression])
+
+
+def read_blob(blobs_dir: str, record: Dict) -> bytes:
+    """按清单记录读取并解压页面内容，只需要 blob 目录，不需要加载清单"""
+    compression = record.get("compression", "none")
+    with open(blob_path(blobs_dir, record["blob"], compression), "rb") as f:
+        if compression == "zstd":
+            with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                return reader.readall()
+        if compression == "gzip":
+            return gzip.GzipFile(fileobj=f, mode="rb").read()
+        return f.read()
+
+
+class PageStore:
+    """
+    downloaded_sites/ 下的内容寻址页面存储
+
+    - blobs/<哈希前两位>/<sha256><后缀>: 按内容哈希命名的压缩页面，内容相同的URL共用一个 blob
+    - urls/page_meta.jsonl: URL -> blob 的清单（PageMetaStore），同时记录状态码、ETag 等响应元数据
+
+    文件名与URL无关，不同URL不会互相覆盖；写入先落到临时文件再原子替换。
+    """
+
+    def __init__(self, db_name: str, compression: Optional[str] = None):
+        config = ConfigLoader()
+        self.root = os.path.join(config.project_root, "data", "database", db_name, "downloaded_sites")
+        self.blobs_dir = os.path.join(self.root, BLOBS_DIR)
+        self.tmp_dir = os.path.join(self.root, TMP_DIR)
+        compression = compression or config.get("downloader.compression", "zstd")
+        if compression not in COMPRESSION_SUFFIX:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("未安装 zstandard，页面改用 gzip 压缩")
+            compression = "gzip"
+        self.compression = compression
+        self.manifest = PageMetaStore(db_name)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def blob_path(self, content_hash: str, compression: str) -> str:
+        return blob_path(self.blobs_dir, content_hash, compression)
+
+    def temp_path(self) -> str:
+        """下载器写入原始响应使用的临时文件路径"""
+        return os.path.join(self.tmp_dir, f"{os.getpid()}.{threading.get_ident()}.{os.urandom(4).hex()}.tmp")
+
+    def get(self, url: str) -> Optional[Dict]:
+        return self.manifest.get(url)
+
+    def has(self, url: str) -> bool:
+        """URL 已登记且对应的 blob 存在"""
+        record = self.manifest.get(url)
+        return bool(record and record.get("blob") and
+                    os.path.exists(self.blob_path(record["blob"], record.get("compression", "none"))))
+
+    def _open_writer(self, f):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).stream_writer(f, closefd=False)
+        if self.compression == "gzip":
+            return gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6)
+        return None
+
+    def _write_blob(self, content_hash: str, src) -> str:
+        """把文件对象 src 的内容压缩写入 blob，内容已存在时直接复用"""
+        path = self.blob_path(content_hash, self.compression)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                writer = self._open_writer(f)
+                shutil.copyfileobj(src, writer or f, 1024 * 1024)
+                if writer is not None:
+                    writer.close()
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def _record(self, url: str, content_hash: str, size: int, **meta) -> Dict:
+        return self.manifest.record(
+            url,
+            key=url_key(url),
+            blob=content_hash,
+            compression=self.compression,
+            content_hash=content_hash,
+            size=size,
+            **meta,
+        )
+
+    def put_bytes(self, url: str, content: bytes, **meta) -> Dict:
+        """保存页面内容并登记到清单，返回清单记录"""
+        content_hash = hashlib.sha256(content).hexdigest()
+        self._write_blob(content_hash, io.BytesIO(content))
+        return self._record(url, content_hash, len(content), **meta)
+
+    def put_file(self, url: str, src_path: str, content_hash: str, **meta) -> Dict:
+        """
+        把已写入临时文件的原始响应压缩存入 blob 并删除临时文件
+        :param content_hash: 下载时边写边算的 sha256
+        """
+        try:
+            size = os.path.getsize(src_path)
+            with open(src_path, "rb") as src:
+                self._write_blob(content_hash, src)
+        finally:
+            if os.path.exists(src_path):
+                os.remove(src_path)
+        return self._record(url, content_hash, size, **meta)
+
+    def read_record(self, record: Dict) -> bytes:
+        return read_blob(self.blobs_dir, record)
+
+    def read(self, url: str) -> bytes:
+        record = self.manifest.get(url)
+        if not record or not record.get("blob"):
+            raise KeyError(f"页面不存在: {url}")
+        return self.read_record(record)
+
+    def import_legacy(self, url_list_file: str) -> int:
+        """
+        把旧版本下载器保存的 downloaded_sites/<URL最后一段> 页面导入页面存储，只在第一次运行时执行。
+        旧文件名只保留了URL的最后一段，按已提取的链接还原URL；多个URL对应同一个文件名时无法确定归属，
+        与找不到对应URL的文件一样不导入，这些页面之后会重新下载
+        :return: 导入的页面数
+        """
+        marker = os.path.join(self.root, LEGACY_MARKER)
+        if os.path.exists(marker):
+            return 0
+        legacy = {name for name in os.listdir(self.root)
+                  if not name.startswith(".") and os.path.isfile(os.path.join(self.root, name))}
+        if not legacy:
+            return 0
+        if not os.path.exists(url_list_file):
+            logger.warning(f"发现 {len(legacy)} 个旧版本下载的页面，但链接列表 {url_list_file} 不存在，暂不导入")
+            return 0
+
+        urls_by_name = defaultdict(list)
+        with open(url_list_file, "r", encoding="utf-8") as f:
+            for line in f:
+                url = line.strip()
+                if url and url.split("/")[-1] in legacy:
+                    urls_by_name[url.split("/")[-1]].append(url)
+        imported = ambiguous = 0
+        for name, urls in urls_by_name.items():
+            if len(urls) > 1:
+                ambiguous += 1
+                continue
+            if self.manifest.get(urls[0]) is None:
+                with open(os.path.join(self.root, name), "rb") as f:
+                    self.put_bytes(urls[0], f.read(), status=200, fetched_by="legacy_import")
+                imported += 1
+        logger.info(f"已把 {imported} 个旧版本下载的页面导入页面存储")
+        if ambiguous or len(legacy) > len(urls_by_name):
+            logger.warning(
+                f"{ambiguous} 个旧文件名对应多个URL，{len(legacy) - len(urls_by_name)} 个旧文件找不到对应URL，"
+                f"这些页面需要重新下载；旧文件保留在 {self.root}，确认后可以手动删除"
+            )
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(time.strftime("%Y-%m-%d %H:%M:%S"))
+        return imported
+
+    def iter_records(self, unique: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """
+        遍历清单中已保存的页面，只读取清单不解压内容
+        :param unique: 为 True 时内容相同的URL只返回第一个
+        """
+        seen = set()
+        for url, record in list(self.manifest.records.items()):
+            blob = record.get("blob")
+            if not blob:
+                continue
+            if unique:
+                if blob in seen:
+                    continue
+                seen.add(blob)
+            yield url, record
+
+    def iter_pages(self, unique: bool = True) -> Iterator[Tuple[str, bytes]]:
+        """按清单顺序逐个解压页面，返回 (url, 内容)"""
+        for url, record in self.iter_records(unique=unique):
+            try:
+                yield url, self.read_record(record)
+            except FileNotFoundError:
+                logger.warning(f"页面内容缺失: {url}")
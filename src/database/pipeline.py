@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import queue
+import asyncio
+import aiohttp
+from threading import Thread, Lock, Event
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+
+from langchain_core.documents import Document
+
+from src.database.links_extractor import LinksExtractor
+from src.database.async_links_extractor import AsyncLinksExtractor
+from src.database.downloader import SimpleAsyncDownloader
+from src.database.curator import PageCurator, curate_page
+from src.database.vectorizator import Vectorizator
+from src.database.deduplicator import PageDeduplicator
+from src.utils.config_loader import ConfigLoader
+from src.utils.logger import Logger
+from src.utils import build_metrics
+
+# 队列结束标记
+_DONE = object()
+
+
+class StreamingBuildPipeline:
+    """
+    流水线式构建知识库
+
+    链接提取、下载、整理、切分与向量化五个阶段同时运行，阶段之间通过有界队列连接：
+    下游处理不过来时上游在 put 上阻塞（背压），整体耗时接近最慢阶段而不是各阶段之和。
+
+    crawl --url_queue--> download --html_queue--> curate --md_queue--> split + embed
+    """
+
+    def __init__(self, db_name: str, embeddings_model: dict, required_prefix: str = "", index_options: dict = None,
+                 queue_size: int = 1000, delay: float = 1.0, max_connections: int = 10, curate_workers: int = 8,
+                 crawler: str = "thread", resume: bool = False, rebuild: bool = False):
+        """
+        :param rebuild: 为 True 时忽略整理清单重新整理全部页面，并完整重建向量库
+        """
+        self.config = ConfigLoader()
+        self.db_name = db_name
+        self.embeddings_model = embeddings_model
+        self.required_prefix = required_prefix
+        self.crawler = crawler
+        self.resume = resume
+        self.rebuild = rebuild
+        self.max_connections = max_connections
+        self.curate_workers = curate_workers
+        self.logger = Logger("pipeline")
+
+        self.url_queue = queue.Queue(maxsize=queue_size)
+        self.html_queue = queue.Queue(maxsize=queue_size)
+        self.md_queue = queue.Queue(maxsize=queue_size)
+
+        self.downloader = SimpleAsyncDownloader(delay=delay, max_connections=max_connections, db_name=db_name)
+        input_dir = os.path.join(self.config.project_root, "data", "database", db_name, "downloaded_sites")
+        self.curator = PageCurator(input_dir, self.config, db_name=db_name)
+        self.vectorizator = Vectorizator(self.config, db_name, embeddings_model, index_options)
+        self.curate_pool = None
+
+        self.stats_lock = Lock()
+        # 流水线中按整理完成的先后顺序在线检测近重复页面，先到的页面作为规范页面
+        dedup_options = self.config.get("dedup", {}) or {}
+        self.deduplicator = None
+        if dedup_options.get("pages", False):
+            self.deduplicator = PageDeduplicator(
+                threshold=dedup_options.get("threshold", 0.9),
+                num_perm=dedup_options.get("num_perm", 64),
+                shingle_size=dedup_options.get("shingle_size", 5),
+            )
+        self.stats = {"links": 0, "downloaded": 0, "curated": 0, "duplicates": 0, "chunks": 0}
+        # 各阶段线程中抛出的异常，由 run() 在当前线程重新抛出
+        self.errors = []
+
+    def _guard(self, target, *args):
+        """在线程中运行阶段函数，记录异常而不是让线程静默退出"""
+        try:
+            target(*args)
+        except BaseException as e:
+            self.logger.error(f"流水线阶段 {target.__name__} 失败: {e!r}")
+            with self.stats_lock:
+                self.errors.append(e)
+
+    def _count(self, key: str, n: int = 1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    def _crawl_stage(self, file_path: str):
+        """链接提取：每发现一个新链接立即放入下载队列"""
+        def on_new_link(url):
+            self.url_queue.put(url)
+            self._count("links")
+
+        extractor_cls = AsyncLinksExtractor if self.crawler == "async" else LinksExtractor
+        extractor = extractor_cls(db_name=self.db_name, file_path=file_path, required_prefix=self.required_prefix,
+                                      link_callback=on_new_link, resume=self.resume)
+        # 之前运行中已提取的链接不会再次触发回调，先交给下游
+        if os.path.exists(extractor.output_file):
+            with open(extractor.output_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        on_new_link(line.strip())
+        try:
+            with build_metrics.current().stage("extract"):
+                extractor.process()
+        finally:
+            self.url_queue.put(_DONE)
+
+    def _download_stage(self):
+        """下载：固定数量的协程从队列中取URL，下载成功的文件交给整理阶段"""
+        async def feeder(async_queue: asyncio.Queue):
+            loop = asyncio.get_running_loop()
+            while True:
+                url = await loop.run_in_executor(None, self.url_queue.get)
+                if url is _DONE:
+                    break
+                await async_queue.put(url)
+            for _ in range(self.max_connections):
+                await async_queue.put(_DONE)
+
+        # 内容相同的页面共用一个 blob，只交给下游一次
+        seen_blobs = set()
+
+        async def worker(session, async_queue: asyncio.Queue):
+            loop = asyncio.get_running_loop()
+            while True:
+                url = await async_queue.get()
+                if url is _DONE:
+                    break
+                if not await self.downloader.fetch_and_save(session, url):
+                    continue
+                blob = self.downloader.store.get(url)["blob"]
+                if blob not in seen_blobs:
+                    seen_blobs.add(blob)
+                    await loop.run_in_executor(None, self.html_queue.put, url)
+                    self._count("downloaded")
+
+        async def run():
+            async_queue = asyncio.Queue(maxsize=self.max_connections * 2)
+            async with aiohttp.ClientSession() as session:
+                await asyncio.gather(feeder(async_queue), *[worker(session, async_queue) for _ in range(self.max_connections)])
+
+        try:
+            with build_metrics.current().stage("download"):
+                asyncio.run(run())
+        finally:
+            for _ in range(self.curate_workers):
+                self.html_queue.put(_DONE)
+
+    def _curate_worker(self):
+        """整理：HTML 转 Markdown。无论是否出错都向下游发送结束标记，否则向量化阶段会一直等待"""
+        try:
+            self._curate_loop()
+        finally:
+            self.md_queue.put(_DONE)
+
+    def _curate_loop(self):
+        while True:
+            url = self.html_queue.get()
+            if url is _DONE:
+                break
+            with build_metrics.current().stage("curate"):
+                record = self.downloader.store.get(url)
+                if self.curator.is_current(url, record):
+                    # 页面内容与上次整理时相同，直接使用已有的整理结果
+                    docs = self.vectorizator.load_sources([self.curator.output_path(url)])
+                else:
+                    if self.curate_pool is not None:
+                        # 当前线程只负责等待，HTML 解析在工作进程中进行
+                        markdown = self.curate_pool.submit(curate_page, url, record).result()
+                    else:
+                        markdown = self.curator.render_page(url, record)
+                    out_path = self.curator.write_output(url, markdown) if markdown is not None else False
+                    if not out_path:
+                        build_metrics.current().add("curate", errors=1)
+                    # 直接把整理结果交给下一阶段，不再从磁盘读回
+                    docs = [Document(page_content=markdown, metadata={"source": out_path})] if out_path else []
+            if docs:
+                self.curator.mark_curated(url, record)
+                self.md_queue.put(docs)
+                self._count("curated")
+
+    def _iter_chunks(self):
+        """从整理阶段逐个取出页面，去重、切分后按页面产出切片，直到所有整理线程结束"""
+        finished_workers = 0
+        while finished_workers < self.curate_workers:
+            docs = self.md_queue.get()
+            if docs is _DONE:
+                finished_workers += 1
+                if self.errors:
+                    # 有整理线程失败，不再发布不完整的向量库
+                    raise self.errors[0]
+                continue
+            if self.deduplicator is not None:
+                name = os.path.relpath(docs[0].metadata["source"], self.curator.output_dir)
+                with build_metrics.current().stage("dedup"):
+                    canonical = self.deduplicator.check(name, docs[0].page_content)
+                build_metrics.current().add("dedup", items=1, bytes=len(docs[0].page_content.encode("utf-8")))
+                if canonical is not None:
+                    self._count("duplicates")
+                    continue
+            try:
+                chunks = self.vectorizator.split_documents(docs)
+            except Exception as e:
+                self.logger.error(f"切分文件 {docs[0].metadata['source']} 失败: {e}")
+                build_metrics.current().add("split", errors=1)
+                continue
+            self._count("chunks", len(chunks))
+            yield chunks
+
+    def _embed_stage(self, old):
+        """
+        切分与向量化，与 Vectorizator.process 相同：
+        有可复用的切片清单时只为新增或变化的切片计算向量，并删除本次没有出现的页面的切片
+        :param old: 当前版本的切片清单，为 None 时完整构建
+        """
+        vectorizator = self.vectorizator
+        if old is not None:
+            self.logger.info("按切片清单增量构建...")
+            vectorizator._incremental_build(self._iter_chunks(), old)
+        else:
+            vectorizator.open_vectorstore(vectorizator.persist_path, vectorizator.embeddings_model)
+            vectorizator._feed(self._iter_chunks())
+            vectorizator.close_vectorstore()
+        if self.deduplicator is not None:
+            self.deduplicator.save(self.curator.output_dir)
+
+    def run(self, file_path: str):
+        # 与批量构建相同：已有向量库可以复用时在当前版本的副本上增量构建，rebuild 时完整构建
+        old = None if self.rebuild else self.vectorizator._load_manifest()
+        self.vectorizator.prepare_persist_path(copy_current=old is not None)
+        os.makedirs(self.curator.output_dir, exist_ok=True)
+        # 导入旧版本下载的页面，链接列表来自上次运行的链接提取
+        self.downloader.store.import_legacy(
+            os.path.join(self.config.project_root, "data", "database", self.db_name, "urls", "extracted_links.txt"))
+        if self.rebuild:
+            self.curator.manifest.clear()
+        if self.curator.executor == "process":
+            self.curate_pool = self.curator.create_process_pool(self.curate_workers)
+
+        start_time = time.time()
+        threads = [
+            Thread(target=self._guard, args=(self._crawl_stage, file_path), name="pipeline-crawl", daemon=True),
+            Thread(target=self._guard, args=(self._download_stage,), name="pipeline-download", daemon=True),
+            *[Thread(target=self._guard, args=(self._curate_worker,), name=f"pipeline-curate-{i+1}", daemon=True)
+              for i in range(self.curate_workers)],
+        ]
+        for t in threads:
+            t.start()
+
+        monitor_stop = Event()
+
+        def monitor():
+            while not monitor_stop.wait(5):
+                self.logger.info(
+                    f"流水线状态: {self.stats}, 队列: url={self.url_queue.qsize()}, "
+                    f"html={self.html_queue.qsize()}, md={self.md_queue.qsize()}"
+                )
+
+        Thread(target=monitor, name="pipeline-monitor", daemon=True).start()
+        # 最后一个阶段在当前线程运行，它结束时上游各阶段都已结束
+        try:
+            self._embed_stage(old)
+            for t in threads:
+                t.join()
+            if self.errors:
+                raise self.errors[0]
+        except BaseException:
+            self.vectorizator.discard_persist_path()
+            if self.curate_pool is not None:
+                self.curate_pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            monitor_stop.set()
+
+        if self.curate_pool is not None:
+            self.curate_pool.shutdown()
+        self.curator.save_manifest()
+        # 新版本全部写入后才切换，构建期间查询继续使用当前版本
+        self.vectorizator.publish_persist_path()
+        self.logger.info(f"流水线构建完成，耗时 {time.time() - start_time:.2f} 秒: {self.stats}")
+
+
+def process(db_name: str, file_path: str, embeddings_model: dict, required_prefix: str = "", index_options: dict = None,
+            crawler: str = "thread", resume: bool = False, rebuild: bool = False):
+    pipeline = StreamingBuildPipeline(db_name, embeddings_model, required_prefix=required_prefix, index_options=index_options,
+                                      crawler=crawler, resume=resume, rebuild=rebuild)
+    pipeline.run(file_path)
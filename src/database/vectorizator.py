@@ -2,22 +2,41 @@
 # -*- coding: utf-8 -*-
 
 import os
-import shutil
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, UnstructuredPDFLoader, UnstructuredWordDocumentLoader, UnstructuredMarkdownLoader
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from langchain_community.document_loaders import TextLoader, UnstructuredPDFLoader, UnstructuredWordDocumentLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 import openai
 import sys
+from tqdm import tqdm
 
 # 添加项目根目录到系统路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
 
 from src.utils.logger import Logger
+from src.utils.embedding_provider import get_embedding_provider
+from src.utils.embedding_scheduler import EmbeddingScheduler
+from src.utils.vector_index import MMAP_INDEX_DIR, MmapIndexWriter, read_store_meta, write_store_meta
+from src.utils.markdown_chunker import MarkdownChunker
+from src.utils.curated_pack import CuratedPackReader, has_pack, pack_key
+from src.utils import build_metrics
+from src.utils.index_versions import create_version, discard_version, gc_versions, publish_version, resolve_store_path, snapshot_curated
+from src.database.chunk_manifest import ChunkManifest
+from src.database.deduplicator import load_duplicates
+
+# 文件扩展名 -> (加载线程池类型, 加载器)
+LOADERS = {
+    ".txt": ("text", TextLoader),
+    ".md": ("text", TextLoader),
+    ".pdf": ("pdf", UnstructuredPDFLoader),
+    ".docx": ("docx", UnstructuredWordDocumentLoader),
+}
 
 class Vectorizator:
-    def __init__(self, config, db_name, embeddings_model):
+    def __init__(self, config, db_name, embeddings_model, index_options=None):
         self.config = config
         self.db_name = db_name
         self.embeddings_model = embeddings_model
@@ -28,52 +47,458 @@ class Vectorizator:
         
         # 设置路径
         self.folder_path = os.path.join(config.project_root, "data", "database", db_name, "curated")
-        self.persist_path = os.path.join(config.project_root, "data", "database", db_name, "chroma_openai", embeddings_model['model'])
-
-    def load_documents_from_folder(self, folder_path):
-        self.logger.info(f"开始扫描目录: {folder_path}")
-        loaders = [
-            DirectoryLoader(folder_path, glob="**/*.txt", loader_cls=TextLoader, show_progress=True),
-            DirectoryLoader(folder_path, glob="**/*.pdf", loader_cls=UnstructuredPDFLoader, show_progress=True),
-            DirectoryLoader(folder_path, glob="**/*.docx", loader_cls=UnstructuredWordDocumentLoader, show_progress=True),
-            DirectoryLoader(folder_path, glob="**/*.md", loader_cls=TextLoader, show_progress=True),
-        ]
-        all_docs = []
-        for loader in loaders:
+        # 每次构建写入 chroma_openai/<model>/versions/ 下的新版本，完成后切换 CURRENT 指针；
+        # persist_path 在构建前指向当前版本，构建中指向正在写入的新版本
+        self.model_dir = os.path.join(config.project_root, "data", "database", db_name, "chroma_openai", embeddings_model['model'])
+        self.persist_path = resolve_store_path(self.model_dir)
+        # 切换后保留的版本数（含当前版本）
+        self.keep_versions = config.get("vectordb.keep_versions", 2)
+
+        # 索引格式: backend 为 chroma 时写入 Chroma，为 mmap 时只写入内存映射索引；
+        # mmap_index.enabled 为 true 时在 Chroma 之外额外写一份 mmap 索引
+        self.backend = config.get("vectordb.backend", "chroma")
+        # index_options 为知识库级别的覆盖配置（如 quantization、rescore_factor），优先于 config.json
+        index_options = dict(index_options or {})
+        # embedding_dim: 截短后的向量维度（text-embedding-3 系列或本地模型），为空时使用完整维度
+        self.embedding_dim = index_options.pop("embedding_dim", None) or embeddings_model.get("dimensions")
+        if not self.embedding_dim:
+            # 没有显式指定维度时沿用当前版本的维度，只有显式指定不同的维度才会完整重建
+            store_meta = read_store_meta(self.persist_path)
+            if store_meta.get("model") == embeddings_model["model"] and store_meta.get("dimensions"):
+                self.embedding_dim = store_meta["dimensions"]
+                self.logger.info(f"未指定向量维度，沿用已有向量库的 {self.embedding_dim} 维")
+        if self.embedding_dim:
+            self.embeddings_model = dict(embeddings_model, dimensions=self.embedding_dim)
+        self.mmap_options = dict(config.get("vectordb.mmap_index", {}) or {})
+        self.mmap_options.update(index_options)
+        self.write_mmap = (
+            self.backend == "mmap"
+            or self.mmap_options.get("enabled", False)
+            or self.mmap_options.get("quantization", "none") != "none"
+        )
+        self.embedding_batch_size = config.get("vectordb.embedding_batch_size", 256)
+        # 并发批量 embedding 的 token 上限、并发数、RPM / TPM 预算和重试次数
+        self.scheduler_options = config.get("vectordb.embedding_scheduler", {}) or {}
+        # 按目录缓存的打包分片读取器
+        self._pack_readers = {}
+        # 切分方式：markdown 按标题和代码块结构切分 .md 文档，recursive 按固定长度切分
+        chunker_options = dict(config.get("vectordb.chunker", {}) or {})
+        self.chunker = chunker_options.pop("type", "recursive")
+        self.markdown_chunker = MarkdownChunker(**chunker_options) if self.chunker == "markdown" else None
+        # 内容完全相同的切片只计算一次向量；默认关闭，开启会改变全部向量ID
+        self.dedup_chunks = config.get("dedup.chunks", False)
+        # 各类文件的加载线程数
+        self.loader_workers = {"text": 8, "pdf": 2, "docx": 2}
+        self.loader_workers.update(config.get("vectordb.loader_workers", {}) or {})
+
+    def _list_sources(self, folder_path):
+        """
+        按加载器类型列出目录下待加载的文件，打包分片中的页面归入 text 类
+        :return: {类型: deque([(加载函数, 参数), ...])}
+        """
+        tasks = {kind: deque() for kind in self.loader_workers}
+        # 去重阶段标记的近重复页面不参与向量化
+        duplicates = load_duplicates(folder_path)
+        if duplicates:
+            self.logger.info(f"跳过 {len(duplicates)} 个近重复页面")
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            for name in sorted(files):
+                loader = LOADERS.get(os.path.splitext(name)[1].lower())
+                if os.path.relpath(os.path.join(root, name), folder_path) in duplicates:
+                    continue
+                if loader is not None:
+                    kind, loader_cls = loader
+                    tasks[kind].append((self._load_file, (loader_cls, os.path.join(root, name))))
+        if has_pack(folder_path):
+            reader = CuratedPackReader(folder_path)
+            self._pack_readers[folder_path] = reader
+            ordered = sorted(reader.entries.items(), key=lambda item: (item[1][0], item[1][1]))
+            for key, _ in ordered:
+                if key + ".md" in duplicates:
+                    continue
+                tasks["text"].append((self._load_packed, (reader, folder_path, key)))
+        return tasks
+
+    def _load_file(self, loader_cls, path):
+        return loader_cls(path).load()
+
+    def _load_packed(self, reader, folder_path, key):
+        return [Document(page_content=reader.get(key), metadata={"source": os.path.join(folder_path, key + ".md")})]
+
+    def _load_and_split(self, load, args):
+        metrics = build_metrics.current()
+        try:
+            with metrics.stage("split"):
+                return self.split_documents(load(*args))
+        except Exception as e:
+            self.logger.error(f"加载文件 {args[-1]} 失败: {e}")
+            metrics.add("split", errors=1)
+            return []
+
+    def iter_chunks(self, folder_path):
+        """
+        流式加载并切分目录下的文档，每完成一个文件返回一次它的切片列表
+
+        txt/md（含打包分片）、pdf、docx 各用一个线程池并行加载，每个类型同时在处理的文件数不超过线程数的两倍，
+        内存中只保留正在处理的文件和尚未取走的切片，不随语料规模增长。
+        """
+        tasks = self._list_sources(folder_path)
+        total = sum(len(queue) for queue in tasks.values())
+        self.logger.info("待加载文件: " + ", ".join(f"{kind} {len(queue)} 个" for kind, queue in tasks.items()))
+        pools = {kind: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"load-{kind}")
+                 for kind, workers in self.loader_workers.items()}
+        inflight = {}
+        try:
+            with tqdm(total=total, desc="加载并切分文档") as pbar:
+                while True:
+                    for kind, queue in tasks.items():
+                        running = sum(1 for k in inflight.values() if k == kind)
+                        while queue and running < self.loader_workers[kind] * 2:
+                            load, args = queue.popleft()
+                            inflight[pools[kind].submit(self._load_and_split, load, args)] = kind
+                            running += 1
+                    if not inflight:
+                        break
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del inflight[future]
+                        pbar.update(1)
+                        chunks = future.result()
+                        if chunks:
+                            yield chunks
+        finally:
+            for pool in pools.values():
+                pool.shutdown(cancel_futures=True)
+
+    def load_sources(self, paths):
+        """按 source 路径加载文档，文件不存在时从打包分片读取"""
+        docs = []
+        for path in paths:
             try:
-                docs = loader.load()
-                self.logger.info(f"使用 {loader.__class__.__name__} 加载了 {len(docs)} 篇文档")
-                all_docs.extend(docs)
+                if os.path.exists(path):
+                    docs.extend(TextLoader(path).load())
+                    continue
+                folder = os.path.dirname(path)
+                if folder not in self._pack_readers:
+                    self._pack_readers[folder] = CuratedPackReader(folder)
+                text = self._pack_readers[folder].get(pack_key(path))
+                if text is None:
+                    raise FileNotFoundError(path)
+                docs.append(Document(page_content=text, metadata={"source": path}))
             except Exception as e:
-                self.logger.error(f"使用 {loader.__class__.__name__} 加载文档时出错: {str(e)}")
-        return all_docs
+                self.logger.error(f"加载文件 {path} 失败: {e}")
+        return docs
 
     def split_documents(self, docs, chunk_size=500, chunk_overlap=50):
-        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        return splitter.split_documents(docs)
+        """
+        切分文档。chunker 为 markdown 时 .md 文档按结构切分，切片带有标题路径和字符偏移；
+        其他文档按固定长度切分
+        """
+        metrics = build_metrics.current()
+        with metrics.stage("split"):
+            splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            if self.markdown_chunker is None:
+                chunks = splitter.split_documents(docs)
+            else:
+                chunks = []
+                for doc in docs:
+                    if doc.metadata.get("source", "").endswith(".md"):
+                        chunks.extend(self.markdown_chunker.split_documents([doc]))
+                    else:
+                        chunks.extend(splitter.split_documents([doc]))
+        metrics.add("split", items=len(chunks), bytes=sum(len(doc.page_content.encode("utf-8")) for doc in docs))
+        return chunks
 
-    def build_vectorstore(self, docs, persist_path, embeddings_model):
-        embeddings = OpenAIEmbeddings(
-            model=embeddings_model,
-            base_url="https://api.chatanywhere.tech/v1",
-            api_key=os.getenv("OPENAI_API_KEY")
+    def open_vectorstore(self, persist_path, embeddings_model):
+        """
+        打开向量库写入端，之后可以通过 add_documents 分批写入，最后调用 close_vectorstore
+        """
+        # embeddings_model 为 embedding_model_list.json 中的模型配置，provider 字段决定远程或本地推理
+        self._embeddings = get_embedding_provider(embeddings_model)
+        self._scheduler = EmbeddingScheduler(
+            self._embeddings,
+            max_batch_size=self.embedding_batch_size,
+            max_batch_tokens=self.scheduler_options.get("max_batch_tokens", 50000),
+            max_concurrency=self.scheduler_options.get("max_concurrency", 4),
+            rpm=self.scheduler_options.get("rpm"),
+            tpm=self.scheduler_options.get("tpm"),
+            max_retries=self.scheduler_options.get("max_retries", 5),
         )
-        vectordb = Chroma.from_documents(documents=docs, embedding=embeddings, persist_directory=persist_path)
-        vectordb.persist()
-        return vectordb
-
-    def process(self):
-        # 检查向量数据库是否已存在
-        if os.path.exists(self.persist_path):
-            self.logger.warning("向量数据库已存在，请选择是否删除[y/N]")
-            choice = input("请输入你的选择: ")
-            if choice == "y":
-                shutil.rmtree(self.persist_path)
-                self.logger.info("向量数据库已删除")
-            else:
-                self.logger.info("已取消删除")
-                return
+        self._embeddings_model = embeddings_model
+        self._persist_path = persist_path
+        self._embedding_dim = None
+        self._vectorized = 0
+        self._written = set()
+        self._duplicates = 0
+        self._manifest = ChunkManifest(persist_path)
+
+        self._vectordb = None
+        if self.backend == "chroma":
+            self._vectordb = Chroma(persist_directory=persist_path, embedding_function=self._embeddings)
+        self._mmap_writer = self._open_mmap_writer() if self.write_mmap else None
+
+    def _open_mmap_writer(self):
+        return MmapIndexWriter(
+            os.path.join(self._persist_path, MMAP_INDEX_DIR),
+            dtype=self.mmap_options.get("dtype", "float16"),
+            build_hnsw=self.mmap_options.get("hnsw", False),
+            quantization=self.mmap_options.get("quantization", "none"),
+            rescore_factor=self.mmap_options.get("rescore_factor", 4),
+        )
+
+    def add_documents(self, docs, ids=None):
+        """
+        向已打开的向量库写入一批切片，每个批次只计算一次向量，再分别写入各个索引
+        :param ids: 切片的向量ID，为空时由切片清单分配
+        """
+        if ids is None:
+            ids = self._manifest.assign(docs, dedup=self.dedup_chunks)
+        # 同一个向量ID在本次写入中只计算一次，重复的切片只在清单中指向规范切片
+        unique = {}
+        for doc, vector_id in zip(docs, ids):
+            if vector_id not in self._written and vector_id not in unique:
+                unique[vector_id] = doc
+        if len(unique) < len(ids):
+            self._duplicates += len(ids) - len(unique)
+            ids, docs = list(unique), list(unique.values())
+        failed_ids = []
+        texts = [doc.page_content for doc in docs]
+        metrics = build_metrics.current()
+        # 多个批次并发计算，完成一个写入一个；写入期间其余批次仍在计算，embed 阶段覆盖整个过程
+        with metrics.stage("embed"):
+            for indices, vectors in self._scheduler.embed(texts):
+                if vectors is None:
+                    failed_ids.extend(ids[i] for i in indices)
+                    continue
+                batch = [docs[i] for i in indices]
+                batch_bytes = sum(len(texts[i].encode("utf-8")) for i in indices)
+                metrics.add("embed", items=len(batch), bytes=batch_bytes)
+                self._embedding_dim = self._embedding_dim or len(vectors[0])
+                with metrics.stage("persist"):
+                    if self._vectordb is not None:
+                        self._vectordb._collection.upsert(
+                            ids=[ids[i] for i in indices],
+                            embeddings=vectors,
+                            metadatas=[doc.metadata for doc in batch],
+                            documents=[doc.page_content for doc in batch],
+                        )
+                    if self._mmap_writer is not None:
+                        self._mmap_writer.add(vectors, batch)
+                metrics.add("persist", items=len(batch), bytes=batch_bytes)
+                # 只记录已成功写入的ID，失败的切片在后续批次中再次出现时仍会计算
+                self._written.update(ids[i] for i in indices)
+                self._vectorized += len(batch)
+                self.logger.info(f"已向量化 {self._vectorized} 段")
+        if failed_ids:
+            metrics.add("embed", errors=len(failed_ids))
+            # 从清单中移除，下次增量构建时重新计算
+            self._manifest.discard(failed_ids)
+            self.logger.error(f"{len(failed_ids)} 段向量化失败，已跳过，下次构建时重试")
+
+    def close_vectorstore(self):
+        """完成写入并记录索引元数据"""
+        if self._duplicates:
+            self.logger.info(f"{self._duplicates} 段与已有切片内容相同，未重复计算向量")
+        with build_metrics.current().stage("persist"):
+            if self._mmap_writer is not None:
+                self._mmap_writer.close(model=self._embeddings_model["model"], dimensions=self.embedding_dim)
+            if self._vectordb is not None:
+                self._vectordb.persist()
+                self._manifest.save()
+
+            # 记录模型与向量维度，查询端打开索引时据此校验
+            write_store_meta(
+                self._persist_path,
+                model=self._embeddings_model["model"],
+                dimensions=self.embedding_dim,
+                embedding_dim=self._embedding_dim,
+                backend=self.backend,
+                mmap_index=self.write_mmap,
+            )
+        return self._vectordb
 
+    def build_vectorstore(self, docs, persist_path, embeddings_model):
+        self.open_vectorstore(persist_path, embeddings_model)
+        self.add_documents(docs)
+        return self.close_vectorstore()
+
+    def _feed(self, chunk_batches, skip_ids=frozenset()):
+        """
+        边切分边写入：按切片清单分配ID，攒满可以并发计算的若干个 embedding 批次就写入向量库
+        :param skip_ids: 已有向量的切片ID，只登记到清单，不重新计算
+        :return: (切片总数, 新计算的切片数)
+        """
+        threshold = self.embedding_batch_size * self.scheduler_options.get("max_concurrency", 4)
+        pending, pending_ids = [], []
+        total = fresh = 0
+        for chunks in chunk_batches:
+            total += len(chunks)
+            for chunk, vector_id in zip(chunks, self._manifest.assign(chunks, dedup=self.dedup_chunks)):
+                if vector_id not in skip_ids:
+                    pending.append(chunk)
+                    pending_ids.append(vector_id)
+            if len(pending) >= threshold:
+                self.add_documents(pending, ids=pending_ids)
+                fresh += len(pending)
+                pending, pending_ids = [], []
+        if pending:
+            self.add_documents(pending, ids=pending_ids)
+            fresh += len(pending)
+        return total, fresh
+
+    def _rebuild_mmap_from_chroma(self, batch_size=5000):
+        """用 Chroma 中已有的向量重建 mmap 索引，不重新计算 embedding"""
+        collection = self._vectordb._collection
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            got = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            docs = [Document(page_content=text, metadata=meta or {}) for text, meta in zip(got["documents"], got["metadatas"])]
+            self._mmap_writer.add(got["embeddings"], docs)
+            self._embedding_dim = self._embedding_dim or self._mmap_writer.dim
+        self.logger.info(f"已从 Chroma 重建 mmap 索引，共 {total} 段")
+
+    def _load_manifest(self):
+        """
+        检查能否在已有向量库上增量构建
+        :return: 已有的切片清单，需要完整构建时返回 None
+        """
+        if self.backend != "chroma":
+            self.logger.info("mmap 后端不保存可复用的向量，完整构建")
+            return None
+        if not os.path.exists(self.persist_path):
+            return None
+        meta = read_store_meta(self.persist_path)
+        if (meta.get("model") != self.embeddings_model["model"] or meta.get("dimensions") != self.embedding_dim
+                or meta.get("backend", "chroma") != self.backend):
+            self.logger.info(f"已有向量库的模型或维度与本次构建不一致 ({meta})，完整构建")
+            return None
+        manifest = ChunkManifest.load(self.persist_path)
+        if manifest is None:
+            self.logger.info("已有向量库没有切片清单，完整构建")
+        return manifest
+
+    def _sync(self, chunk_batches, old, scope=None):
+        """
+        按切片清单的差异更新 Chroma：只为新增或内容变化的切片计算向量，最后删除消失的切片
+        :param chunk_batches: 可迭代的切片列表，可以是边加载边切分的生成器
+        :param scope: 本次参与对比的源文件，为空时对比全部源文件；范围之外的清单条目原样保留
+        """
+        manifest = ChunkManifest(self.persist_path)
+        if scope is not None:
+            for source, entries in old.sources.items():
+                if source not in scope:
+                    manifest.sources[source] = entries
+        self._manifest = manifest
+        old_ids = old.ids()
+        # 新增切片的ID不会出现在旧清单中，先写入新切片再删除旧切片不会冲突
+        _, fresh = self._feed(chunk_batches, skip_ids=old_ids)
+        stale = list(old_ids - manifest.ids())
+        with build_metrics.current().stage("persist"):
+            for start in range(0, len(stale), 5000):
+                self._vectordb._collection.delete(ids=stale[start:start + 5000])
+            if self.dedup_chunks:
+                self._repoint_shared_sources(old, manifest)
+        self.logger.info(f"共 {len(manifest)} 段：新增或变化 {fresh} 段，删除 {len(stale)} 段，复用 {len(manifest) - fresh} 段")
+
+    def _repoint_shared_sources(self, old, manifest, batch_size=5000):
+        """
+        开启切片去重时多个源文件共用一个向量，向量的 source 为首次写入时的文件。
+        该文件被删除或不再包含这段切片时，把 source 改为仍引用这段切片的文件，检索结果仍能读取原文
+        """
+        referrers = defaultdict(set)
+        for source, entries in manifest.sources.items():
+            for _, vector_id in entries:
+                referrers[vector_id].add(source)
+        # 仍然存在、但失去了某个引用文件的向量
+        dropped = list({
+            vector_id for source, entries in old.sources.items() for _, vector_id in entries
+            if vector_id in referrers and source not in referrers[vector_id]
+        })
+        collection = self._vectordb._collection
+        repointed = 0
+        for start in range(0, len(dropped), batch_size):
+            got = collection.get(ids=dropped[start:start + batch_size], include=["metadatas"])
+            ids, metadatas = [], []
+            for vector_id, meta in zip(got["ids"], got["metadatas"]):
+                meta = dict(meta or {})
+                if meta.get("source") not in referrers[vector_id]:
+                    meta["source"] = min(referrers[vector_id])
+                    ids.append(vector_id)
+                    metadatas.append(meta)
+            if ids:
+                collection.update(ids=ids, metadatas=metadatas)
+                repointed += len(ids)
+        if repointed:
+            self.logger.info(f"{repointed} 段共用向量的源文件已删除，改为指向仍引用它们的文件")
+
+    def _incremental_build(self, chunk_batches, old, scope=None):
+        self.open_vectorstore(self.persist_path, self.embeddings_model)
+        # 没有需要新计算的切片时沿用已记录的向量维度
+        self._embedding_dim = read_store_meta(self.persist_path).get("embedding_dim")
+        # mmap 索引只能整体写入，先只更新 Chroma，最后再从 Chroma 重建
+        self._mmap_writer = None
+        self._sync(chunk_batches, old, scope)
+        if self.write_mmap:
+            self._mmap_writer = self._open_mmap_writer()
+            with build_metrics.current().stage("persist"):
+                self._rebuild_mmap_from_chroma()
+        self.close_vectorstore()
+
+    def refresh(self, paths):
+        """
+        增量刷新：只重新切分指定的文件，按切片清单更新向量，其余文件的向量保持不变
+        :param paths: 内容有变化的 curated 文件路径
+        :raises RuntimeError: 没有可以增量更新的向量库
+        """
+        old = self._load_manifest()
+        if old is None:
+            # 有变化的页面已经整理完毕，完整构建会从 curated 目录重新向量化全部页面
+            raise RuntimeError(f"无法增量刷新 {self.persist_path}：向量库不存在或与本次配置不一致，请先完整构建")
+
+        duplicates = load_duplicates(self.folder_path)
+        docs = self.load_sources([path for path in paths if os.path.relpath(path, self.folder_path) not in duplicates])
+        split_docs = self.split_documents(docs)
+        self.logger.info(f"{len(paths)} 个文件有变化，切分为 {len(split_docs)} 段")
+        self.prepare_persist_path(copy_current=True)
+        try:
+            self._incremental_build([split_docs], old, scope=set(paths))
+        except BaseException:
+            self.discard_persist_path()
+            raise
+        self.publish_persist_path()
+        self.logger.info("增量刷新完毕，向量数据库已持久化。")
+
+    def prepare_persist_path(self, copy_current=False):
+        """
+        构建前创建新版本目录，之后的写入都在新版本中进行，查询端继续读取当前版本
+        :param copy_current: 复制当前版本作为增量构建的起点，否则从空目录完整构建
+        :return: 是否可以继续构建
+        """
+        with build_metrics.current().stage("persist"):
+            # 增量构建结束时按需从 Chroma 重建 mmap 索引，复制当前版本时跳过
+            self.persist_path = create_version(self.model_dir, copy_current=copy_current, skip=[MMAP_INDEX_DIR])
+        self.logger.info(f"写入新版本: {self.persist_path}")
+        return True
+
+    def publish_persist_path(self):
+        """新版本写入完成：为新版本建立 curated 快照，原子切换 CURRENT 指针并回收旧版本"""
+        with build_metrics.current().stage("persist"):
+            snapshot_curated(self.persist_path, self.folder_path)
+            publish_version(self.model_dir, self.persist_path)
+            gc_versions(self.model_dir, keep=self.keep_versions)
+
+    def discard_persist_path(self):
+        """构建失败：删除未发布的新版本，当前版本不受影响"""
+        discard_version(self.persist_path)
+        self.persist_path = resolve_store_path(self.model_dir)
+
+    def process(self, rebuild=False):
+        """
+        构建向量库。已有向量库的模型、维度一致且存在切片清单时增量构建，
+        只为新增或变化的切片计算向量；rebuild 为 True 时完整构建。
+        两种方式都写入新版本，完成后才切换，构建期间查询不受影响
+        """
         if not os.path.exists(self.folder_path):
             self.logger.error(f"文件夹 {self.folder_path} 不存在")
             return
@@ -82,22 +507,39 @@ class Vectorizator:
         self.logger.info(f"folder_path: {str(self.folder_path)}")
         self.logger.info(f"persist_path: {str(self.persist_path)}")
 
-        self.logger.info("加载文件...")
-        raw_docs = self.load_documents_from_folder(self.folder_path)
-
-        self.logger.info(f"共加载 {len(raw_docs)} 篇文档，开始切分...")
-        split_docs = self.split_documents(raw_docs)
-
-        self.logger.info(f"共切分为 {len(split_docs)} 段，开始构建向量库并持久化...")
-        self.build_vectorstore(split_docs, self.persist_path, self.embeddings_model['model'])
+        # 文档边加载边切分，切片攒满批次就写入向量库
+        chunk_batches = self.iter_chunks(self.folder_path)
+        old = None if rebuild else self._load_manifest()
+        # 增量构建在当前版本的副本上进行，完整构建写入空的新版本
+        self.prepare_persist_path(copy_current=old is not None)
+        try:
+            if old is not None:
+                self.logger.info("按切片清单增量构建...")
+                self._incremental_build(chunk_batches, old)
+            else:
+                self.logger.info("开始构建向量库并持久化...")
+                self.open_vectorstore(self.persist_path, self.embeddings_model)
+                total, _ = self._feed(chunk_batches)
+                self.close_vectorstore()
+                self.logger.info(f"共切分为 {total} 段")
+        except BaseException:
+            self.discard_persist_path()
+            raise
+        self.publish_persist_path()
 
         self.logger.info("构建完毕，向量数据库已持久化。")
 
-def process(db_name: str, embeddings_model: dict):
+def refresh(db_name: str, embeddings_model: dict, paths, index_options: dict = None):
+    from src.utils.config_loader import ConfigLoader
+    config = ConfigLoader()
+    vectorizator = Vectorizator(config, db_name, embeddings_model, index_options)
+    vectorizator.refresh(paths)
+
+def process(db_name: str, embeddings_model: dict, index_options: dict = None, rebuild: bool = False):
     from src.utils.config_loader import ConfigLoader
     config = ConfigLoader()
-    vectorizator = Vectorizator(config, db_name, embeddings_model)
-    vectorizator.process()
+    vectorizator = Vectorizator(config, db_name, embeddings_model, index_options)
+    vectorizator.process(rebuild=rebuild)
 
 if __name__ == "__main__":
     from src.utils.config_loader import ConfigLoader
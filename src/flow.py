@@ -11,9 +11,11 @@ from nodes.retriever_node import RetrieverNode
 from nodes.llm_node import LLMNode
 from nodes.output_node import OutputNode
 from nodes.api_query_node import APIQueryNode
+from nodes.federated_search_node import FederatedSearchNode
 
 from utils.config_loader import ConfigLoader
 from utils.logger import Logger
+from utils.embedding_provider import resolve_embedding_model_config
 from conversations_manager import ConversationsManager
 from datetime import datetime
 
@@ -47,10 +49,20 @@ def process_query(query, status_callback=None, progress_callback=None, conversat
     status_callback: 状态更新回调函数，接收状态文本
     progress_callback: 进度更新回调函数，接收进度百分比
     conversation_id: 对话id
+    db_name: 知识库名称，传入列表时在多个知识库中并行联合检索
+    embedding_model_name: embedding模型名称，联合检索时可以传入与db_name等长的列表
     
     返回:
     final_output: 最终输出结果
     """
+    # 多个知识库时使用联合检索
+    knowledge_bases = None
+    if isinstance(db_name, (list, tuple)):
+        model_names = embedding_model_name if isinstance(embedding_model_name, (list, tuple)) else [embedding_model_name] * len(db_name)
+        knowledge_bases = [{"db_name": name, "model": model} for name, model in zip(db_name, model_names)]
+        db_name = ", ".join(db_name)
+        embedding_model_name = ", ".join(model_names)
+
     # 更新状态
     if status_callback: status_callback("正在分析问题...")
     if progress_callback: progress_callback(10)
@@ -110,25 +122,43 @@ def process_query(query, status_callback=None, progress_callback=None, conversat
             "db_name": db_name,
         }
     )
-    # 嵌入节点
-    embedding_node = EmbeddingNode(
-        node_id="embedding_node",
-        config={
-            "model": embedding_model_name,
-            "base_url": base_url,
-            "api_key": api_key
-        }
-    )
-    # 向量数据库节点
-    vectordb_node = VectorDBNode(
-        node_id="vectordb_node",
-        config={
-            "model": embedding_model_name,
-            "persist_directory": os.path.join(persist_dir, db_name),
-            "base_url": base_url,
-            "api_key": api_key
-        }
-    )
+    if knowledge_bases:
+        # 联合检索节点：每个知识库使用各自的embedding模型，并行检索后合并
+        federated_search_node = FederatedSearchNode(
+            node_id="federated_search_node",
+            config={
+                "knowledge_bases": knowledge_bases,
+                "persist_directory": persist_dir,
+                "backend": config.get("vectordb.backend", "chroma"),
+                "latency_budget_ms": config.get("vectordb.federated.latency_budget_ms", 2000),
+                "normalization": config.get("vectordb.federated.normalization", "minmax"),
+                "base_url": base_url,
+                "api_key": api_key
+            }
+        )
+    else:
+        # 向量数据库节点（先打开索引，校验并读取构建时使用的向量维度）
+        vectordb_node = VectorDBNode(
+            node_id="vectordb_node",
+            config={
+                "model": embedding_model_name,
+                "persist_directory": os.path.join(persist_dir, db_name),
+                "backend": config.get("vectordb.backend", "chroma"),
+                "dimensions": resolve_embedding_model_config(embedding_model_name).get("dimensions"),
+                "base_url": base_url,
+                "api_key": api_key
+            }
+        )
+        # 嵌入节点
+        embedding_node = EmbeddingNode(
+            node_id="embedding_node",
+            config={
+                "model": embedding_model_name,
+                "base_url": base_url,
+                "api_key": api_key,
+                "dimensions": vectordb_node.dimensions
+            }
+        )
     # 检索节点
     retriever_node = RetrieverNode(
         node_id="retriever_node"
@@ -175,23 +205,32 @@ def process_query(query, status_callback=None, progress_callback=None, conversat
         logger.error(f"API查询失败: {e}")
         return "API查询失败"
 
-    if status_callback: status_callback("正在生成嵌入向量...")
-    if progress_callback: progress_callback(40)
     api_description = data_after_api_query["api_description"]
-    try:
-        data_after_embedding = embedding_node.process({"api_description": api_description})
-    except Exception as e:
-        logger.error(f"嵌入向量生成失败: {e}")
-        return "嵌入向量生成失败"
-    
-    if status_callback: status_callback("正在向量数据库中检索相关文档...")
-    if progress_callback: progress_callback(60)
-    embeddings = data_after_embedding["embeddings"]
-    try:
-        data_after_vdb = vectordb_node.process({"embeddings": embeddings})
-    except Exception as e:
-        logger.error(f"向量数据库检索失败: {e}")
-        return "向量数据库检索失败"
+    if knowledge_bases:
+        if status_callback: status_callback("正在多个知识库中联合检索相关文档...")
+        if progress_callback: progress_callback(50)
+        try:
+            data_after_vdb = federated_search_node.process({"api_description": api_description})
+        except Exception as e:
+            logger.error(f"联合检索失败: {e}")
+            return "联合检索失败"
+    else:
+        if status_callback: status_callback("正在生成嵌入向量...")
+        if progress_callback: progress_callback(40)
+        try:
+            data_after_embedding = embedding_node.process({"api_description": api_description})
+        except Exception as e:
+            logger.error(f"嵌入向量生成失败: {e}")
+            return "嵌入向量生成失败"
+
+        if status_callback: status_callback("正在向量数据库中检索相关文档...")
+        if progress_callback: progress_callback(60)
+        embeddings = data_after_embedding["embeddings"]
+        try:
+            data_after_vdb = vectordb_node.process({"embeddings": embeddings})
+        except Exception as e:
+            logger.error(f"向量数据库检索失败: {e}")
+            return "向量数据库检索失败"
     
     if status_callback: status_callback("正在处理检索结果...")
     if progress_callback: progress_callback(70)
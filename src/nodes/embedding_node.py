@@ -1,11 +1,9 @@
 # nodes/embedding_node.py
 
 from .base_node import Node
-from langchain_openai import OpenAIEmbeddings
 from typing import Dict, Any
 from utils.logger import Logger
-# 这里的 embedding 相关引入，例如 from langchain_openai import OpenAIEmbeddings
-# 或者你自己封装的embedding类
+from utils.embedding_provider import get_embedding_provider, resolve_embedding_model_config
 
 class EmbeddingNode(Node):
     def __init__(self, node_id: str, config: Dict[str, Any]):
@@ -16,10 +14,13 @@ class EmbeddingNode(Node):
         # 在config中可能有 'model'、'openai_api_key' 等
         self.model = config.get("model", "text-embedding-3-small")
         self.base_url = config.get("base_url", "https://api.chatanywhere.tech/v1")
-        self.embeddings = OpenAIEmbeddings(
-            model=self.model,
-            base_url=self.base_url
-        )
+        # 根据 embedding_model_list.json 中的 provider 选择远程或本地模型，provider 会被缓存复用
+        model_config = resolve_embedding_model_config(self.model, self.base_url, config.get("api_key"))
+        # dimensions: 知识库构建时截短的向量维度，需要与索引保持一致
+        self.dimensions = config.get("dimensions")
+        if self.dimensions:
+            model_config = dict(model_config, dimensions=self.dimensions)
+        self.embeddings = get_embedding_provider(model_config)
         self.logger = Logger.get_logger("flow")
         self.vectordb = None
 
@@ -42,9 +43,7 @@ class EmbeddingNode(Node):
             }
         
         apis = api_description.split(",")
-        embeddings = []
-        for api in apis:
-            embeddings.append(self.embeddings.embed_query(api))
+        embeddings = self.embeddings.embed_queries(apis)
         
         return {
             "embeddings": embeddings,
@@ -0,0 +1,162 @@
+# nodes/federated_search_node.py
+
+from .base_node import Node
+from .embedding_node import EmbeddingNode
+from .vectordb_node import VectorDBNode
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Tuple
+from utils.logger import Logger
+import os
+import threading
+import time
+
+# 进程内共享的检索线程池和已打开的知识库句柄
+# 超出时间预算的检索任务会在后台继续完成，不会阻塞本次查询
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="federated-search")
+# 查询向量使用独立线程池，避免检索任务占满线程后互相等待
+_embedding_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="federated-embedding")
+_handles: Dict[Tuple[str, str, str], Tuple[VectorDBNode, EmbeddingNode]] = {}
+_handles_lock = threading.Lock()
+
+
+class FederatedSearchNode(Node):
+    def __init__(self, node_id: str, config: Dict[str, Any]):
+        """
+        跨多个知识库并行检索的节点。
+
+        config:
+        - knowledge_bases: [{"db_name": str, "model": str}, ...]
+        - persist_directory: 所有知识库所在的根目录
+        - backend: 没有索引元数据的旧版本使用的索引类型（chroma / mmap），其余知识库按各自的元数据选择
+        - k: 每个查询向量在每个知识库中检索的文档数
+        - latency_budget_ms: 单个知识库的时间预算，超时的知识库结果被丢弃
+        - normalization: 分数归一化方式（minmax / zscore）
+        - max_docs: 合并后最多返回的文档数
+        """
+        super().__init__(node_id, config)
+        self.logger = Logger.get_logger("flow")
+        self.knowledge_bases = config.get("knowledge_bases", [])
+        self.persist_directory = config.get("persist_directory")
+        self.backend = config.get("backend", "chroma")
+        self.k = config.get("k", 5)
+        self.latency_budget = config.get("latency_budget_ms", 2000) / 1000.0
+        self.normalization = config.get("normalization", "minmax")
+        self.max_docs = config.get("max_docs", self.k * max(1, len(self.knowledge_bases)))
+        self.base_url = config.get("base_url")
+        self.api_key = config.get("api_key")
+        self._warm_up()
+
+    def _get_handles(self, db_name: str, model: str) -> Tuple[VectorDBNode, EmbeddingNode]:
+        """获取（并缓存）知识库对应的向量库和embedding节点，全局锁只保护缓存的查找和写入"""
+        key = (db_name, model, self.backend)
+        with _handles_lock:
+            handles = _handles.get(key)
+        if handles is not None:
+            return handles
+        # 打开索引可能较慢，在锁外进行，不阻塞其他知识库的检索
+        vectordb_node = VectorDBNode(
+            node_id=f"vectordb_node_{db_name}",
+            config={
+                "model": model,
+                "persist_directory": os.path.join(self.persist_directory, db_name),
+                "backend": self.backend,
+                "k": self.k,
+            }
+        )
+        embedding_node = EmbeddingNode(
+            node_id=f"embedding_node_{db_name}",
+            config={
+                "model": model,
+                "base_url": self.base_url,
+                "api_key": self.api_key,
+                "dimensions": vectordb_node.dimensions,
+            }
+        )
+        with _handles_lock:
+            # 并发打开同一个知识库时保留先写入缓存的句柄
+            return _handles.setdefault(key, (vectordb_node, embedding_node))
+
+    def _warm_up(self):
+        """在查询之前打开全部知识库，首次查询的时间预算不会被打开索引的耗时占用"""
+        for kb in self.knowledge_bases:
+            try:
+                self._get_handles(kb["db_name"], kb["model"])
+            except Exception as e:
+                # 打开失败的知识库在查询时重试，届时按检索失败处理
+                self.logger.error(f"打开知识库 {kb['db_name']} 失败: {e}")
+
+    def _search_one(self, db_name: str, model: str, api_description: str, embedding_futures: dict, lock: threading.Lock):
+        start = time.perf_counter()
+        vectordb_node, embedding_node = self._get_handles(db_name, model)
+
+        # 使用相同模型和维度的知识库共享同一次查询向量计算
+        embedding_key = (model, vectordb_node.dimensions)
+        with lock:
+            future = embedding_futures.get(embedding_key)
+            if future is None:
+                future = _embedding_executor.submit(embedding_node.process, {"api_description": api_description})
+                embedding_futures[embedding_key] = future
+        embeddings = future.result()["embeddings"]
+
+        results = vectordb_node.search_with_scores(embeddings, k=self.k)
+        return results, time.perf_counter() - start
+
+    def _normalize(self, scores: List[float]) -> List[float]:
+        if not scores:
+            return scores
+        if self.normalization == "zscore":
+            mean = sum(scores) / len(scores)
+            std = (sum((s - mean) ** 2 for s in scores) / len(scores)) ** 0.5
+            return [(s - mean) / std if std > 0 else 0.0 for s in scores]
+        low, high = min(scores), max(scores)
+        return [(s - low) / (high - low) if high > low else 1.0 for s in scores]
+
+    def process(self, data: dict) -> dict:
+        """
+        1. 为每个知识库计算查询向量（同模型共享）并并行检索
+        2. 等待至时间预算耗尽，丢弃超时的知识库
+        3. 各知识库内部归一化分数后合并排序
+        """
+        api_description = data.get("api_description", "")
+        if hasattr(api_description, 'content'):
+            api_description = api_description.content
+
+        embedding_futures, lock = {}, threading.Lock()
+        futures = {
+            _executor.submit(self._search_one, kb["db_name"], kb["model"], api_description, embedding_futures, lock): kb["db_name"]
+            for kb in self.knowledge_bases
+        }
+        done, not_done = wait(futures, timeout=self.latency_budget)
+
+        merged, timings, timed_out = [], {}, []
+        for future in not_done:
+            timed_out.append(futures[future])
+            self.logger.warning(f"知识库 {futures[future]} 检索超出时间预算 {self.latency_budget * 1000:.0f} ms，结果已丢弃")
+        for future in done:
+            db_name = futures[future]
+            try:
+                results, elapsed = future.result()
+            except Exception as e:
+                self.logger.error(f"知识库 {db_name} 检索失败: {e}")
+                continue
+            timings[db_name] = elapsed * 1000
+
+            # 同一知识库内按文档去重，保留最高分
+            best = {}
+            for hits in results:
+                for doc, score in hits:
+                    key = (doc.metadata.get("source"), doc.page_content)
+                    if key not in best or score > best[key][1]:
+                        best[key] = (doc, score)
+            docs = list(best.values())
+            for (doc, raw_score), score in zip(docs, self._normalize([s for _, s in docs])):
+                doc.metadata = dict(doc.metadata, db_name=db_name, score=score, raw_score=raw_score)
+                merged.append((doc, score))
+
+        merged.sort(key=lambda item: item[1], reverse=True)
+        self.logger.info(f"联合检索耗时: {timings}, 超时: {timed_out}")
+        return {
+            "retrieved_docs": [doc for doc, _ in merged[:self.max_docs]],
+            "timings": timings,
+            "timed_out": timed_out,
+        }
@@ -3,6 +3,7 @@
 from .base_node import Node
 from utils.logger import Logger
 from utils.config_loader import ConfigLoader
+from utils.curated_pack import CuratedPackReader, pack_key
 import os
 
 class RetrieverNode(Node):
@@ -11,14 +12,34 @@ class RetrieverNode(Node):
         self.logger = Logger.get_logger("flow")
         self.config = ConfigLoader()
         # 可根据需要存一些额外的处理配置
+        # 按 curated 目录缓存的打包分片读取器，整理结果为 pack 格式时按偏移从 mmap 中读取
+        self.pack_readers = {}
     
-    def _get_path(self, path: str):
+    def _get_path(self, path: str, curated_dir: str = None):
         unix_path = path.replace("\\", "/")
+        if curated_dir and "/curated/" in unix_path:
+            # 读取命中版本的 curated 快照，重新整理或压缩分片不影响正在服务的版本
+            return os.path.join(curated_dir, *unix_path.rsplit("/curated/", 1)[1].split("/"))
         path_list = unix_path.split("/")[-5:]
         project_root = self.config.project_root
         normalized_path = os.path.join(project_root, *path_list)
         return normalized_path
 
+    def _read(self, normalized_path: str) -> str:
+        if os.path.exists(normalized_path):
+            with open(normalized_path, "r", encoding="utf-8") as f:
+                return f.read()
+        folder = os.path.dirname(normalized_path)
+        if folder not in self.pack_readers:
+            # 丢弃已回收的旧版本快照的读取器，正在读取的查询结束后映射随对象释放
+            for stale in [name for name in self.pack_readers if not os.path.isdir(name)]:
+                self.pack_readers.pop(stale)
+            self.pack_readers[folder] = CuratedPackReader(folder)
+        content = self.pack_readers[folder].get(pack_key(normalized_path))
+        if content is None:
+            raise FileNotFoundError(normalized_path)
+        return content
+
     def process(self, data: dict) -> dict:
         """
         对检索到的文档进行拼接/摘要或其他处理，并返回给LLM使用。
@@ -31,16 +52,27 @@ class RetrieverNode(Node):
         for doc in retrieved_docs:
             context += f"## {doc.page_content}\n\n"
         '''
+        # 按源文件分组，保持各文件第一次出现的顺序
+        groups = {}
         for doc in retrieved_docs:
-            path = doc.metadata.get("source", "")
-            normalized_path = self._get_path(path)
+            groups.setdefault(doc.metadata.get("source", ""), []).append(doc)
+        for path, docs in groups.items():
+            if all("start_index" in doc.metadata for doc in docs):
+                # 按结构切分的切片只使用切片本身，同一文件的切片按原文顺序拼接
+                chunks = {doc.metadata["start_index"]: doc for doc in docs}
+                for _, doc in sorted(chunks.items()):
+                    headings = doc.metadata.get("headings")
+                    context += f"## {headings}\n{doc.page_content}\n\n" if headings else f"## {doc.page_content}\n\n"
+                continue
+            normalized_path = self._get_path(path, docs[0].metadata.get("curated_dir"))
             try:
-                with open(normalized_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+                content = self._read(normalized_path)
                 context += f"## {content}\n\n"
             except Exception as e:
-                self.logger.error(f"读取文件失败: {e}")
-                context += f"## 文件读取失败: {e}\n\n"
+                # 原文已不存在时退回检索到的切片
+                self.logger.error(f"读取文件失败，使用检索到的切片: {e}")
+                for doc in docs:
+                    context += f"## {doc.page_content}\n\n"
         
         # self.logger.info(f"拼接后的上下文: {context}")
 
@@ -4,6 +4,30 @@ from .base_node import Node
 from langchain_chroma import Chroma
 import os
 from utils.logger import Logger
+from utils.vector_index import MMAP_INDEX_DIR, MmapVectorIndex, check_store_meta, read_store_meta
+from utils.index_versions import CURATED_DIR, resolve_store_path
+import threading
+
+# 已打开的 Chroma 句柄，同一进程内复用，避免每次查询重新打开 SQLite
+_chroma_handles = {}
+_chroma_handles_lock = threading.Lock()
+
+
+def open_chroma(persist_directory: str) -> Chroma:
+    with _chroma_handles_lock:
+        if persist_directory not in _chroma_handles:
+            _chroma_handles[persist_directory] = Chroma(
+                persist_directory=persist_directory,
+                embedding_function=None  # 如果需要，也可以放这里
+            )
+        return _chroma_handles[persist_directory]
+
+
+def release_chroma(persist_directory: str):
+    """丢弃已切换掉的旧版本的句柄"""
+    with _chroma_handles_lock:
+        _chroma_handles.pop(persist_directory, None)
+
 # import你的Chroma类或其它向量数据库
 class VectorDBNode(Node):
     def __init__(self, node_id: str, config: dict = None):
@@ -12,18 +36,82 @@ class VectorDBNode(Node):
         """
         super().__init__(node_id, config)
         self.logger = Logger.get_logger("flow")
-        persist_directory = os.path.join(config.get("persist_directory"), "chroma_openai", config.get("model"))
+        # 模型目录下的 CURRENT 指向当前版本，重新构建完成后在下一次查询时切换，无需重启
+        self.model_dir = os.path.join(config.get("persist_directory"), "chroma_openai", config.get("model"))
 
-        if not os.path.exists(persist_directory):
-            raise ValueError(f"向量数据库不存在: {persist_directory}")
+        if not os.path.exists(self.model_dir):
+            raise ValueError(f"向量数据库不存在: {self.model_dir}")
         else:
-            self.logger.info(f"向量数据库存在: {persist_directory}")
-        
-        # 初始化你的向量数据库, 例如Chroma
-        self.vectordb = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=None  # 如果需要，也可以放这里
-        )
+            self.logger.info(f"向量数据库存在: {self.model_dir}")
+
+        # 检索后端按各版本 index_meta.json 中记录的索引格式选择，配置只用于没有元数据的旧版本
+        self.default_backend = config.get("backend", "chroma")
+        self.backend = None
+        self.k = config.get("k", 5)
+        self._lock = threading.Lock()
+        self.persist_directory = None
+        # 切换失败的版本不再重试
+        self._rejected_directory = None
+        self._open_store(resolve_store_path(self.model_dir))
+
+    def _open_store(self, persist_directory: str):
+        # 校验查询端的模型和向量维度与索引元数据一致
+        store_meta = read_store_meta(persist_directory)
+        check_store_meta(store_meta, model=self.config.get("model"), embedding_dim=self.config.get("dimensions"))
+        if self.persist_directory is not None and store_meta.get("embedding_dim") != self.embedding_dim:
+            # 查询向量按已打开版本的维度生成，维度变化的版本需要重启查询端
+            raise ValueError(f"新版本向量维度 {store_meta.get('embedding_dim')} 与当前版本 {self.embedding_dim} 不一致")
+        backend = self._select_backend(store_meta)
+        if backend == "mmap":
+            # 内存映射索引，进程内缓存，重复打开几乎没有开销
+            vectordb = MmapVectorIndex.open(os.path.join(persist_directory, MMAP_INDEX_DIR))
+        else:
+            # 初始化你的向量数据库, 例如Chroma
+            vectordb = open_chroma(persist_directory)
+
+        previous, previous_backend = self.persist_directory, self.backend
+        self.backend = backend
+        self.store_meta = store_meta
+        # 构建时截短的向量维度，查询端的embedding需要使用相同的维度
+        self.dimensions = store_meta.get("dimensions")
+        self.embedding_dim = store_meta.get("embedding_dim")
+        self.vectordb = vectordb
+        # 该版本构建时的 curated 快照，RetrieverNode 从中读取原文；旧版本没有快照时读取 curated 目录
+        curated_dir = os.path.join(persist_directory, CURATED_DIR)
+        self.curated_dir = curated_dir if os.path.isdir(curated_dir) else None
+        self.persist_directory = persist_directory
+        if previous is not None:
+            if previous_backend == "mmap":
+                MmapVectorIndex.release(os.path.join(previous, MMAP_INDEX_DIR))
+            else:
+                release_chroma(previous)
+            self.logger.info(f"向量数据库已切换到新版本: {persist_directory}")
+
+    def _select_backend(self, store_meta: dict) -> str:
+        """
+        构建时写了 mmap 索引（backend 为 mmap，或额外写入了可能量化的 mmap 索引）时使用 mmap，
+        否则使用 Chroma；知识库各自的量化配置因此在查询端生效
+        """
+        if not store_meta:
+            return self.default_backend
+        if store_meta.get("backend") == "mmap" or store_meta.get("mmap_index"):
+            return "mmap"
+        return "chroma"
+
+    def _check_version(self):
+        """查询前检查 CURRENT 指针，指向新版本时重新打开"""
+        persist_directory = resolve_store_path(self.model_dir)
+        if persist_directory in (self.persist_directory, self._rejected_directory):
+            return
+        with self._lock:
+            if persist_directory in (self.persist_directory, self._rejected_directory):
+                return
+            try:
+                self._open_store(persist_directory)
+            except Exception as e:
+                self._rejected_directory = persist_directory
+                # 新版本与查询端配置不一致或无法打开时继续使用已打开的版本
+                self.logger.error(f"切换到新版本 {persist_directory} 失败，继续使用 {self.persist_directory}: {e}")
 
     def process(self, data: dict) -> dict:
         """
@@ -36,11 +124,56 @@ class VectorDBNode(Node):
         if embeddings is None:
             raise ValueError("No embeddings found in input data.")
 
-        # 在Chroma中检索k条最相似文档
-        docs = []
+        self._check_version()
+
         for embedding in embeddings:
-            docs.extend(self.vectordb.similarity_search_by_vector(embedding, k=5))
+            if self.embedding_dim and len(embedding) != self.embedding_dim:
+                raise ValueError(f"查询向量维度 {len(embedding)} 与索引维度 {self.embedding_dim} 不一致")
+
+        docs = []
+        # 版本切换时后端可能变化，按已打开的索引类型检索
+        vectordb, curated_dir = self.vectordb, self.curated_dir
+        if isinstance(vectordb, MmapVectorIndex):
+            # 所有查询向量一次矩阵运算完成检索
+            if len(embeddings):
+                for results in vectordb.similarity_search_by_vectors(embeddings, k=self.k):
+                    docs.extend(doc for doc, _ in results)
+        else:
+            # 在Chroma中检索k条最相似文档
+            for embedding in embeddings:
+                docs.extend(vectordb.similarity_search_by_vector(embedding, k=self.k))
+        self._tag_curated(docs, curated_dir)
         
         return {
             "retrieved_docs": docs,
-        }
\ No newline at end of file
+        }
+
+    def search_with_scores(self, embeddings: list, k: int = None) -> list:
+        """
+        检索并返回相似度分数（越大越相似）
+        :return: 每个查询向量对应一个 [(doc, score), ...] 列表
+        """
+        k = k or self.k
+        if not len(embeddings):
+            return []
+        self._check_version()
+        vectordb, curated_dir = self.vectordb, self.curated_dir
+        if isinstance(vectordb, MmapVectorIndex):
+            results = vectordb.similarity_search_by_vectors(embeddings, k=k)
+        else:
+            results = []
+            for embedding in embeddings:
+                hits = vectordb.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+                # Chroma 默认返回 L2 平方距离，对归一化向量换算为余弦相似度
+                results.append([(doc, 1.0 - distance / 2.0) for doc, distance in hits])
+        for hits in results:
+            self._tag_curated([doc for doc, _ in hits], curated_dir)
+        return results
+
+    @staticmethod
+    def _tag_curated(docs: list, curated_dir: str):
+        """在检索结果中记录命中版本的 curated 快照目录"""
+        if curated_dir is None:
+            return
+        for doc in docs:
+            doc.metadata["curated_dir"] = curated_dir
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# 与各模块相同：database 下的模块通过 src.* 导入，nodes 通过 utils.* 导入
+src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+project_root = os.path.dirname(src_dir)
+for path in (project_root, src_dir):
+    if path not in sys.path:
+        sys.path.append(path)
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    """把 ConfigLoader 的项目根目录指向临时目录，知识库数据写入 tmp_path/data/database/"""
+    from src.utils.config_loader import ConfigLoader
+    monkeypatch.setattr(ConfigLoader(), "project_root", str(tmp_path))
+    return tmp_path
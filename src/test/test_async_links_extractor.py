@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.database.async_links_extractor import AsyncLinksExtractor
+
+PAGES = {
+    "index.html": '<a href="a.html">a</a> <a href="b.html#top">b</a> <a href="/other/x.html">x</a>',
+    "a.html": '<a href="c.html">c</a> <a href="index.html">index</a>',
+    "b.html": '<a href="a.html">a</a>',
+    "c.html": "leaf",
+}
+
+
+async def _crawl(extractor):
+    requests = []
+    failures = {"b.html": 1}
+
+    async def handler(request):
+        name = request.match_info["name"]
+        requests.append(name)
+        # b.html 第一次返回 503，重试后成功
+        if failures.get(name):
+            failures[name] -= 1
+            return web.Response(status=503)
+        return web.Response(text=PAGES[name], content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/docs/{name}", handler)
+    async with TestServer(app) as server:
+        prefix = str(server.make_url("/docs/"))
+        extractor.required_prefix = prefix
+        links = await extractor.crawl([prefix + "index.html"])
+    extractor.checkpoint.flush()
+    return prefix, links, requests
+
+
+def test_crawl_follows_links_within_depth(project_dir):
+    extractor = AsyncLinksExtractor("test_crawl", max_depth=2, concurrency=4, parse_workers=2)
+    prefix, links, requests = asyncio.run(_crawl(extractor))
+
+    # c.html 位于第 3 层，只记录链接不请求；b.html 重试一次
+    assert sorted(requests) == ["a.html", "b.html", "b.html", "index.html"]
+    assert links == {prefix + name for name in ("index.html", "a.html", "b.html", "c.html")}
+    with open(extractor.output_file, encoding="utf-8") as f:
+        assert sorted(f.read().split()) == sorted(prefix + name for name in ("a.html", "b.html", "c.html", "index.html"))
+    visited, pending = extractor.checkpoint.load()
+    assert visited == {prefix + name for name in ("index.html", "a.html", "b.html")}
+    assert pending == []
+    assert extractor.pages_done == 3
+    # 重试成功的页面不记为错误
+    assert not os.path.exists(extractor.error_file)
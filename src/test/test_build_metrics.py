@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+
+import pytest
+
+from utils import build_metrics
+from utils.build_metrics import REPORT_DIR, BuildMetrics
+
+
+@pytest.fixture
+def metrics():
+    metrics = BuildMetrics("test_db", sample_interval=0.01, urls=3)
+    yield metrics
+    metrics.finish()
+
+
+def test_nested_and_concurrent_stages_count_once(metrics):
+    # 同一阶段在两个线程中重叠进入，活跃时间为区间的并集而不是累加
+    def work():
+        with metrics.stage("download"):
+            time.sleep(0.2)
+
+    threads = [threading.Thread(target=work) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with metrics.stage("embed"), metrics.stage("embed"):
+        pass
+    metrics.add("download", items=4, bytes=2048, errors=1)
+
+    report = metrics.finish()
+    download = report["stages"]["download"]
+    assert 0.2 <= download["wall_time"] < 0.35
+    assert (download["items"], download["bytes"], download["errors"]) == (4, 2048, 1)
+    assert download["items_per_sec"] == pytest.approx(4 / download["wall_time"], rel=0.05)
+    assert report["stages"]["embed"]["wall_time"] < 0.05
+
+
+def test_report_orders_stages_and_saves(metrics, tmp_path):
+    for name in ("custom", "embed", "extract"):
+        metrics.add(name, items=1)
+    with pytest.raises(RuntimeError):
+        with metrics.stage("curate"):
+            raise RuntimeError("boom")
+
+    report = metrics.finish("failed", "boom")
+    assert list(report["stages"]) == ["extract", "curate", "embed", "custom"]
+    assert (report["db_name"], report["urls"], report["status"], report["error"]) == ("test_db", 3, "failed", "boom")
+    # 重复调用返回同一份报告
+    assert metrics.finish() is report
+
+    path = metrics.save(str(tmp_path))
+    assert path.startswith(str(tmp_path / REPORT_DIR))
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == report
+
+
+def test_current_build():
+    # 没有正在进行的构建时上报不做任何统计
+    assert build_metrics.current() is build_metrics._null
+    with build_metrics.current().stage("embed"):
+        build_metrics.current().add("embed", items=1)
+
+    metrics = build_metrics.start_build("test_db", sample_interval=0.01)
+    try:
+        assert build_metrics.current() is metrics
+        build_metrics.current().add("split", items=2)
+    finally:
+        assert build_metrics.end_build("success") is metrics
+    assert build_metrics.current() is build_metrics._null
+    assert metrics.report["stages"]["split"]["items"] == 2
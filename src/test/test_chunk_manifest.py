@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+
+from src.database.chunk_manifest import ChunkManifest
+
+
+def _docs(source, *texts):
+    return [Document(page_content=text, metadata={"source": source}) for text in texts]
+
+
+def test_ids_are_stable_and_diffable(tmp_path):
+    old = ChunkManifest(str(tmp_path))
+    old.assign(_docs("a.md", "intro", "body", "body") + _docs("b.md", "removed"))
+    old.save()
+
+    loaded = ChunkManifest.load(str(tmp_path))
+    new = ChunkManifest(str(tmp_path))
+    new_ids = new.assign(_docs("a.md", "intro", "body", "body", "added"))
+    # 同一源文件中内容相同的切片按出现序号得到不同的ID
+    assert len(set(new_ids)) == 4
+    fresh = new.ids() - loaded.ids()
+    stale = loaded.ids() - new.ids()
+    assert fresh == {new_ids[3]}
+    assert stale == set(old.sources["b.md"][0][1:])
+
+
+def test_dedup_shares_ids_across_sources(tmp_path):
+    manifest = ChunkManifest(str(tmp_path))
+    a = manifest.assign(_docs("a.md", "footer"), dedup=True)
+    b = manifest.assign(_docs("b.md", "footer"), dedup=True)
+    assert a == b
+    assert len(manifest) == 2 and len(manifest.ids()) == 1
+
+
+def test_discard_removes_failed_entries(tmp_path):
+    manifest = ChunkManifest(str(tmp_path))
+    ids = manifest.assign(_docs("a.md", "one", "two"))
+    manifest.discard([ids[0]])
+    assert manifest.ids() == {ids[1]}
+
+
+def test_load_missing_or_corrupt(tmp_path):
+    assert ChunkManifest.load(str(tmp_path)) is None
+    (tmp_path / "chunk_manifest.json").write_text("{", encoding="utf-8")
+    assert ChunkManifest.load(str(tmp_path)) is None
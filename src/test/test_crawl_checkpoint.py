@@ -0,0 +1,47 @@
+import os
+
+from src.database.crawl_checkpoint import CrawlCheckpoint
+from src.database.links_extractor import LinksExtractor
+
+
+def test_changes_are_buffered_until_flush(tmp_path):
+    path = str(tmp_path / "crawl_state.sqlite")
+    checkpoint = CrawlCheckpoint(path, flush_every=3, flush_interval=3600)
+    checkpoint.add_pending([("https://example.com/a", 1), ("https://example.com/b", 1)])
+    assert CrawlCheckpoint(path).load() == (set(), [])
+
+    # 第 3 条变更触发批量写入
+    checkpoint.mark_done("https://example.com/a")
+    visited, pending = CrawlCheckpoint(path).load()
+    assert visited == {"https://example.com/a", "https://example.com/b"}
+    assert pending == [("https://example.com/b", 1)]
+
+    # 已入队的URL不会被重复登记为待处理
+    checkpoint.add_pending([("https://example.com/a", 2)])
+    checkpoint.close()
+    assert CrawlCheckpoint(path).load()[1] == [("https://example.com/b", 1)]
+
+
+def test_extractor_resumes_from_checkpoint(project_dir):
+    start = ["https://example.com/docs/index.html"]
+    extractor = LinksExtractor("test_resume", required_prefix="https://example.com/docs/")
+    assert extractor.init_frontier(start) == [(start[0], 1)]
+    extractor.enqueue_links({"https://example.com/docs/a.html", "https://example.com/docs/b.html"}, 2)
+    extractor.checkpoint.mark_done(start[0])
+    extractor.checkpoint.mark_done("https://example.com/docs/a.html")
+    extractor.checkpoint.close()
+
+    resumed = LinksExtractor("test_resume", required_prefix="https://example.com/docs/", resume=True)
+    assert resumed.init_frontier(start) == [("https://example.com/docs/b.html", 2)]
+    assert resumed.visited_urls == {start[0], "https://example.com/docs/a.html", "https://example.com/docs/b.html"}
+    # 已访问的链接不会再次入队
+    assert resumed.enqueue_links({"https://example.com/docs/a.html", "https://example.com/docs/c.html"}, 3) == [
+        "https://example.com/docs/c.html"
+    ]
+
+    # 不带 resume 时清空检查点重新开始
+    fresh = LinksExtractor("test_resume", required_prefix="https://example.com/docs/")
+    assert fresh.init_frontier(start) == [(start[0], 1)]
+    fresh.checkpoint.flush()
+    assert fresh.checkpoint.load() == ({start[0]}, [(start[0], 1)])
+    assert os.path.exists(fresh.checkpoint_file)
@@ -0,0 +1,47 @@
+import os
+
+from utils.curated_pack import PACK_DIR, CuratedPackReader, CuratedPackWriter, has_pack, pack_key
+
+
+def test_round_trip_across_shards(tmp_path):
+    curated_dir = str(tmp_path)
+    writer = CuratedPackWriter(curated_dir, shard_size=64)
+    pages = {f"page{i}": f"# Page {i}\n\n" + "内容 " * (i + 5) for i in range(10)}
+    for key, text in pages.items():
+        source = writer.put(key, text)
+        assert pack_key(source) == key
+    writer.put("empty", "")
+    writer.save()
+
+    assert has_pack(curated_dir)
+    assert len(os.listdir(os.path.join(curated_dir, PACK_DIR))) > 2
+    reader = CuratedPackReader(curated_dir)
+    assert all(reader.get(key) == text for key, text in pages.items())
+    assert reader.get("empty") == ""
+    assert reader.get("missing") is None
+    assert dict(reader.iter_pages()) == dict(pages, empty="")
+    reader.close()
+
+
+def test_updates_and_compaction(tmp_path):
+    curated_dir = str(tmp_path)
+    writer = CuratedPackWriter(curated_dir)
+    writer.put("a", "old " * 100)
+    writer.put("b", "kept")
+    writer.save()
+    reader = CuratedPackReader(curated_dir)
+    assert reader.get("a") == "old " * 100
+
+    # 更新后旧内容成为空洞，空洞超过一半时 save() 压缩重写
+    writer = CuratedPackWriter(curated_dir)
+    writer.put("a", "new")
+    writer.remove("b")
+    writer.save()
+    shards = [name for name in os.listdir(os.path.join(curated_dir, PACK_DIR)) if name.endswith(".pack")]
+    assert len(shards) == 1
+    assert os.path.getsize(os.path.join(curated_dir, PACK_DIR, shards[0])) == len("new")
+    # 读取端在索引替换后重新加载
+    os.utime(os.path.join(curated_dir, PACK_DIR, "index.json"), (1, 1))
+    assert reader.get("a") == "new"
+    assert reader.get("b") is None
+    reader.close()
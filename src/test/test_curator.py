@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+pytest.importorskip("html2text")
+
+from src.database import curator as curator_module
+from src.database.curator import PageCurator, PageRenderer
+from src.utils.config_loader import ConfigLoader
+
+# 每个 <name>.html 对应整理后的 <name>.md
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "curator")
+FIXTURES = sorted(name[:-len(".html")] for name in os.listdir(FIXTURES_DIR) if name.endswith(".html"))
+CLEANERS = ["bs4", pytest.param("lxml", marks=pytest.mark.skipif(not curator_module.LXML_AVAILABLE, reason="未安装 lxml"))]
+
+
+def _read(name, mode="r"):
+    with open(os.path.join(FIXTURES_DIR, name), mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+
+@pytest.fixture
+def curator(project_dir):
+    curator = PageCurator(FIXTURES_DIR, ConfigLoader(), db_name="test_curator")
+    for name in FIXTURES:
+        curator.store.put_bytes(f"https://example.com/{name}.html", _read(f"{name}.html", "rb"))
+    return curator
+
+
+@pytest.mark.parametrize("cleaner", CLEANERS)
+@pytest.mark.parametrize("name", FIXTURES)
+def test_render_page_matches_expected_markdown(curator, cleaner, name):
+    curator.cleaner = cleaner
+    assert curator.render_page(f"https://example.com/{name}.html") == _read(f"{name}.md")
+
+
+@pytest.mark.skipif(not curator_module.LXML_AVAILABLE, reason="未安装 lxml")
+@pytest.mark.parametrize("name", FIXTURES)
+def test_lxml_cleaner_matches_bs4(curator, name):
+    html = _read(f"{name}.html")
+    markdown = {}
+    for cleaner in ("lxml", "bs4"):
+        curator.cleaner = cleaner
+        markdown[cleaner] = curator.html_to_markdown(curator.clean_html(html))
+    assert markdown["lxml"] == markdown["bs4"]
+
+
+def test_worker_renders_without_manifests(curator, monkeypatch):
+    # 工作进程只持有 PageRenderer，按主进程传入的记录读取 blob
+    monkeypatch.setattr(curator_module, "_worker_renderer", None)
+    curator_module._init_worker(curator.blobs_dir)
+    assert type(curator_module._worker_renderer) is PageRenderer
+    url = f"https://example.com/{FIXTURES[0]}.html"
+    assert curator_module.curate_page(url, curator.store.get(url)) == curator.render_page(url)
+    assert curator_module.curate_page(url, None) is None
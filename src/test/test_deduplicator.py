@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from src.database.deduplicator import PageDeduplicator, changed_pages, load_duplicates, process
+from src.utils.config_loader import ConfigLoader
+
+rng = random.Random(0)
+VOCAB = [f"w{i}" for i in range(5000)]
+BASE = [rng.choice(VOCAB) for _ in range(400)]
+
+
+def _variant(changes, seed=1):
+    """替换 BASE 中 changes 个位置的词"""
+    rng = random.Random(seed)
+    words = list(BASE)
+    for i in rng.sample(range(len(words)), changes):
+        words[i] = rng.choice(VOCAB)
+    return words
+
+
+def _jaccard(a, b, k=5):
+    shingles_a = {tuple(a[i:i + k]) for i in range(len(a) - k + 1)}
+    shingles_b = {tuple(b[i:i + k]) for i in range(len(b) - k + 1)}
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+@pytest.mark.parametrize("changes", [1, 10, 40, 80])
+def test_signature_estimates_jaccard(changes):
+    dedup = PageDeduplicator(num_perm=128)
+    words = _variant(changes)
+    estimate = (dedup.signature(" ".join(BASE)) == dedup.signature(" ".join(words))).mean()
+    assert estimate == pytest.approx(_jaccard(BASE, words), abs=0.15)
+
+
+@pytest.mark.parametrize("threshold, duplicates", [(0.9, {"one": "base"}), (0.5, {"one": "base", "twenty": "base"})])
+def test_threshold(threshold, duplicates):
+    dedup = PageDeduplicator(threshold=threshold, num_perm=128)
+    assert dedup.check("base", " ".join(BASE)) is None
+    dedup.check("one", " ".join(_variant(1)))
+    dedup.check("twenty", " ".join(_variant(20)))
+    dedup.check("unrelated", " ".join(rng.choice(VOCAB) for _ in range(400)))
+    assert dedup.duplicates == duplicates
+
+
+def test_empty_pages_and_save(tmp_path):
+    dedup = PageDeduplicator()
+    assert dedup.check("empty", "  ...  ") is None
+    assert "empty" not in dedup.signatures
+    dedup.check("a", " ".join(BASE))
+    dedup.check("b", " ".join(BASE))
+    dedup.save(str(tmp_path))
+    assert load_duplicates(str(tmp_path)) == {"b": "a"}
+
+
+def test_changed_pages_after_refresh(project_dir, monkeypatch):
+    monkeypatch.setitem(ConfigLoader().config, "dedup", {"pages": True})
+    curated = project_dir / "data" / "database" / "test_dedup" / "curated"
+    curated.mkdir(parents=True)
+    (curated / "a.md").write_text(" ".join(BASE), encoding="utf-8")
+    (curated / "b.md").write_text(" ".join(_variant(1)), encoding="utf-8")
+    before = process("test_dedup")
+    assert before == {"b.md": "a.md"}
+
+    # a.md 内容大幅变化后，未修改的 b.md 不再是近重复，需要加入刷新范围
+    (curated / "a.md").write_text(" ".join(_variant(200, seed=2)), encoding="utf-8")
+    after = process("test_dedup")
+    assert after == {}
+    assert changed_pages(load_duplicates(str(curated)), after) == set()
+    assert changed_pages(before, after) == {"b.md"}
+    assert changed_pages({"c.md": "a.md"}, {"c.md": "b.md"}) == {"c.md"}
@@ -0,0 +1,150 @@
+import asyncio
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.database.downloader import SimpleAsyncDownloader
+
+
+def _run(routes, urls, tmp_path, *factories):
+    """
+    启动本地服务器，把 urls 中的路径写入链接列表，依次创建并运行下载器
+    :return: (完整URL列表, 下载器列表)
+    """
+
+    async def main():
+        app = web.Application()
+        for path, handler in routes.items():
+            app.router.add_get(path, handler)
+        async with TestServer(app) as server:
+            full_urls = [str(server.make_url(url)) for url in urls]
+            url_file = tmp_path / "links.txt"
+            url_file.write_text("".join(url + "\n" for url in full_urls), encoding="utf-8")
+            downloaders = []
+            for factory in factories:
+                # 每次运行前创建，与实际使用时一样加载上一次运行写入的页面清单
+                downloaders.append(factory())
+                await downloaders[-1].run(str(url_file))
+        return full_urls, downloaders
+
+    return asyncio.run(main())
+
+
+class _QueueProbe(SimpleAsyncDownloader):
+    """记录每次下载开始时队列中积压的URL数"""
+
+    async def _reader(self, url_list_file, task_queue):
+        self.task_queue, self.backlog = task_queue, []
+        await super()._reader(url_list_file, task_queue)
+
+    async def fetch_and_save(self, session, url):
+        self.backlog.append(self.task_queue.qsize())
+        return await super().fetch_and_save(session, url)
+
+
+async def _page(request):
+    return web.Response(text=f"<html>{request.match_info['n']}</html>", content_type="text/html")
+
+
+def test_bounded_queue_downloads_every_url(project_dir, tmp_path):
+    urls = [f"/page/{n}" for n in range(40)] + ["/missing"]
+    full_urls, (downloader,) = _run({"/page/{n}": _page}, urls, tmp_path,
+                                    lambda: _QueueProbe(delay=0, db_name="test_download", num_workers=3, queue_size=4))
+
+    assert downloader.processed == 41 and downloader.total_downloaded == 40 and downloader.failed == 1
+    # 读取协程不会一次读入全部URL
+    assert len(downloader.backlog) == 41 and max(downloader.backlog) <= 4
+    assert downloader.store.read(full_urls[7]) == b"<html>7</html>"
+
+
+async def _pdf(request):
+    return web.Response(body=b"%PDF-1.4", content_type="application/pdf")
+
+
+async def _declared_large(request):
+    return web.Response(body=b"x" * 2000, content_type="text/html")
+
+
+async def _chunked_large(request):
+    # 不声明 Content-Length，只能在读取过程中截断
+    resp = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    for _ in range(20):
+        await resp.write(b"y" * 100)
+    await resp.write_eof()
+    return resp
+
+
+async def _small(request):
+    return web.Response(body=b"<html>ok</html>", content_type="text/html")
+
+
+def test_content_type_and_size_limits(project_dir, tmp_path):
+    def make_downloader():
+        downloader = SimpleAsyncDownloader(delay=0, db_name="test_limits")
+        downloader.max_bytes = 1000
+        downloader.chunk_size = 64
+        return downloader
+
+    routes = {"/doc.pdf": _pdf, "/declared": _declared_large, "/chunked": _chunked_large, "/small": _small}
+    full_urls, (downloader,) = _run(routes, list(routes), tmp_path, make_downloader)
+
+    assert downloader.rejected == 3 and downloader.total_downloaded == 1
+    assert [downloader.store.has(url) for url in full_urls] == [False, False, False, True]
+    assert downloader.store.read(full_urls[3]) == b"<html>ok</html>"
+    assert downloader.store.get(full_urls[3])["size"] == len(b"<html>ok</html>")
+    # 截断的响应不会留下临时文件
+    assert os.listdir(downloader.store.tmp_dir) == []
+
+
+def test_reject_reason():
+    downloader = SimpleAsyncDownloader.__new__(SimpleAsyncDownloader)
+    downloader.allowed_content_types = {"text/html"}
+    downloader.max_bytes = 100
+    response = lambda content_type, length=None: type("Response", (), {
+        "headers": {"Content-Type": content_type} if content_type else {}, "content_length": length})()
+    assert downloader._reject_reason(response("text/html; charset=utf-8", 50)) is None
+    # 没有 Content-Type 时按允许处理
+    assert downloader._reject_reason(response(None)) is None
+    assert "image/png" in downloader._reject_reason(response("image/png"))
+    assert "101" in downloader._reject_reason(response("TEXT/HTML", 101))
+
+
+def test_refresh_uses_conditional_requests_and_content_hash(project_dir, tmp_path):
+    conditional, changed_requests = [], []
+
+    async def etag(request):
+        conditional.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=b"<html>v1</html>", content_type="text/html", headers={"ETag": '"v1"'})
+
+    # 以下两个页面不支持条件请求，每次都返回完整内容
+    async def static(request):
+        return web.Response(body=b"<html>same</html>", content_type="text/html")
+
+    async def changed(request):
+        changed_requests.append(request)
+        return web.Response(body=b"<html>old</html>" if len(changed_requests) == 1 else b"<html>new</html>",
+                            content_type="text/html")
+
+    routes = {"/etag": etag, "/static": static, "/changed": changed}
+    full_urls, (first, again, refresh) = _run(
+        routes, list(routes), tmp_path,
+        lambda: SimpleAsyncDownloader(delay=0, db_name="test_refresh"),
+        lambda: SimpleAsyncDownloader(delay=0, db_name="test_refresh"),
+        lambda: SimpleAsyncDownloader(delay=0, db_name="test_refresh", refresh=True),
+    )
+
+    assert first.total_downloaded == 3
+    # 不是刷新模式时已保存的页面直接跳过
+    assert again.skipped == 3
+    # ETag 命中返回 304；服务器忽略条件请求时按内容哈希判断
+    assert conditional == [None, '"v1"']
+    assert refresh.unchanged == 2 and refresh.total_downloaded == 1
+    assert refresh.changed_urls == [full_urls[2]]
+    assert refresh.store.read(full_urls[2]) == b"<html>new</html>"
+    with open(refresh.changes_file, encoding="utf-8") as f:
+        assert f.read().split() == [full_urls[2]]
@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from utils import embedding_provider
+from utils.embedding_provider import LocalEmbeddingProvider, detect_onnx_quantization
+
+
+@pytest.fixture
+def sentence_transformers(monkeypatch):
+    """记录模型加载和量化导出调用的 sentence_transformers"""
+    module = types.ModuleType("sentence_transformers")
+    module.loads, module.exports = [], []
+
+    class SentenceTransformer:
+        def __init__(self, model_path, device="cpu", backend="torch", model_kwargs=None):
+            module.loads.append((backend, (model_kwargs or {}).get("file_name")))
+
+    def export_dynamic_quantized_onnx_model(model, quantization_config, model_name_or_path, file_suffix=None):
+        module.exports.append(quantization_config)
+        path = os.path.join(model_name_or_path, "onnx", f"model_{file_suffix}.onnx")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+
+    module.SentenceTransformer = SentenceTransformer
+    module.export_dynamic_quantized_onnx_model = export_dynamic_quantized_onnx_model
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    return module
+
+
+def test_onnx_quantize_exports_once(sentence_transformers, tmp_path):
+    LocalEmbeddingProvider("local", str(tmp_path), backend="onnx", quantize=True, onnx_quantization="avx2")
+    assert sentence_transformers.exports == ["avx2"]
+    assert sentence_transformers.loads[-1] == ("onnx", "onnx/model_qint8_avx2.onnx")
+
+    # 已导出的量化模型直接加载
+    LocalEmbeddingProvider("local", str(tmp_path), backend="onnx", quantize=True, onnx_quantization="avx2")
+    assert sentence_transformers.exports == ["avx2"]
+    assert sentence_transformers.loads[-1] == ("onnx", "onnx/model_qint8_avx2.onnx")
+
+
+def test_onnx_quantize_falls_back_when_export_fails(sentence_transformers, tmp_path):
+    def fail(*args, **kwargs):
+        raise ImportError("optimum")
+
+    sentence_transformers.export_dynamic_quantized_onnx_model = fail
+    LocalEmbeddingProvider("local", str(tmp_path), backend="onnx", quantize=True)
+    assert sentence_transformers.loads[-1] == ("onnx", None)
+
+
+@pytest.mark.parametrize("machine, flags, expected", [
+    ("aarch64", "fp asimd", "arm64"),
+    ("x86_64", "sse avx2 avx512f avx512_vnni", "avx512_vnni"),
+    ("x86_64", "sse avx2 avx512f", "avx512"),
+    ("x86_64", "sse avx2", "avx2"),
+    ("x86_64", None, "avx2"),
+])
+def test_detect_onnx_quantization(monkeypatch, tmp_path, machine, flags, expected):
+    cpuinfo = tmp_path / "cpuinfo"
+    if flags is not None:
+        cpuinfo.write_text(f"processor\t: 0\nflags\t\t: {flags}\n", encoding="utf-8")
+    monkeypatch.setattr(embedding_provider.platform, "machine", lambda: machine)
+    monkeypatch.setattr(embedding_provider, "CPUINFO_PATH", str(cpuinfo))
+    assert detect_onnx_quantization() == expected
+
+
+def test_query_batch_window_starts_at_first_query(sentence_transformers, tmp_path):
+    provider = LocalEmbeddingProvider("local", str(tmp_path), batch_size=32, max_wait_ms=200)
+    batches = []
+
+    class Encoder:
+        def encode(self, texts, **kwargs):
+            batches.append(len(texts))
+            return np.zeros((len(texts), 2), dtype=np.float32)
+
+    provider.encoder = Encoder()
+    results = []
+    threads = []
+    # 每 120ms 到达一条查询，间隔小于时间窗；时间窗按每次到达重新计时时会一直等到最后一条
+    for i in range(5):
+        threads.append(threading.Thread(target=lambda: results.append(provider.embed_query("q"))))
+        threads[-1].start()
+        time.sleep(0.12)
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5
+    assert batches[0] < 5
@@ -0,0 +1,97 @@
+import pytest
+
+from utils import embedding_scheduler
+from utils.embedding_scheduler import EmbeddingScheduler, RateLimiter
+
+
+class _Clock:
+    """可控的 time.monotonic，time.sleep 记录等待时间并推进时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(embedding_scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(embedding_scheduler.time, "sleep", clock.sleep)
+    return clock
+
+
+class _Embeddings:
+    """前 failures 次调用失败，之后按文本长度返回向量"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("rate limited")
+        return [[float(len(text))] for text in texts]
+
+
+def _scheduler(embeddings=None, **kwargs):
+    scheduler = EmbeddingScheduler(embeddings or _Embeddings(), backoff=0, **kwargs)
+    # 按字符数计 token，与是否安装 tiktoken 无关
+    scheduler._encoding = None
+    return scheduler
+
+
+def test_pack_respects_size_and_token_limits():
+    scheduler = _scheduler(max_batch_size=3, max_batch_tokens=10)
+    texts = ["aaaa", "bbbb", "c", "d", "e", "ffffffffffff", "g"]
+    assert scheduler.pack(texts) == [([0, 1, 2], 9), ([3, 4], 2), ([5], 12), ([6], 1)]
+    assert scheduler.pack([]) == []
+
+
+def test_embed_returns_every_batch(clock):
+    scheduler = _scheduler(max_batch_size=2, max_concurrency=3)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    results = dict((tuple(indices), vectors) for indices, vectors in scheduler.embed(texts))
+    assert results == {(0, 1): [[1.0], [2.0]], (2, 3): [[3.0], [4.0]], (4,): [[5.0]]}
+
+
+def test_retries_then_succeeds(clock):
+    embeddings = _Embeddings(failures=2)
+    scheduler = _scheduler(embeddings, max_retries=3)
+    assert list(scheduler.embed(["abc"])) == [([0], [[3.0]])]
+    assert len(embeddings.calls) == 3
+
+
+def test_gives_up_after_max_retries(clock):
+    embeddings = _Embeddings(failures=10)
+    scheduler = _scheduler(embeddings, max_retries=2)
+    assert list(scheduler.embed(["abc"])) == [([0], None)]
+    assert len(embeddings.calls) == 3
+
+
+def test_rpm_limit_waits(clock):
+    limiter = RateLimiter(rpm=60)
+    for _ in range(60):
+        limiter.acquire(1)
+    assert clock.sleeps == []
+    # 令牌用完后每个请求等待 60 / rpm 秒
+    limiter.acquire(1)
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_tpm_limit_waits(clock):
+    limiter = RateLimiter(tpm=600)
+    limiter.acquire(600)
+    limiter.acquire(300)
+    assert clock.sleeps == [pytest.approx(30.0)]
+    # 超过 TPM 的单个批次按 TPM 计，不会永远等待
+    clock.now += 60
+    limiter.acquire(10000)
+    assert len(clock.sleeps) == 1
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("openai")
+
+from nodes import federated_search_node
+from nodes.federated_search_node import FederatedSearchNode
+from utils.logger import Logger
+
+# 节点使用 flow.py 创建的 "flow" 日志
+Logger("flow")
+
+
+class _SlowVectorDBNode:
+    """打开索引需要等待外部信号"""
+    opened = threading.Event()
+    release = threading.Event()
+
+    def __init__(self, node_id, config):
+        self.dimensions = None
+        if config["persist_directory"].endswith("slow"):
+            self.opened.set()
+            self.release.wait(timeout=10)
+
+
+class _EmbeddingNode:
+    def __init__(self, node_id, config):
+        pass
+
+
+@pytest.fixture
+def fake_nodes(monkeypatch):
+    monkeypatch.setattr(federated_search_node, "VectorDBNode", _SlowVectorDBNode)
+    monkeypatch.setattr(federated_search_node, "EmbeddingNode", _EmbeddingNode)
+    monkeypatch.setattr(federated_search_node, "_handles", {})
+
+
+def test_handles_are_opened_when_the_node_is_created(fake_nodes, tmp_path):
+    node = FederatedSearchNode("federated", {
+        "knowledge_bases": [{"db_name": "a", "model": "m"}, {"db_name": "b", "model": "m"}],
+        "persist_directory": str(tmp_path),
+    })
+    assert {key[0] for key in federated_search_node._handles} == {"a", "b"}
+    assert node._get_handles("a", "m") is federated_search_node._handles[("a", "m", "chroma")]
+
+
+def test_opening_an_index_does_not_hold_the_lock(fake_nodes, tmp_path):
+    node = FederatedSearchNode("federated", {"knowledge_bases": [], "persist_directory": str(tmp_path)})
+    _SlowVectorDBNode.opened.clear()
+    _SlowVectorDBNode.release.clear()
+    slow = threading.Thread(target=node._get_handles, args=("slow", "m"), daemon=True)
+    slow.start()
+    assert _SlowVectorDBNode.opened.wait(timeout=5)
+    try:
+        # 另一个知识库在慢索引打开期间仍可获取句柄
+        fast = threading.Thread(target=node._get_handles, args=("fast", "m"), daemon=True)
+        fast.start()
+        fast.join(timeout=5)
+        assert not fast.is_alive()
+    finally:
+        _SlowVectorDBNode.release.set()
+    slow.join(timeout=5)
+    assert ("slow", "m", "chroma") in federated_search_node._handles
@@ -0,0 +1,55 @@
+import pytest
+
+from src.database import host_scheduler
+from src.database.host_scheduler import HostScheduler, HostState, parse_retry_after
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(host_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_refills_at_rate(clock):
+    state = HostState(rate=2.0, burst=2, max_connections=2)
+    # 突发额度用完后按 1/rate 排队
+    assert state.reserve() == 0
+    assert state.reserve() == 0
+    assert state.reserve() == pytest.approx(0.5)
+    assert state.reserve() == pytest.approx(1.0)
+
+    # 令牌按经过的时间补充，且不超过 burst
+    clock.now += 10
+    assert state.reserve() == 0
+    assert state.tokens == pytest.approx(1.0)
+
+
+def test_backoff_halves_rate_and_recovers(clock):
+    scheduler = HostScheduler(rate=1.0, max_connections_per_host=1)
+    url = "https://example.com/page"
+    assert scheduler.feedback(url, 429, "30") is True
+    state = scheduler.hosts["example.com"]
+    assert state.rate == pytest.approx(0.5)
+    assert state.reserve() == pytest.approx(30.0)
+
+    for _ in range(10):
+        assert scheduler.feedback(url, 200) is False
+    assert state.rate == pytest.approx(1.0)
+    # 其他主机不受影响
+    assert scheduler._state("https://other.org/").rate == 1.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
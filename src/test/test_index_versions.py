@@ -0,0 +1,103 @@
+import os
+
+from utils.curated_pack import CuratedPackReader, CuratedPackWriter
+from utils.index_versions import (CURATED_DIR, CURRENT_FILE, create_version, current_version, discard_version,
+                                  gc_versions, list_versions, publish_version, resolve_store_path, snapshot_curated)
+
+
+def _version(model_dir, content=None, copy_current=False):
+    path = create_version(model_dir, copy_current=copy_current)
+    if content is not None:
+        with open(os.path.join(path, "data.txt"), "w", encoding="utf-8") as f:
+            f.write(content)
+    return path
+
+
+def test_publish_switches_current(tmp_path):
+    model_dir = str(tmp_path)
+    # 没有 CURRENT 时为旧目录结构，向量库直接位于模型目录下
+    assert resolve_store_path(model_dir) == model_dir
+    first = _version(model_dir, "v1")
+    assert current_version(model_dir) is None
+    publish_version(model_dir, first)
+    assert resolve_store_path(model_dir) == first
+
+    second = _version(model_dir, copy_current=True)
+    with open(os.path.join(second, "data.txt"), encoding="utf-8") as f:
+        assert f.read() == "v1"
+    publish_version(model_dir, second)
+    assert current_version(model_dir) == os.path.basename(second)
+    assert list_versions(model_dir) == sorted([os.path.basename(first), os.path.basename(second)])
+
+
+def test_gc_keeps_recent_and_in_progress_versions(tmp_path):
+    model_dir = str(tmp_path)
+    with open(os.path.join(model_dir, "chroma.sqlite3"), "w") as f:
+        f.write("legacy")
+    versions = []
+    for i in range(4):
+        versions.append(_version(model_dir, f"v{i}"))
+        publish_version(model_dir, versions[-1])
+    building = _version(model_dir)
+
+    gc_versions(model_dir, keep=2)
+    # 保留当前版本、它之前的一个版本，以及比当前版本新的构建中版本；旧目录结构的文件最先回收
+    assert list_versions(model_dir) == [os.path.basename(path) for path in versions[2:] + [building]]
+    assert sorted(os.listdir(model_dir)) == [CURRENT_FILE, "versions"]
+
+
+def test_discard_unpublished_version(tmp_path):
+    model_dir = str(tmp_path)
+    path = _version(model_dir, "partial")
+    discard_version(path)
+    assert list_versions(model_dir) == []
+    gc_versions(model_dir)
+
+
+def test_copy_is_independent_and_skips_rebuilt_dirs(tmp_path):
+    model_dir = str(tmp_path)
+    first = _version(model_dir, "v1")
+    for name in ("mmap_index", CURATED_DIR):
+        os.makedirs(os.path.join(first, name))
+    publish_version(model_dir, first)
+
+    second = create_version(model_dir, copy_current=True, skip=["mmap_index"])
+    # 构建时重新生成的目录不复制
+    assert sorted(os.listdir(second)) == ["data.txt"]
+    # 新版本原地改写文件不影响已发布的版本
+    with open(os.path.join(second, "data.txt"), "r+", encoding="utf-8") as f:
+        f.write("v2")
+    with open(os.path.join(first, "data.txt"), encoding="utf-8") as f:
+        assert f.read() == "v1"
+
+
+def test_curated_snapshot_survives_rewrites(tmp_path):
+    curated_dir = str(tmp_path / "curated")
+    os.makedirs(curated_dir)
+    with open(os.path.join(curated_dir, "a.md"), "w", encoding="utf-8") as f:
+        f.write("old a")
+    with open(os.path.join(curated_dir, "b.md"), "w", encoding="utf-8") as f:
+        f.write("b")
+    pack = CuratedPackWriter(curated_dir)
+    pack.put("p", "old p")
+    pack.put("q", "q" * 100)
+    pack.save()
+    version = create_version(str(tmp_path / "model"))
+    snapshot_curated(version, curated_dir)
+
+    # 重新整理（原子替换）、删除孤立结果、压缩分片
+    with open(os.path.join(curated_dir, "a.md.tmp"), "w", encoding="utf-8") as f:
+        f.write("new a")
+    os.replace(os.path.join(curated_dir, "a.md.tmp"), os.path.join(curated_dir, "a.md"))
+    os.remove(os.path.join(curated_dir, "b.md"))
+    pack.remove("q")
+    pack.put("p", "new p")
+    pack.save()
+
+    snapshot = os.path.join(version, CURATED_DIR)
+    with open(os.path.join(snapshot, "a.md"), encoding="utf-8") as f:
+        assert f.read() == "old a"
+    assert os.path.exists(os.path.join(snapshot, "b.md"))
+    reader = CuratedPackReader(snapshot)
+    assert reader.get("p") == "old p" and reader.get("q") == "q" * 100
+    reader.close()
@@ -0,0 +1,39 @@
+from utils.markdown_chunker import MarkdownChunker
+
+
+def _chunks(chunker, text):
+    return [(text[start:end], path) for start, end, path in chunker.split_text(text)]
+
+
+def test_fenced_code_is_kept_whole():
+    code = "```python\n" + "".join(f"x{i} = {i}\n\n" for i in range(40)) + "```"
+    text = "# Title\n\nIntro paragraph.\n\n## Example\n\n" + "Some text. " * 20 + "\n\n" + code + "\n\nAfter code.\n"
+    chunker = MarkdownChunker(chunk_size=300, min_chunk_size=50, max_code_size=2000)
+    chunks = _chunks(chunker, text)
+    # 代码块内的空行不作为分段位置，超过 chunk_size 但不超过 max_code_size 的代码块不被切开
+    assert (code, ("Title", "Example")) in chunks
+    assert all(content.count("```") in (0, 2) for content, _ in chunks)
+
+
+def test_hash_lines_inside_fences_are_not_headings():
+    text = "# Guide\n\n```bash\n# install\nnpm install cesium\n```\n\nDone.\n"
+    chunks = _chunks(MarkdownChunker(chunk_size=1000, min_chunk_size=10), text)
+    assert chunks == [(text.rstrip(), ("Guide",))]
+
+
+def test_oversized_code_is_split_by_lines():
+    lines = [f"line_{i:03d} = compute({i})\n" for i in range(200)]
+    code = "```\n" + "".join(lines) + "```"
+    chunker = MarkdownChunker(chunk_size=500, min_chunk_size=50, max_code_size=1000)
+    chunks = _chunks(chunker, "# Big\n\n" + code)
+    assert len(chunks) > 1
+    assert all(len(content) <= 500 for content, _ in chunks)
+    # 按行切分，每一行都完整地出现在某个切片中
+    body = "".join(content + "\n" for content, _ in chunks)
+    assert all(line in body for line in lines)
+
+
+def test_unclosed_fence_runs_to_end_of_document():
+    text = "# Top\n\nText.\n\n```\n## not a heading\ncode\n"
+    chunks = _chunks(MarkdownChunker(chunk_size=1000, min_chunk_size=10), text)
+    assert [path for _, path in chunks] == [("Top",)]
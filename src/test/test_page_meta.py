@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from src.database.downloader import SimpleAsyncDownloader
+from src.database.links_extractor import LinksExtractor
+from src.database.page_meta import PageMetaStore
+
+PREFIX = "https://example.com/docs/"
+
+
+class _Response:
+    status_code = 200
+    headers = {"Content-Type": "text/html", "ETag": '"v1"'}
+
+    def __init__(self, html):
+        self.text = html
+        self.content = html.encode("utf-8")
+
+    def raise_for_status(self):
+        pass
+
+
+class _Session:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        self.requests.append(url)
+        return _Response(self.pages[url])
+
+
+def test_page_meta_last_record_wins(project_dir):
+    meta = PageMetaStore("test_meta")
+    meta.record(PREFIX + "a.html", status=200, etag='"v1"')
+    meta.record(PREFIX + "a.html", status=200, etag='"v2"')
+    # 中断时留下的不完整行在加载时跳过
+    with open(meta.path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"url": PREFIX + "b.html"})[:10])
+
+    reloaded = PageMetaStore("test_meta")
+    assert reloaded.get(PREFIX + "a.html")["etag"] == '"v2"'
+    assert PREFIX + "b.html" not in reloaded
+
+
+def test_crawled_pages_are_not_downloaded_again(project_dir):
+    extractor = LinksExtractor("test_meta", required_prefix=PREFIX, save_pages=True)
+    session = _Session({
+        PREFIX + "index.html": '<a href="camera.html">camera</a><a href="https://other.org/">other</a>',
+    })
+    links = extractor.process_page(PREFIX + "index.html", session)
+    assert links == {PREFIX + "camera.html"}
+    record = extractor.page_store.get(PREFIX + "index.html")
+    assert record["fetched_by"] == "links_extractor" and record["etag"] == '"v1"'
+    assert extractor.page_store.read(PREFIX + "index.html") == session.pages[PREFIX + "index.html"].encode("utf-8")
+    # 前缀之外的页面不保存
+    extractor.save_page("https://other.org/", b"<html></html>", 200, {})
+    assert extractor.page_store.get("https://other.org/") is None
+
+    # 下载器直接跳过爬取时已保存的页面，不发起请求
+    downloader = SimpleAsyncDownloader(db_name="test_meta")
+    assert asyncio.run(downloader.fetch_and_save(None, PREFIX + "index.html")) == PREFIX + "index.html"
+    assert downloader.captured == 1 and downloader.total_downloaded == 0
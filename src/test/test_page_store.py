@@ -0,0 +1,23 @@
+import os
+
+from src.database.page_store import LEGACY_MARKER, PageStore
+
+
+def test_import_legacy_pages(project_dir):
+    store = PageStore("test_store", compression="gzip")
+    links = os.path.join(project_dir, "extracted_links.txt")
+    with open(links, "w", encoding="utf-8") as f:
+        f.write("https://example.com/docs/camera.html\n")
+        # 两个URL共用旧文件名 index.html，无法确定归属
+        f.write("https://example.com/a/index.html\nhttps://example.com/b/index.html\n")
+    for name in ("camera.html", "index.html", "orphan.html"):
+        with open(os.path.join(store.root, name), "wb") as f:
+            f.write(f"<html>{name}</html>".encode())
+
+    assert store.import_legacy(links) == 1
+    assert store.read("https://example.com/docs/camera.html") == b"<html>camera.html</html>"
+    assert store.get("https://example.com/docs/camera.html")["fetched_by"] == "legacy_import"
+    assert not store.has("https://example.com/a/index.html")
+    assert os.path.exists(os.path.join(store.root, LEGACY_MARKER))
+    # 只在第一次运行时导入
+    assert store.import_legacy(links) == 0
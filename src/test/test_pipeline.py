@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("openai")
+
+from langchain_core.documents import Document
+
+from src.database.chunk_manifest import ChunkManifest
+from src.database.pipeline import StreamingBuildPipeline, _DONE
+
+URLS = ["https://example.com/a", "https://example.com/b", "https://example.com/c"]
+
+
+def _make_pipeline(monkeypatch, render):
+    build = StreamingBuildPipeline("test_pipeline", {"model": "test-model"}, curate_workers=2)
+    build.curator.executor = "thread"
+
+    def crawl(file_path):
+        build.url_queue.put(_DONE)
+
+    def download():
+        for url in URLS:
+            build.html_queue.put(url)
+        for _ in range(build.curate_workers):
+            build.html_queue.put(_DONE)
+
+    monkeypatch.setattr(build, "_crawl_stage", crawl)
+    monkeypatch.setattr(build, "_download_stage", download)
+    monkeypatch.setattr(build.downloader.store, "get", lambda url: {"content_hash": url})
+    monkeypatch.setattr(build.curator, "render_page", render)
+    written, deleted = [], []
+    vectorizator = build.vectorizator
+
+    class Collection:
+        def delete(self, ids):
+            deleted.extend(ids)
+
+    class Store:
+        _collection = Collection()
+
+    def open_vectorstore(persist_path, embeddings_model):
+        vectorizator._manifest = ChunkManifest(persist_path)
+        vectorizator._vectordb = Store()
+        vectorizator._mmap_writer = None
+
+    monkeypatch.setattr(vectorizator, "open_vectorstore", open_vectorstore)
+    monkeypatch.setattr(vectorizator, "add_documents", lambda docs, ids=None: written.extend(docs))
+    monkeypatch.setattr(vectorizator, "close_vectorstore", lambda: None)
+    monkeypatch.setattr(vectorizator, "publish_persist_path", lambda: None)
+    monkeypatch.setattr(vectorizator, "write_mmap", False)
+    build.deduplicator = None
+    return build, written, deleted
+
+
+def _run(build):
+    """在线程中运行，超时说明流水线卡住"""
+    outcome = {}
+
+    def target():
+        try:
+            build.run("unused.txt")
+            outcome["result"] = "ok"
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "流水线在整理线程失败后没有结束"
+    return outcome
+
+
+def _render(url, record):
+    return f"# {url}\n\ncontent"
+
+
+def test_curate_failure_is_raised(project_dir, monkeypatch):
+    def render(url, record):
+        if url.endswith("/b"):
+            raise RuntimeError("lxml failed")
+        return f"# {url}\n\ncontent"
+
+    build, _, _ = _make_pipeline(monkeypatch, render)
+    outcome = _run(build)
+    assert isinstance(outcome.get("error"), RuntimeError)
+
+
+def test_pipeline_completes(project_dir, monkeypatch):
+    build, written, _ = _make_pipeline(monkeypatch, _render)
+    outcome = _run(build)
+    assert outcome == {"result": "ok"}
+    assert len(written) == 3
+
+
+def test_pipeline_reuses_existing_vectors(project_dir, monkeypatch):
+    build, written, deleted = _make_pipeline(monkeypatch, _render)
+    vectorizator = build.vectorizator
+    # 当前版本中已有页面 a 的切片和一个已不存在的页面的切片
+    old = ChunkManifest(vectorizator.persist_path)
+    source = build.curator.output_path(URLS[0])
+    kept = old.assign(vectorizator.split_documents([Document(page_content=_render(URLS[0], None), metadata={"source": source})]), dedup=vectorizator.dedup_chunks)
+    stale = old.assign([Document(page_content="removed", metadata={"source": "gone.md"})], dedup=vectorizator.dedup_chunks)
+    monkeypatch.setattr(vectorizator, "_load_manifest", lambda: old)
+
+    outcome = _run(build)
+    assert outcome == {"result": "ok"}
+    assert sorted(doc.metadata["source"] for doc in written) == sorted(build.curator.output_path(url) for url in URLS[1:])
+    assert deleted == stale
+    assert set(kept) <= vectorizator._manifest.ids()
@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+
+from nodes.retriever_node import RetrieverNode
+from utils.logger import Logger
+
+# 节点使用 flow.py 创建的 "flow" 日志
+Logger("flow")
+
+
+def test_structured_chunks_use_chunk_text(tmp_path):
+    source = str(tmp_path / "curated" / "missing.md")
+    chunk = lambda text, start, headings="": Document(
+        page_content=text, metadata={"source": source, "start_index": start, "end_index": start + len(text),
+                                     "headings": headings})
+    docs = [chunk("second", 50, "Camera > flyTo"), chunk("first", 0), chunk("second", 50, "Camera > flyTo")]
+    # 源文件不存在也不影响：切片文本已包含所需内容
+    context = RetrieverNode("retriever").process({"retrieved_docs": docs})["context"]
+    assert context == "## first\n\n## Camera > flyTo\nsecond\n\n"
+
+
+def test_chunks_without_offsets_read_whole_file_once(tmp_path, monkeypatch):
+    node = RetrieverNode("retriever")
+    path = tmp_path / "page.md"
+    path.write_text("# Page\n\nfull text", encoding="utf-8")
+    monkeypatch.setattr(node, "_get_path", lambda source, curated_dir=None: source)
+    docs = [Document(page_content=part, metadata={"source": str(path)}) for part in ("# Page", "full text")]
+    assert node.process({"retrieved_docs": docs})["context"] == "## # Page\n\nfull text\n\n"
+
+
+def test_reads_source_from_version_snapshot(tmp_path):
+    snapshot = tmp_path / "versions" / "v1" / "curated"
+    snapshot.mkdir(parents=True)
+    (snapshot / "page.md").write_text("snapshot text", encoding="utf-8")
+    # curated 目录中的文件已被删除，命中版本的快照仍保留构建时的内容
+    source = str(tmp_path / "data" / "database" / "db" / "curated" / "page.md")
+    docs = [Document(page_content="chunk", metadata={"source": source, "curated_dir": str(snapshot)})]
+    assert RetrieverNode("retriever").process({"retrieved_docs": docs})["context"] == "## snapshot text\n\n"
+
+
+def test_missing_source_falls_back_to_chunks(tmp_path):
+    source = str(tmp_path / "curated" / "gone.md")
+    docs = [Document(page_content=text, metadata={"source": source, "curated_dir": str(tmp_path / "none")})
+            for text in ("one", "two")]
+    assert RetrieverNode("retriever").process({"retrieved_docs": docs})["context"] == "## one\n\n## two\n\n"
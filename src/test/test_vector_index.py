@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from utils.vector_index import MmapIndexWriter, MmapVectorIndex, QuantizedCodes, rescore
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    # 50 个簇、每簇 40 条，近似真实语料中语义相近的切片
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((50, 64))
+    matrix = np.repeat(centers, 40, axis=0) + 0.5 * rng.standard_normal((2000, 64))
+    matrix = matrix.astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _build(tmp_path, vectors, quantization, rescore_factor=4):
+    index_dir = str(tmp_path / quantization)
+    writer = MmapIndexWriter(index_dir, dtype="float32", quantization=quantization, rescore_factor=rescore_factor)
+    writer.add(vectors, [Document(page_content=str(i), metadata={"id": i}) for i in range(len(vectors))])
+    writer.close(model="test")
+    return MmapVectorIndex(index_dir)
+
+
+def test_int8_codes_approximate_vectors(vectors):
+    codes = QuantizedCodes.build("int8", vectors, block_rows=300)
+    restored = codes.codes.astype(np.float32) * codes.scale
+    assert codes.nbytes < vectors.nbytes / 3
+    assert np.abs(restored - vectors).max() <= codes.scale.max() / 2 + 1e-6
+
+
+def test_binary_codes_pack_sign_bits(vectors):
+    codes = QuantizedCodes.build("binary", vectors)
+    assert codes.codes.shape == (len(vectors), 8)
+    assert np.array_equal(np.unpackbits(codes.codes, axis=1).astype(bool), vectors > 0)
+
+
+def test_rescore_orders_candidates_by_full_precision(vectors):
+    queries = vectors[:3]
+    candidates = np.array([[5, 0, 9], [1, 7, 2], [2, 4, 8]])
+    scores, ids = rescore(vectors, queries, candidates, k=2)
+    assert ids[:, 0].tolist() == [0, 1, 2]
+    assert scores[:, 0] == pytest.approx(1.0)
+    assert scores[0, 1] == pytest.approx(float(max(vectors[5] @ vectors[0], vectors[9] @ vectors[0])))
+
+
+@pytest.mark.parametrize("quantization, rescore_factor, min_recall", [("int8", 4, 0.95), ("binary", 10, 0.8)])
+def test_quantized_search_recall(tmp_path, vectors, quantization, rescore_factor, min_recall):
+    exact = _build(tmp_path, vectors, "none")
+    index = _build(tmp_path, vectors, quantization, rescore_factor)
+    assert index.codes is not None and index.codes.kind == quantization
+
+    rng = np.random.default_rng(1)
+    queries = vectors[::40] + 0.1 * rng.standard_normal((50, vectors.shape[1])).astype(np.float32)
+    k = 10
+    exact_scores, exact_ids = exact.search(queries, k)
+    scores, ids = index.search(queries, k)
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(exact_ids.tolist(), ids.tolist())])
+    assert recall >= min_recall
+    # 精排后的分数是全精度内积，且按降序排列
+    normalized = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    assert scores == pytest.approx(np.einsum("qd,qkd->qk", normalized, vectors[ids]), abs=1e-5)
+    assert np.all(np.diff(scores, axis=1) <= 1e-6)
+
+
+def test_quantized_index_rescores_with_float32(tmp_path, vectors):
+    # 配置为 float16 时，量化索引的精排矩阵仍以 float32 保存
+    writer = MmapIndexWriter(str(tmp_path), dtype="float16", quantization="int8")
+    writer.add(vectors, [Document(page_content=str(i)) for i in range(len(vectors))])
+    assert writer.close()["dtype"] == "float32"
+    index = MmapVectorIndex(str(tmp_path), block_rows=300)
+    assert index.vectors.dtype == np.float32
+    scores, ids = index.search(vectors[:5], 3)
+    assert ids[:, 0].tolist() == list(range(5))
+    assert scores[:, 0] == pytest.approx(1.0, abs=1e-6)
+
+
+def test_small_blocks_match_single_block(tmp_path, vectors):
+    exact = _build(tmp_path, vectors, "none")
+    queries = vectors[:7]
+    whole = MmapVectorIndex(exact.index_dir, block_rows=len(vectors)).search(queries, 5)
+    blocked = MmapVectorIndex(exact.index_dir, block_rows=128).search(queries, 5)
+    assert np.array_equal(whole[1], blocked[1])
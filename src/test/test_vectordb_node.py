@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+
+from langchain_core.documents import Document
+
+from nodes.vectordb_node import VectorDBNode
+from utils.index_versions import create_version, publish_version
+from utils.logger import Logger
+from utils.vector_index import MMAP_INDEX_DIR, MmapIndexWriter, MmapVectorIndex, write_store_meta
+
+MODEL = "test-model"
+# 节点使用 flow.py 创建的 "flow" 日志
+Logger("flow")
+
+
+def _publish(model_dir, mmap_index, quantization="none"):
+    version_path = create_version(model_dir)
+    if mmap_index:
+        writer = MmapIndexWriter(os.path.join(version_path, MMAP_INDEX_DIR), quantization=quantization)
+        writer.add([[1.0, 0.0], [0.0, 1.0]], [Document(page_content=text, metadata={"source": f"{text}.md"}) for text in "ab"])
+        writer.close(model=MODEL, dimensions=None)
+    write_store_meta(version_path, model=MODEL, dimensions=None, embedding_dim=2, backend="chroma", mmap_index=mmap_index)
+    publish_version(model_dir, version_path)
+    return version_path
+
+
+def test_backend_follows_store_meta(tmp_path):
+    model_dir = os.path.join(tmp_path, "chroma_openai", MODEL)
+    # 全局配置为 chroma，但该知识库额外写入了量化的 mmap 索引
+    _publish(model_dir, mmap_index=True, quantization="int8")
+    node = VectorDBNode("vectordb_node", {"model": MODEL, "persist_directory": str(tmp_path), "backend": "chroma"})
+    assert node.backend == "mmap"
+    assert isinstance(node.vectordb, MmapVectorIndex)
+    hits = node.search_with_scores([[1.0, 0.0]], k=1)
+    assert hits[0][0][0].page_content == "a"
+
+    # 新版本只有 Chroma，下一次查询时切换后端
+    _publish(model_dir, mmap_index=False)
+    node._check_version()
+    assert node.backend == "chroma"
+    assert not isinstance(node.vectordb, MmapVectorIndex)
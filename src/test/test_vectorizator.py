@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("openai")
+
+from langchain_core.documents import Document
+
+from src.database.chunk_manifest import ChunkManifest
+from src.database.vectorizator import Vectorizator
+from src.utils.config_loader import ConfigLoader
+from src.utils.index_versions import create_version, publish_version
+from src.utils.vector_index import write_store_meta
+
+MODEL = {"model": "text-embedding-3-large"}
+
+
+def _publish_store(project_dir, **meta):
+    model_dir = os.path.join(project_dir, "data", "database", "test_db", "chroma_openai", MODEL["model"])
+    version_path = create_version(model_dir)
+    write_store_meta(version_path, **meta)
+    publish_version(model_dir, version_path)
+
+
+def test_embedding_dim_defaults_to_existing_store(project_dir):
+    _publish_store(project_dir, model=MODEL["model"], dimensions=256, embedding_dim=256, backend="chroma")
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL)
+    assert vectorizator.embedding_dim == 256
+    assert vectorizator.embeddings_model["dimensions"] == 256
+
+
+def test_explicit_embedding_dim_wins(project_dir):
+    _publish_store(project_dir, model=MODEL["model"], dimensions=256, embedding_dim=256, backend="chroma")
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL, {"embedding_dim": 512})
+    assert vectorizator.embedding_dim == 512
+
+
+def test_embedding_dim_without_store(project_dir):
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL)
+    assert vectorizator.embedding_dim is None
+    assert "dimensions" not in vectorizator.embeddings_model
+
+
+def test_refresh_without_store_raises(project_dir):
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL)
+    with pytest.raises(RuntimeError):
+        vectorizator.refresh([])
+
+
+def test_refresh_with_mismatched_store_raises(project_dir):
+    _publish_store(project_dir, model=MODEL["model"], dimensions=256, embedding_dim=256, backend="chroma")
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL, {"embedding_dim": 512})
+    with pytest.raises(RuntimeError):
+        vectorizator.refresh([])
+
+
+class _FlakyScheduler:
+    """第一次调用失败，之后返回固定向量"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        yield list(range(len(texts))), None if self.calls == 1 else [[1.0, 0.0]] * len(texts)
+
+
+class _Collection:
+    def __init__(self):
+        self.ids = []
+        self.metadatas = {}
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        self.ids.extend(ids)
+        self.metadatas.update(zip(ids, metadatas))
+
+    def get(self, ids, include):
+        return {"ids": ids, "metadatas": [self.metadatas[vector_id] for vector_id in ids]}
+
+    def update(self, ids, metadatas):
+        self.metadatas.update(zip(ids, metadatas))
+
+    def delete(self, ids):
+        for vector_id in ids:
+            self.metadatas.pop(vector_id, None)
+
+
+def _open_fake_store(vectorizator, persist_path):
+    vectorizator._scheduler = _FlakyScheduler()
+    vectorizator._manifest = ChunkManifest(persist_path)
+    vectorizator._vectordb = type("Store", (), {"_collection": _Collection()})()
+    vectorizator._mmap_writer = None
+    vectorizator._written = set()
+    vectorizator._duplicates = vectorizator._vectorized = 0
+    vectorizator._embedding_dim = None
+
+
+def test_failed_chunks_are_retried_in_later_batches(project_dir, tmp_path):
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL)
+    vectorizator.dedup_chunks = True
+    _open_fake_store(vectorizator, str(tmp_path))
+    collection = vectorizator._vectordb._collection
+
+    vectorizator.add_documents([Document(page_content="shared", metadata={"source": "a.md"})])
+    assert collection.ids == []
+    # 内容相同的切片出现在后续批次中时重新计算，而不是被当作已写入而跳过
+    vectorizator.add_documents([Document(page_content="shared", metadata={"source": "b.md"})])
+    assert len(collection.ids) == 1
+    assert vectorizator._manifest.ids() == set(collection.ids)
+
+
+def test_shared_vector_follows_surviving_source(project_dir, tmp_path):
+    vectorizator = Vectorizator(ConfigLoader(), "test_db", MODEL)
+    vectorizator.dedup_chunks = True
+    _open_fake_store(vectorizator, str(tmp_path))
+    collection = vectorizator._vectordb._collection
+    old = ChunkManifest(str(tmp_path))
+    footer = [Document(page_content="footer", metadata={"source": source}) for source in ("a.md", "b.md")]
+    (shared, _) = old.assign(footer, dedup=True)
+    collection.upsert([shared], None, [{"source": "a.md"}], None)
+
+    # a.md 被删除，b.md 未变化
+    vectorizator._sync([[footer[1]]], old)
+    assert collection.metadatas == {shared: {"source": "b.md"}}
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from .logger import Logger
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = Logger("build_metrics")
+
+# 知识库目录下保存构建报告的子目录
+REPORT_DIR = "build_reports"
+# 报告中各阶段的顺序，未出现在这里的阶段排在最后
+STAGES = ("extract", "download", "curate", "dedup", "split", "embed", "persist")
+
+
+def _cpu_seconds() -> float:
+    """本进程及其子进程（如整理进程池）累计的 CPU 时间"""
+    if PSUTIL_AVAILABLE:
+        process = psutil.Process()
+        total = sum(process.cpu_times()[:2])
+        for child in process.children(recursive=True):
+            try:
+                total += sum(child.cpu_times()[:2])
+            except psutil.Error:
+                pass
+        return total
+    # 没有 psutil 时只能统计已退出的子进程
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _rss_bytes() -> int:
+    """本进程及其子进程当前的常驻内存"""
+    if PSUTIL_AVAILABLE:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # 退化为进程生命周期内的峰值；Linux 上单位为 KB，macOS 上为字节
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return 0
+
+
+class StageMetrics:
+    """单个阶段的统计：处理条数、字节数、错误数、活跃时间、CPU 时间和峰值内存"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.errors = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss = 0
+        self.active = 0
+        self.active_since = None
+        # 上次采样以来是否活跃过，用于分摊这段时间的 CPU
+        self.touched = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "wall_time": round(self.wall_time, 3),
+            "cpu_time": round(self.cpu_time, 3),
+            "peak_rss": self.peak_rss,
+            "items_per_sec": round(self.items / self.wall_time, 2) if self.wall_time else None,
+            "bytes_per_sec": round(self.bytes / self.wall_time, 2) if self.wall_time else None,
+        }
+
+
+class BuildMetrics:
+    """
+    一次构建的分阶段统计
+
+    - 各组件用 stage(name) 标记阶段正在工作，可以在多个线程中嵌套或并发进入，
+      活跃时间为各次进入的时间区间的并集
+    - 后台线程每隔 sample_interval 秒采样一次进程（含子进程）的 CPU 时间和常驻内存：
+      这段时间的 CPU 增量平均分摊给期间活跃过的阶段，常驻内存计入这些阶段的峰值
+    - add(name, ...) 累加处理条数、字节数和错误数，吞吐量按活跃时间计算
+    """
+
+    def __init__(self, db_name: str, sample_interval: float = 0.2, **info: Any):
+        self.db_name = db_name
+        self.info = info
+        self.sample_interval = sample_interval
+        self.stages: Dict[str, StageMetrics] = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._cpu_start = self._last_cpu = _cpu_seconds()
+        self.peak_rss = _rss_bytes()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name="build-metrics", daemon=True)
+        self._sampler.start()
+        self.report = None
+
+    def _stage(self, name: str) -> StageMetrics:
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str):
+        with self.lock:
+            stage = self._stage(name)
+            if stage.active == 0:
+                stage.active_since = time.perf_counter()
+            stage.active += 1
+            stage.touched = True
+        try:
+            yield stage
+        finally:
+            with self.lock:
+                stage.active -= 1
+                if stage.active == 0:
+                    stage.wall_time += time.perf_counter() - stage.active_since
+
+    def add(self, name: str, items: int = 0, bytes: int = 0, errors: int = 0):
+        with self.lock:
+            stage = self._stage(name)
+            stage.items += items
+            stage.bytes += bytes
+            stage.errors += errors
+
+    def _sample(self):
+        cpu, rss = _cpu_seconds(), _rss_bytes()
+        with self.lock:
+            delta, self._last_cpu = cpu - self._last_cpu, cpu
+            self.peak_rss = max(self.peak_rss, rss)
+            touched = [stage for stage in self.stages.values() if stage.touched]
+            for stage in touched:
+                stage.cpu_time += delta / len(touched)
+                stage.peak_rss = max(stage.peak_rss, rss)
+                stage.touched = stage.active > 0
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.sample_interval):
+            self._sample()
+
+    def finish(self, status: str = "success", error: Optional[str] = None) -> Dict[str, Any]:
+        """停止采样并生成报告"""
+        if self._stop.is_set():
+            return self.report
+        self._stop.set()
+        self._sampler.join()
+        self._sample()
+        # 构建失败时可能还有阶段没有退出
+        with self.lock:
+            now = time.perf_counter()
+            for stage in self.stages.values():
+                if stage.active:
+                    stage.wall_time += now - stage.active_since
+                    stage.active_since = now
+        order = {name: i for i, name in enumerate(STAGES)}
+        stages = sorted(self.stages.values(), key=lambda stage: order.get(stage.name, len(STAGES)))
+        self.report = {
+            "db_name": self.db_name,
+            **self.info,
+            "status": status,
+            "error": error,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "wall_time": round(time.perf_counter() - self._start, 3),
+            "cpu_time": round(self._last_cpu - self._cpu_start, 3),
+            "peak_rss": self.peak_rss,
+            "psutil": PSUTIL_AVAILABLE,
+            "stages": {stage.name: stage.to_dict() for stage in stages},
+        }
+        return self.report
+
+    def save(self, db_dir: str) -> str:
+        """把报告写入 <知识库目录>/build_reports/<开始时间>.json"""
+        report = self.finish() if self.report is None else self.report
+        report_dir = os.path.join(db_dir, REPORT_DIR)
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at)) + ".json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    def log_summary(self):
+        report = self.finish() if self.report is None else self.report
+        logger.info(f"{'阶段':<10}{'条数':>10}{'MB':>10}{'错误':>8}{'耗时(s)':>10}{'CPU(s)':>10}{'峰值内存(MB)':>14}{'条/秒':>10}")
+        for name, stage in report["stages"].items():
+            logger.info(
+                f"{name:<10}{stage['items']:>10}{stage['bytes'] / 1024 / 1024:>10.2f}{stage['errors']:>8}"
+                f"{stage['wall_time']:>10.2f}{stage['cpu_time']:>10.2f}{stage['peak_rss'] / 1024 / 1024:>14.1f}"
+                f"{stage['items_per_sec'] or 0:>10.1f}"
+            )
+
+
+class _NullMetrics:
+    """没有正在进行的构建时（如单独运行某个模块）使用，不做任何统计"""
+
+    @contextmanager
+    def stage(self, name: str):
+        yield None
+
+    def add(self, name: str, items: int = 0, bytes: int = 0, errors: int = 0):
+        pass
+
+
+_null = _NullMetrics()
+_active: Optional[BuildMetrics] = None
+
+
+def start_build(db_name: str, **info: Any) -> BuildMetrics:
+    """开始统计一次构建，之后各组件通过 current() 上报"""
+    global _active
+    _active = BuildMetrics(db_name, **info)
+    return _active
+
+
+def current():
+    """当前构建的统计对象，没有正在进行的构建时返回不做统计的空对象"""
+    return _active if _active is not None else _null
+
+
+def end_build(status: str = "success", error: Optional[str] = None) -> Optional[BuildMetrics]:
+    global _active
+    metrics, _active = _active, None
+    if metrics is not None:
+        metrics.finish(status, error)
+    return metrics
@@ -0,0 +1,224 @@
+import os
+import json
+import mmap
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .logger import Logger
+
+logger = Logger("curated_pack")
+
+# curated 目录下打包整理结果所在的子目录名
+PACK_DIR = "packs"
+PACK_INDEX_FILE = "index.json"
+SHARD_NAME = "shard-{:05d}.pack"
+
+
+def pack_key(source: str) -> str:
+    """切片 metadata 中的 source（curated/<key>.md）对应的打包键"""
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def has_pack(curated_dir: str) -> bool:
+    return os.path.exists(os.path.join(curated_dir, PACK_DIR, PACK_INDEX_FILE))
+
+
+def _next_shard(shards: List[str]) -> str:
+    return SHARD_NAME.format(int(shards[-1].split("-")[1].split(".")[0]) + 1 if shards else 0)
+
+
+def _load_index(pack_dir: str) -> Tuple[List[str], Dict[str, List]]:
+    path = os.path.join(pack_dir, PACK_INDEX_FILE)
+    if not os.path.exists(path):
+        return [], {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("shards", []), data.get("entries", {})
+
+
+class CuratedPackWriter:
+    """
+    把整理后的 Markdown 打包写入 curated/packs/ 下的分片
+
+    - shard-NNNNN.pack: 各页面 Markdown 的 UTF-8 字节首尾相接，分片写满 shard_size 后换新分片
+    - index.json: 打包键 -> [分片名, 偏移, 长度]
+
+    分片只追加，更新页面时写入新内容并修改索引，旧内容成为空洞；空洞超过一半时 save() 压缩重写。
+    索引在 save() 时原子替换，读取端只会看到完整写入的内容。
+    """
+
+    def __init__(self, curated_dir: str, shard_size: int = 256 * 1024 * 1024):
+        self.curated_dir = curated_dir
+        self.pack_dir = os.path.join(curated_dir, PACK_DIR)
+        self.shard_size = shard_size
+        self.lock = threading.Lock()
+        self.shards, self.entries = _load_index(self.pack_dir)
+        self._file = None
+        self._dirty = False
+
+    def source(self, key: str) -> str:
+        """打包键对应的 source 路径，与按文件输出时的 Markdown 路径相同"""
+        return os.path.join(self.curated_dir, key + ".md")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def keys(self) -> List[str]:
+        return list(self.entries)
+
+    def _current_file(self):
+        if self._file is not None and self._file.tell() < self.shard_size:
+            return self._file
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.pack_dir, exist_ok=True)
+        if not self.shards or os.path.getsize(os.path.join(self.pack_dir, self.shards[-1])) >= self.shard_size:
+            self.shards.append(_next_shard(self.shards))
+        self._file = open(os.path.join(self.pack_dir, self.shards[-1]), "ab")
+        self._file.seek(0, os.SEEK_END)
+        return self._file
+
+    def put(self, key: str, text: str) -> str:
+        """写入一个页面，返回其 source 路径"""
+        data = text.encode("utf-8")
+        with self.lock:
+            f = self._current_file()
+            offset = f.tell()
+            f.write(data)
+            self.entries[key] = [self.shards[-1], offset, len(data)]
+            self._dirty = True
+        return self.source(key)
+
+    def remove(self, key: str):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def clear(self):
+        """删除全部分片和索引"""
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for name in os.listdir(self.pack_dir) if os.path.isdir(self.pack_dir) else []:
+                os.remove(os.path.join(self.pack_dir, name))
+            self.shards, self.entries = [], {}
+            self._dirty = False
+
+    def _write_index(self):
+        os.makedirs(self.pack_dir, exist_ok=True)
+        path = os.path.join(self.pack_dir, PACK_INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "shards": self.shards, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _compact(self):
+        """把仍在索引中的内容按顺序重写到新分片，删除旧分片"""
+        old_shards, old_entries = self.shards, self.entries
+        self.shards, self.entries = [], {}
+        reader = CuratedPackReader(self.curated_dir, shards=old_shards, entries=old_entries)
+        try:
+            for key, text in reader.iter_pages():
+                if self._file is None or self._file.tell() >= self.shard_size:
+                    if self._file is not None:
+                        self._file.close()
+                    self.shards.append(_next_shard(self.shards or old_shards))
+                    self._file = open(os.path.join(self.pack_dir, self.shards[-1]), "wb")
+                data = text.encode("utf-8")
+                self.entries[key] = [self.shards[-1], self._file.tell(), len(data)]
+                self._file.write(data)
+        finally:
+            reader.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._write_index()
+        for name in old_shards:
+            os.remove(os.path.join(self.pack_dir, name))
+
+    def save(self):
+        """落盘分片并原子替换索引"""
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not self._dirty:
+                return
+            total = sum(os.path.getsize(os.path.join(self.pack_dir, name)) for name in self.shards)
+            live = sum(length for _, _, length in self.entries.values())
+            if total > 2 * live:
+                logger.info(f"整理结果分片中 {total - live} 字节已失效，压缩分片")
+                self._compact()
+            else:
+                self._write_index()
+            self._dirty = False
+
+
+class CuratedPackReader:
+    """
+    按需读取 curated/packs/ 中的页面，分片以只读 mmap 打开，只复制请求的字节范围
+
+    索引文件被替换（重新整理或压缩）后自动重新加载。
+    """
+
+    def __init__(self, curated_dir: str, shards: Optional[List[str]] = None, entries: Optional[Dict[str, List]] = None):
+        self.curated_dir = curated_dir
+        self.pack_dir = os.path.join(curated_dir, PACK_DIR)
+        self.index_path = os.path.join(self.pack_dir, PACK_INDEX_FILE)
+        self.lock = threading.Lock()
+        self._maps: Dict[str, Tuple[object, mmap.mmap]] = {}
+        self._index_mtime = None
+        # 由写入端传入索引时只读取这一份快照
+        self._static = entries is not None
+        if entries is not None:
+            self.shards, self.entries = shards, entries
+        else:
+            self.shards, self.entries = [], {}
+            self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime == self._index_mtime:
+            return
+        self.close()
+        self.shards, self.entries = _load_index(self.pack_dir)
+        self._index_mtime = mtime
+
+    def _map(self, shard: str) -> mmap.mmap:
+        if shard not in self._maps:
+            f = open(os.path.join(self.pack_dir, shard), "rb")
+            self._maps[shard] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._maps[shard][1]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            if not self._static:
+                self._reload()
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            shard, offset, length = entry
+            if length == 0:
+                return ""
+            return self._map(shard)[offset:offset + length].decode("utf-8")
+
+    def iter_pages(self) -> Iterator[Tuple[str, str]]:
+        """按分片和偏移顺序读取全部页面，返回 (打包键, Markdown)"""
+        ordered = sorted(self.entries.items(), key=lambda item: (item[1][0], item[1][1]))
+        for key, (shard, offset, length) in ordered:
+            with self.lock:
+                text = self._map(shard)[offset:offset + length].decode("utf-8") if length else ""
+            yield key, text
+
+    def close(self):
+        for f, mm in self._maps.values():
+            mm.close()
+            f.close()
+        self._maps = {}
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import queue
+import platform
+import threading
+from abc import abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config_loader import ConfigLoader
+from .logger import Logger
+
+DEFAULT_BASE_URL = "https://api.chatanywhere.tech/v1"
+CPUINFO_PATH = "/proc/cpuinfo"
+
+
+def detect_onnx_quantization() -> str:
+    """
+    按本机 CPU 选择 ONNX 动态量化的目标指令集：arm64 / avx512_vnni / avx512 / avx2
+    无法读取 CPU 特性（非 Linux）的 x86 主机按 avx2 处理
+    """
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    flags = set()
+    try:
+        with open(CPUINFO_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    break
+    except OSError:
+        pass
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+class EmbeddingProvider(Embeddings):
+    """
+    Embedding 提供者接口
+
+    同时实现 langchain 的 Embeddings 接口，可以直接传给 Chroma 等向量库使用。
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.logger = Logger("embedding_provider")
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量计算文档向量"""
+
+    @abstractmethod
+    def embed_query(self, text: str) -> List[float]:
+        """计算单条查询向量"""
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量计算查询向量，默认逐条调用 embed_query，子类可覆盖为一次批量推理
+        """
+        return [self.embed_query(text) for text in texts]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    基于 OpenAI 兼容接口的远程 embedding
+    """
+
+    def __init__(self, model: str, base_url: str = DEFAULT_BASE_URL, api_key: Optional[str] = None,
+                 dimensions: Optional[int] = None, max_retries: int = 0):
+        super().__init__(model)
+        from langchain_openai import OpenAIEmbeddings
+
+        self.base_url = base_url
+        self.dimensions = dimensions
+        # text-embedding-3 系列支持通过 dimensions 参数直接返回截短后的向量
+        self.embeddings = OpenAIEmbeddings(
+            model=model,
+            base_url=base_url,
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            dimensions=dimensions,
+            # 构建时由 EmbeddingScheduler 统一限速和重试，客户端内部重试会绕过限速并与调度器的重试叠加
+            max_retries=max_retries
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # OpenAI 接口的查询和文档向量相同，合并为一次请求以减少网络往返
+        if not texts:
+            return []
+        return self.embeddings.embed_documents(texts)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    本地 CPU 推理的 embedding，基于 sentence-transformers（支持 torch / onnx 后端）
+
+    - 文档向量：按文本长度排序后切分批次，减少 padding，并在线程池中并行推理
+    - 查询向量：后台线程在 max_wait_ms 时间窗内把并发到达的查询合并为一个批次（动态批处理）
+    - quantize=True 时对 torch 后端的 Linear 层做动态 int8 量化
+    """
+
+    def __init__(
+        self,
+        model: str,
+        model_path: str,
+        backend: str = "torch",
+        device: str = "cpu",
+        batch_size: int = 32,
+        num_workers: int = 2,
+        quantize: bool = False,
+        onnx_file_name: Optional[str] = None,
+        onnx_quantization: Optional[str] = None,
+        max_wait_ms: float = 2.0,
+        normalize: bool = True,
+        query_instruction: str = "",
+        dimensions: Optional[int] = None,
+    ):
+        super().__init__(model)
+        self.dimensions = dimensions
+        self.model_path = model_path
+        self.backend = backend
+        self.device = device
+        self.batch_size = batch_size
+        self.num_workers = max(1, num_workers)
+        self.quantize = quantize
+        # ONNX 动态量化针对的指令集：arm64 / avx2 / avx512 / avx512_vnni，未配置时按本机 CPU 选择
+        self.onnx_quantization = onnx_quantization or detect_onnx_quantization()
+        self.max_wait_ms = max_wait_ms
+        self.normalize = normalize
+        self.query_instruction = query_instruction
+
+        if not os.path.exists(model_path):
+            raise ValueError(f"本地embedding模型不存在: {model_path}")
+
+        self.encoder = self._load_encoder(onnx_file_name)
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix=f"embed-{model}")
+
+        # 查询动态批处理
+        self._query_queue: "queue.Queue[tuple]" = queue.Queue()
+        self._batcher = threading.Thread(target=self._query_batch_loop, name=f"query-batcher-{model}", daemon=True)
+        self._batcher.start()
+
+    def _load_encoder(self, onnx_file_name: Optional[str]):
+        from sentence_transformers import SentenceTransformer
+
+        self.logger.info(f"加载本地embedding模型: {self.model_path}, backend={self.backend}, quantize={self.quantize}")
+        if self.backend == "onnx":
+            if self.quantize:
+                if onnx_file_name:
+                    self.logger.warning(f"已指定 onnx_file_name={onnx_file_name}，按该文件加载，不再做动态量化")
+                else:
+                    onnx_file_name = self._quantized_onnx_file()
+            model_kwargs = {"file_name": onnx_file_name} if onnx_file_name else None
+            return SentenceTransformer(self.model_path, device=self.device, backend="onnx", model_kwargs=model_kwargs)
+
+        encoder = SentenceTransformer(self.model_path, device=self.device)
+        if self.quantize:
+            import torch
+
+            encoder = torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+        return encoder
+
+    def _quantized_onnx_file(self) -> Optional[str]:
+        """
+        ONNX 模型的 int8 动态量化版本，首次使用时导出到模型目录的 onnx/ 下，之后直接加载
+        :return: 量化模型相对模型目录的路径，无法量化时返回 None（使用未量化的模型）
+        """
+        file_name = f"onnx/model_qint8_{self.onnx_quantization}.onnx"
+        if os.path.exists(os.path.join(self.model_path, file_name)):
+            return file_name
+        try:
+            from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+            self.logger.info(f"导出 int8 动态量化的ONNX模型: {file_name}")
+            encoder = SentenceTransformer(self.model_path, device=self.device, backend="onnx")
+            export_dynamic_quantized_onnx_model(encoder, self.onnx_quantization, self.model_path,
+                                                file_suffix=f"qint8_{self.onnx_quantization}")
+        except Exception as e:
+            # 旧版本 sentence-transformers 或未安装 optimum[onnxruntime] 时无法导出
+            self.logger.warning(f"ONNX模型动态量化失败，使用未量化的模型: {e}")
+            return None
+        return file_name
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.encoder.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        if self.dimensions:
+            # 截取前 dimensions 维后重新归一化
+            vectors = vectors[:, :self.dimensions]
+            if self.normalize:
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.where(norms == 0, 1.0, norms)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # 按长度排序后切批，同一批次内长度接近，padding 更少
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        futures = [self.executor.submit(self._encode, [texts[i] for i in batch]) for batch in batches]
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, future in zip(batches, futures):
+            for i, vector in zip(batch, future.result()):
+                results[i] = vector
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._query_queue.put((self.query_instruction + text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _query_batch_loop(self):
+        wait_seconds = self.max_wait_ms / 1000.0
+        while True:
+            pending = [self._query_queue.get()]
+            # 在时间窗内继续收集并发到达的查询，时间窗从批次中第一条查询到达时开始计算
+            deadline = time.monotonic() + wait_seconds
+            while len(pending) < self.batch_size:
+                try:
+                    pending.append(self._query_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._encode([text for text, _ in pending])
+                for (_, future), vector in zip(pending, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                self.logger.error(f"查询向量推理失败: {e}")
+                for _, future in pending:
+                    future.set_exception(e)
+
+
+# 已创建的 provider 缓存，避免每次查询都重新加载本地模型
+_providers: Dict[str, EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def resolve_embedding_model_config(model_name: str, base_url: Optional[str] = None, api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    根据模型名称在 embedding_model_list.json 中查找完整配置，找不到时按 OpenAI 兼容接口处理
+    """
+    model_list = ConfigLoader().embedding_model_list
+    if model_name in model_list:
+        return model_list[model_name]
+    for model_config in model_list.values():
+        if model_config.get("model") == model_name:
+            return model_config
+    model_config = {"model": model_name, "base_url": base_url or DEFAULT_BASE_URL}
+    if api_key:
+        model_config["openai_api_key"] = api_key
+    return model_config
+
+
+def create_embedding_provider(model_config: Dict[str, Any]) -> EmbeddingProvider:
+    """
+    根据模型配置创建 embedding provider
+
+    配置中的 provider 字段取值:
+    - "openai"（默认）: 远程 OpenAI 兼容接口
+    - "local": 本地 sentence-transformers 模型，model_path 为相对项目根目录的路径
+
+    dimensions 字段用于截短输出向量维度，为空时使用模型的完整维度
+    """
+    provider = model_config.get("provider", "openai")
+    model = model_config["model"]
+    if provider == "openai":
+        return OpenAIEmbeddingProvider(
+            model=model,
+            base_url=model_config.get("base_url", DEFAULT_BASE_URL),
+            api_key=model_config.get("openai_api_key") or model_config.get("api_key"),
+            dimensions=model_config.get("dimensions"),
+            max_retries=model_config.get("max_retries", 0),
+        )
+    if provider == "local":
+        model_path = model_config.get("model_path", os.path.join("models", model))
+        if not os.path.isabs(model_path):
+            model_path = os.path.join(ConfigLoader().project_root, model_path)
+        return LocalEmbeddingProvider(
+            model=model,
+            model_path=model_path,
+            backend=model_config.get("backend", "torch"),
+            device=model_config.get("device", "cpu"),
+            batch_size=model_config.get("batch_size", 32),
+            num_workers=model_config.get("num_workers", 2),
+            quantize=model_config.get("quantize", False),
+            onnx_file_name=model_config.get("onnx_file_name"),
+            onnx_quantization=model_config.get("onnx_quantization"),
+            max_wait_ms=model_config.get("max_wait_ms", 2.0),
+            normalize=model_config.get("normalize", True),
+            query_instruction=model_config.get("query_instruction", ""),
+            dimensions=model_config.get("dimensions"),
+        )
+    raise ValueError(f"不支持的embedding provider: {provider}")
+
+
+def get_embedding_provider(model_config: Dict[str, Any]) -> EmbeddingProvider:
+    """
+    获取（并缓存）embedding provider，同一配置只创建一次
+    """
+    key = json.dumps(model_config, sort_keys=True)
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = create_embedding_provider(model_config)
+        return _providers[key]
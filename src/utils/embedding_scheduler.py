@@ -0,0 +1,126 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .logger import Logger
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+class RateLimiter:
+    """
+    每分钟请求数（RPM）和每分钟 token 数（TPM）的令牌桶，多线程共享
+
+    预约制：在锁内补充并扣减令牌、计算需要等待的时间，在锁外等待，并发调用者按到达顺序排队。
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.lock = threading.Lock()
+        self.requests = float(rpm or 0)
+        self.tokens = float(tpm or 0)
+        self.updated = time.monotonic()
+
+    def acquire(self, tokens: int):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.updated = now
+            wait = 0.0
+            if self.rpm:
+                self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60.0) - 1
+                if self.requests < 0:
+                    wait = max(wait, -self.requests * 60.0 / self.rpm)
+            if self.tpm:
+                # 单个批次超过 TPM 时按 TPM 计，避免永远等不到
+                self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60.0) - min(tokens, self.tpm)
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens * 60.0 / self.tpm)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class EmbeddingScheduler:
+    """
+    并发、限速的批量 embedding 调度器
+
+    - 按条数和 token 数把切片打包成批次，单个批次不超过 max_batch_size 条、max_batch_tokens 个 token
+    - 最多 max_concurrency 个批次同时请求，受 RPM / TPM 预算约束
+    - 失败的批次指数退避重试，重试耗尽后返回 None，由调用方决定如何处理，不会中断整个构建
+    - 批次完成一个返回一个，调用方可以边计算边写入向量库
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 256, max_batch_tokens: int = 50000,
+                 max_concurrency: int = 4, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_retries: int = 5, backoff: float = 1.0):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(rpm, tpm)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.logger = Logger("embedding_scheduler")
+        self._encoding = tiktoken.get_encoding("cl100k_base") if TIKTOKEN_AVAILABLE else None
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        # 没有 tiktoken 时按字符数保守估计（中文大约每个字符一个 token）
+        return len(text)
+
+    def pack(self, texts: List[str]) -> List[Tuple[List[int], int]]:
+        """
+        按顺序把文本打包成批次
+        :return: [(文本下标列表, 批次 token 数), ...]
+        """
+        batches, indices, batch_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if indices and (len(indices) >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append((indices, batch_tokens))
+                indices, batch_tokens = [], 0
+            indices.append(i)
+            batch_tokens += tokens
+        if indices:
+            batches.append((indices, batch_tokens))
+        return batches
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> Optional[List[List[float]]]:
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.logger.error(f"批次向量化失败（{len(texts)} 段），已重试 {self.max_retries} 次: {e}")
+                    return None
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                self.logger.warning(f"批次向量化失败: {e}，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+
+    def embed(self, texts: List[str]) -> Iterator[Tuple[List[int], Optional[List[List[float]]]]]:
+        """
+        并发计算向量，按完成顺序返回 (文本下标列表, 向量列表)，失败的批次向量为 None
+        """
+        batches = self.pack(texts)
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            for indices, tokens in batches:
+                yield indices, self._embed_batch([texts[i] for i in indices], tokens)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embedding") as executor:
+            futures = {
+                executor.submit(self._embed_batch, [texts[i] for i in indices], tokens): indices
+                for indices, tokens in batches
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
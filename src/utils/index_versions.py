@@ -0,0 +1,168 @@
+import os
+import time
+import shutil
+from typing import List, Optional, Sequence
+
+from .logger import Logger
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = Logger("index_versions")
+
+# chroma_openai/<model>/ 下保存各次构建结果的子目录和指向当前版本的指针文件
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+# 版本目录下构建时所用 curated 内容的快照，查询端按版本读取原文
+CURATED_DIR = "curated"
+
+# Linux 的 FICLONE ioctl：btrfs、xfs 等文件系统上新文件与源文件共享数据块，写入时才复制
+FICLONE = 0x40049409
+
+
+def clone_file(src: str, dst: str) -> str:
+    """复制单个文件，文件系统支持 reflink 时只复制元数据，否则退回普通复制"""
+    if FCNTL_AVAILABLE:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return dst
+        except OSError:
+            pass
+    return shutil.copy2(src, dst)
+
+
+def _link_or_clone(src: str, dst: str) -> str:
+    try:
+        os.link(src, dst)
+        return dst
+    except OSError:
+        # 跨文件系统或不支持硬链接
+        return clone_file(src, dst)
+
+
+def snapshot_tree(source: str, target: str):
+    """
+    用硬链接为目录建立快照，只在无法建立硬链接时复制文件。
+    要求源目录中的文件只会被整体替换（写临时文件后 os.replace）、删除或追加，不会原地改写
+    """
+    shutil.copytree(source, target, copy_function=_link_or_clone, ignore=shutil.ignore_patterns("*.tmp"))
+
+
+def current_version(model_dir: str) -> Optional[str]:
+    """读取当前版本名，尚未发布过版本（旧版本构建的向量库）时返回 None"""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def resolve_store_path(model_dir: str) -> str:
+    """
+    当前版本向量库所在目录
+    没有 CURRENT 指针时向量库直接位于 model_dir 下（旧的目录结构）
+    """
+    version = current_version(model_dir)
+    if version is None:
+        return model_dir
+    return os.path.join(model_dir, VERSIONS_DIR, version)
+
+
+def list_versions(model_dir: str) -> List[str]:
+    """按构建时间从旧到新列出全部版本"""
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir) if os.path.isdir(os.path.join(versions_dir, name)))
+
+
+def _legacy_entries(model_dir: str) -> List[str]:
+    """旧目录结构中直接位于 model_dir 下的向量库文件"""
+    if not os.path.isdir(model_dir):
+        return []
+    return [name for name in os.listdir(model_dir) if name not in (VERSIONS_DIR, CURRENT_FILE, CURRENT_FILE + ".tmp")]
+
+
+def create_version(model_dir: str, copy_current: bool = False, skip: Sequence[str] = ()) -> str:
+    """
+    创建一个新的版本目录，版本名为构建开始时间（精确到微秒），按字典序即按时间排序
+    :param copy_current: 复制当前版本作为起点（增量构建），否则为空目录（完整构建）
+    :param skip: 复制时跳过的文件或目录名，用于构建时会重新生成的内容
+    :return: 新版本目录
+    """
+    now = time.time_ns()
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10**9))}-{now // 1000 % 10**6:06d}"
+    version_path = os.path.join(model_dir, VERSIONS_DIR, version)
+    source = resolve_store_path(model_dir)
+    if copy_current and os.path.isdir(source):
+        start = time.perf_counter()
+        # curated 快照在发布时重新建立；旧目录结构下 model_dir 本身就是向量库，复制时跳过版本目录和指针文件
+        skip = [CURATED_DIR, *skip] + ([VERSIONS_DIR, CURRENT_FILE, CURRENT_FILE + ".tmp"] if source == model_dir else [])
+        # Chroma 的 SQLite 和 HNSW 段文件会被原地修改，不能使用硬链接；不支持 reflink 时为完整复制
+        shutil.copytree(source, version_path, ignore=shutil.ignore_patterns(*skip), copy_function=clone_file)
+        logger.info(f"复制当前版本 {source} -> {version_path}，耗时 {time.perf_counter() - start:.2f} 秒")
+    else:
+        os.makedirs(version_path)
+    return version_path
+
+
+def snapshot_curated(version_path: str, curated_dir: str):
+    """发布前为新版本建立 curated 快照，之后 remove_orphans 和分片压缩不影响该版本的查询"""
+    target = os.path.join(version_path, CURATED_DIR)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    if os.path.isdir(curated_dir):
+        start = time.perf_counter()
+        snapshot_tree(curated_dir, target)
+        logger.info(f"已建立 curated 快照 {target}，耗时 {time.perf_counter() - start:.2f} 秒")
+
+
+def publish_version(model_dir: str, version_path: str):
+    """原子地把 CURRENT 指向新版本，查询端在下一次查询时切换"""
+    path = os.path.join(model_dir, CURRENT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version_path))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    logger.info(f"向量库当前版本切换为 {os.path.basename(version_path)}")
+
+
+def discard_version(version_path: str):
+    """删除构建失败、未发布的版本"""
+    if os.path.isdir(version_path):
+        shutil.rmtree(version_path, ignore_errors=True)
+        logger.warning(f"已删除未发布的版本: {version_path}")
+
+
+def gc_versions(model_dir: str, keep: int = 2):
+    """
+    回收旧版本：保留当前版本和它之前最近的 keep - 1 个版本，切换前刚开始的查询仍可读完旧版本。
+    比当前版本新的目录可能是正在进行的构建，不回收
+    """
+    current = current_version(model_dir)
+    if current is None:
+        return
+    older = [name for name in list_versions(model_dir) if name < current]
+    # 旧目录结构的文件视为最早的版本
+    legacy = _legacy_entries(model_dir)
+    candidates = ([None] if legacy else []) + older
+    expired = candidates[:max(0, len(candidates) - max(0, keep - 1))]
+    for version in expired:
+        if version is None:
+            for name in legacy:
+                path = os.path.join(model_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            logger.info(f"已回收旧目录结构的向量库文件: {model_dir}")
+        else:
+            shutil.rmtree(os.path.join(model_dir, VERSIONS_DIR, version), ignore_errors=True)
+            logger.info(f"已回收旧版本: {version}")
@@ -0,0 +1,182 @@
+import re
+from bisect import bisect_right
+from typing import Iterable, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+# 一次扫描同时找出代码围栏行和标题行，标题判断在 Python 中只对命中的行进行
+STRUCTURE_RE = re.compile(
+    r"^ {0,3}(?:(?P<fence>`{3,}|~{3,})[^\n]*|(?P<hashes>#{1,6})(?:[ \t]+(?P<title>[^\n]*?))?[ \t#]*)$",
+    re.M,
+)
+BLANK_LINE_RE = re.compile(r"\n[ \t]*\n")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?。！？；;])\s+|\n")
+INDENTED_LINE_RE = re.compile(r"^(?: {4}|\t)", re.M)
+NON_BLANK_LINE_RE = re.compile(r"^[ \t]*\S", re.M)
+LEADING_BLANK_RE = re.compile(r"(?:[ \t]*\n)+")
+
+Span = Tuple[int, int]
+
+
+class MarkdownChunker:
+    """
+    按 Markdown 结构切分文档
+
+    - 在标题处分节，记录每个切片所在的标题路径（如 "Camera > flyTo"）
+    - 节过长时按空行分段后贪心合并，围栏代码块和缩进代码块作为整体不被切开，
+      超过 max_code_size 的代码块才按行切分
+    - 过短的父标题节与紧随其后的子标题节合并，避免只有一行标题的切片
+    - 切片内容是原文的连续片段，metadata 中 start_index / end_index 为其在原文中的字符偏移
+    """
+
+    def __init__(self, chunk_size: int = 1000, min_chunk_size: int = 200, max_code_size: int = 4000):
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_code_size = max(max_code_size, chunk_size)
+
+    def split_text(self, text: str) -> List[Tuple[int, int, Tuple[str, ...]]]:
+        """
+        :return: [(起始偏移, 结束偏移, 标题路径), ...]
+        """
+        sections, fences = self._sections(text)
+        fence_starts = [start for start, _ in fences]
+        chunks = []
+        for start, end, path in sections:
+            for j, (s, e) in enumerate(self._split_section(text, start, end, fences, fence_starts)):
+                s, e = _strip(text, s, e)
+                if s >= e:
+                    continue
+                previous = chunks[-1] if chunks else None
+                # 只有标题和少量文字的父节并入紧随其后的子节
+                if (j == 0 and previous and previous[1] - previous[0] < self.min_chunk_size
+                        and e - previous[0] <= self.chunk_size and path[:len(previous[2])] == previous[2]):
+                    chunks[-1] = (previous[0], e, previous[2])
+                else:
+                    chunks.append((s, e, path))
+        return chunks
+
+    def split_documents(self, docs: Iterable[Document]) -> List[Document]:
+        chunks = []
+        for doc in docs:
+            text = doc.page_content
+            for start, end, path in self.split_text(text):
+                metadata = dict(doc.metadata)
+                metadata.update(headings=" > ".join(path), start_index=start, end_index=end)
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks
+
+    def _sections(self, text: str):
+        """按标题分节，忽略代码围栏内的 # 行；同时返回各围栏代码块的范围"""
+        sections, fences = [], []
+        path: List[Tuple[int, str]] = []
+        section_start, section_path = 0, ()
+        fence, fence_start = None, 0
+        for m in STRUCTURE_RE.finditer(text):
+            marker = m.group("fence")
+            if marker:
+                if fence is None:
+                    fence, fence_start = marker, m.start()
+                elif marker[0] == fence[0] and len(marker) >= len(fence) and m.group(0).strip() == marker:
+                    fences.append((fence_start, m.end()))
+                    fence = None
+                continue
+            if fence is not None:
+                continue
+            if m.start() > section_start:
+                sections.append((section_start, m.start(), section_path))
+            level = len(m.group("hashes"))
+            path = [item for item in path if item[0] < level] + [(level, (m.group("title") or "").strip())]
+            section_start, section_path = m.start(), tuple(title for _, title in path)
+        if fence is not None:
+            # 未闭合的围栏延续到文末
+            fences.append((fence_start, len(text)))
+        sections.append((section_start, len(text), section_path))
+        return sections, fences
+
+    def _split_section(self, text: str, start: int, end: int, fences: Sequence[Span], fence_starts: List[int]):
+        if end - start <= self.chunk_size:
+            return [(start, end)]
+        blocks = self._blocks(text, start, end, fences, fence_starts)
+        spans = []
+        for s, e, is_code in blocks:
+            if e - s <= self.chunk_size or (is_code and e - s <= self.max_code_size):
+                spans.append((s, e))
+            elif is_code:
+                spans.extend(_pack(_line_spans(text, s, e), self.chunk_size))
+            else:
+                spans.extend(self._split_paragraph(text, s, e))
+        spans = _pack(spans, self.chunk_size)
+        # 标题行不与其后的正文分开
+        if len(spans) > 1 and spans[0][1] - spans[0][0] < self.min_chunk_size:
+            spans[:2] = [(spans[0][0], spans[1][1])]
+        return spans
+
+    def _blocks(self, text: str, start: int, end: int, fences: Sequence[Span], fence_starts: List[int]):
+        """
+        按空行分段，空行落在围栏代码块内时不切；相邻的缩进代码段合并为一个代码块
+        :return: [(起始, 结束, 是否代码块), ...]
+        """
+        cuts = [start]
+        for m in BLANK_LINE_RE.finditer(text, start, end):
+            i = bisect_right(fence_starts, m.start()) - 1
+            if i >= 0 and m.start() < fences[i][1]:
+                continue
+            cuts.append(m.start() + 1)
+        cuts.append(end)
+
+        blocks = []
+        for s, e in zip(cuts, cuts[1:]):
+            if s >= e:
+                continue
+            i = bisect_right(fence_starts, e - 1) - 1
+            fenced = i >= 0 and fences[i][1] > s
+            lines = len(NON_BLANK_LINE_RE.findall(text, s, e))
+            indented = lines > 0 and len(INDENTED_LINE_RE.findall(text, s, e)) >= lines
+            if indented and blocks and blocks[-1][2] == "indented":
+                blocks[-1] = (blocks[-1][0], e, "indented")
+            else:
+                blocks.append((s, e, "indented" if indented else ("fenced" if fenced else None)))
+        return [(s, e, kind is not None) for s, e, kind in blocks]
+
+    def _split_paragraph(self, text: str, start: int, end: int) -> List[Span]:
+        """过长的段落按句子和换行切分，单句仍过长时按长度硬切"""
+        cuts = [start] + [m.end() for m in SENTENCE_END_RE.finditer(text, start, end)] + [end]
+        spans = []
+        for s, e in zip(cuts, cuts[1:]):
+            while e - s > self.chunk_size:
+                spans.append((s, s + self.chunk_size))
+                s += self.chunk_size
+            if s < e:
+                spans.append((s, e))
+        return _pack(spans, self.chunk_size)
+
+
+def _line_spans(text: str, start: int, end: int) -> List[Span]:
+    spans, s = [], start
+    while s < end:
+        e = text.find("\n", s, end)
+        e = end if e < 0 else e + 1
+        spans.append((s, e))
+        s = e
+    return spans
+
+
+def _pack(spans: Sequence[Span], limit: int) -> List[Span]:
+    """把首尾相接的片段贪心合并为不超过 limit 的区间，单个超长片段原样保留"""
+    packed = []
+    for s, e in spans:
+        if packed and e - packed[-1][0] <= limit:
+            packed[-1] = (packed[-1][0], e)
+        else:
+            packed.append((s, e))
+    return packed
+
+
+def _strip(text: str, start: int, end: int) -> Span:
+    """去掉首尾空行和末尾空白，保留首行缩进（缩进代码块）"""
+    m = LEADING_BLANK_RE.match(text, start, end)
+    if m:
+        start = m.end()
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
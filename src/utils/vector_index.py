@@ -0,0 +1,413 @@
+import os
+import json
+import mmap
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .logger import Logger
+
+try:
+    import hnswlib
+    HNSW_AVAILABLE = True
+except ImportError:
+    HNSW_AVAILABLE = False
+
+logger = Logger("vector_index")
+
+# 向量库目录下 mmap 索引所在的子目录名
+MMAP_INDEX_DIR = "mmap_index"
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunk_offsets.npy"
+HNSW_FILE = "hnsw.bin"
+META_FILE = "index_meta.json"
+CODES_FILE = "codes_{kind}.npy"
+SCALE_FILE = "codes_int8_scale.npy"
+
+QUANTIZATION_KINDS = ("none", "int8", "binary")
+
+# 按块扫描向量矩阵时每块的行数；每块会转换为 float32 计算，3072 维时约 48 MB
+BLOCK_ROWS = 4096
+
+# 0-255 每个字节中 1 的个数，用于没有 np.bitwise_count 的 numpy 版本
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def read_store_meta(persist_directory: str) -> Dict[str, Any]:
+    """
+    读取向量库目录（chroma_openai/{model} 的某个版本）下的索引元数据，旧版本构建的向量库没有元数据时返回空字典
+    """
+    meta_path = os.path.join(persist_directory, META_FILE)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_store_meta(persist_directory: str, **meta: Any) -> Dict[str, Any]:
+    """写入向量库目录下的索引元数据"""
+    os.makedirs(persist_directory, exist_ok=True)
+    meta.setdefault("created_at", time.strftime("%Y-%m-%d %H:%M:%S"))
+    with open(os.path.join(persist_directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def check_store_meta(store_meta: Dict[str, Any], model: Optional[str] = None, embedding_dim: Optional[int] = None):
+    """
+    校验查询端的模型和向量维度与索引元数据一致，不一致时抛出 ValueError
+    """
+    if model and store_meta.get("model") and store_meta["model"] != model:
+        raise ValueError(f"embedding模型不一致: 查询使用 {model}，索引为 {store_meta['model']}")
+    if embedding_dim and store_meta.get("embedding_dim") and store_meta["embedding_dim"] != embedding_dim:
+        raise ValueError(f"向量维度不一致: 查询使用 {embedding_dim} 维，索引为 {store_meta['embedding_dim']} 维")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT[values]
+
+
+class QuantizedCodes:
+    """
+    向量的量化编码，用于第一轮粗排
+
+    - int8: 按维度对称标量量化，每个维度一个缩放系数，内存为 float32 的 1/4
+    - binary: 按符号位二值化并打包，使用汉明距离粗排，内存为 float32 的 1/32
+
+    编码常驻内存，粗排得到的候选再用磁盘上的 float32 向量精排。
+    """
+
+    def __init__(self, kind: str, codes: np.ndarray, scale: Optional[np.ndarray] = None):
+        if kind not in ("int8", "binary"):
+            raise ValueError(f"不支持的量化方式: {kind}")
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+
+    @classmethod
+    def build(cls, kind: str, vectors: np.ndarray, block_rows: int = BLOCK_ROWS) -> "QuantizedCodes":
+        """按块扫描向量矩阵生成量化编码"""
+        count = len(vectors)
+        if kind == "int8":
+            max_abs = np.zeros(vectors.shape[1], dtype=np.float32)
+            for start in range(0, count, block_rows):
+                block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+                max_abs = np.maximum(max_abs, np.abs(block).max(axis=0))
+            scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            codes = np.empty(vectors.shape, dtype=np.int8)
+            for start in range(0, count, block_rows):
+                block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+                codes[start:start + block_rows] = np.clip(np.rint(block / scale), -127, 127)
+            return cls(kind, codes, scale)
+        if kind == "binary":
+            codes = np.empty((count, (vectors.shape[1] + 7) // 8), dtype=np.uint8)
+            for start in range(0, count, block_rows):
+                block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+                codes[start:start + block_rows] = np.packbits(block > 0, axis=1)
+            return cls(kind, codes)
+        raise ValueError(f"不支持的量化方式: {kind}")
+
+    @classmethod
+    def load(cls, index_dir: str, kind: str) -> "QuantizedCodes":
+        codes = np.load(os.path.join(index_dir, CODES_FILE.format(kind=kind)))
+        scale = np.load(os.path.join(index_dir, SCALE_FILE)) if kind == "int8" else None
+        return cls(kind, codes, scale)
+
+    def save(self, index_dir: str):
+        np.save(os.path.join(index_dir, CODES_FILE.format(kind=self.kind)), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(index_dir, SCALE_FILE), self.scale)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def _block_scores(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        block = self.codes[start:end]
+        if self.kind == "int8":
+            # 只把当前小块转换为 float32，避免每次查询都展开整个编码矩阵
+            return (queries * self.scale) @ block.astype(np.float32).T
+        # 汉明距离越小越相似，取负数作为分数
+        query_bits = np.packbits(queries > 0, axis=1)
+        distances = np.stack([_popcount(np.bitwise_xor(block, bits)).sum(axis=1, dtype=np.int32) for bits in query_bits])
+        return -distances.astype(np.float32)
+
+    def shortlist(self, queries: np.ndarray, n: int, block_rows: int = BLOCK_ROWS) -> np.ndarray:
+        """粗排，返回每个查询的 n 个候选编号，形状为 (len(queries), n)"""
+        count = len(self.codes)
+        n = min(n, count)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, count, block_rows):
+            scores = self._block_scores(queries, start, start + block_rows)
+            nn = min(n, scores.shape[1])
+            idx = np.argpartition(-scores, nn - 1, axis=1)[:, :nn]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, idx, axis=1)], axis=1)
+            best_ids = np.concatenate([best_ids, idx + start], axis=1)
+            if best_scores.shape[1] > n:
+                keep = np.argpartition(-best_scores, n - 1, axis=1)[:, :n]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        return best_ids
+
+
+def rescore(vectors: np.ndarray, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    用全精度向量对候选精排
+    :param vectors: 向量矩阵（通常为磁盘上的 memmap，只读取候选所在的行）；量化索引的矩阵以 float32 保存，
+                    精排分数即 float32 内积
+    :param candidates: 形状为 (len(queries), n) 的候选编号
+    """
+    unique_ids, inverse = np.unique(candidates, return_inverse=True)
+    rows = np.asarray(vectors[unique_ids], dtype=np.float32)
+    candidate_vectors = rows[inverse.reshape(candidates.shape)]
+    scores = np.einsum("qd,qnd->qn", queries, candidate_vectors)
+    k = min(k, candidates.shape[1])
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+
+class MmapIndexWriter:
+    """
+    流式写入 mmap 向量索引
+
+    向量先以 float32 追加写入临时文件，close() 时按块转换为目标精度的 .npy 文件，
+    文本和元数据逐行写入 chunks.jsonl，并记录每行的字节偏移以便查询时按需读取。
+    启用量化时粗排只使用编码，矩阵只在精排时按候选读取，因此固定以 float32 保存，不使用 dtype。
+    """
+
+    def __init__(self, index_dir: str, dtype: str = "float16", build_hnsw: bool = False,
+                 hnsw_m: int = 16, hnsw_ef_construction: int = 200,
+                 quantization: str = "none", rescore_factor: int = 4):
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"不支持的向量精度: {dtype}")
+        if quantization not in QUANTIZATION_KINDS:
+            raise ValueError(f"不支持的量化方式: {quantization}")
+        self.index_dir = index_dir
+        self.dtype = "float32" if quantization != "none" else dtype
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.build_hnsw = build_hnsw
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.offsets: List[int] = [0]
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._raw_path = os.path.join(index_dir, VECTORS_FILE + ".f32.tmp")
+        self._raw = open(self._raw_path, "wb")
+        self._chunks = open(os.path.join(index_dir, CHUNKS_FILE), "wb")
+
+    def add(self, vectors: Sequence[Sequence[float]], documents: Sequence[Document]):
+        """追加一批向量及其对应的文档"""
+        if len(vectors) != len(documents):
+            raise ValueError("向量数量与文档数量不一致")
+        if not len(vectors):
+            return
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"向量维度不一致: {matrix.shape[1]} != {self.dim}")
+        self._raw.write(matrix.tobytes())
+
+        for doc in documents:
+            line = json.dumps({"c": doc.page_content, "m": doc.metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+            self._chunks.write(line)
+            self.offsets.append(self.offsets[-1] + len(line))
+        self.count += len(documents)
+
+    def close(self, **meta: Any) -> Dict[str, Any]:
+        """完成写入，生成 .npy 矩阵、偏移表、可选的 HNSW 图以及索引元数据"""
+        self._raw.close()
+        self._chunks.close()
+        dim = self.dim or 0
+
+        vectors = np.lib.format.open_memmap(
+            os.path.join(self.index_dir, VECTORS_FILE), mode="w+", dtype=self.dtype, shape=(self.count, dim)
+        )
+        if self.count:
+            raw = np.memmap(self._raw_path, dtype=np.float32, mode="r", shape=(self.count, dim))
+            for start in range(0, self.count, BLOCK_ROWS):
+                vectors[start:start + BLOCK_ROWS] = raw[start:start + BLOCK_ROWS]
+            del raw
+        vectors.flush()
+        del vectors
+        os.remove(self._raw_path)
+
+        np.save(os.path.join(self.index_dir, OFFSETS_FILE), np.asarray(self.offsets, dtype=np.int64))
+
+        if self.quantization != "none" and self.count:
+            vectors = np.load(os.path.join(self.index_dir, VECTORS_FILE), mmap_mode="r")
+            QuantizedCodes.build(self.quantization, vectors).save(self.index_dir)
+            del vectors
+
+        hnsw_built = False
+        if self.build_hnsw and self.count:
+            if HNSW_AVAILABLE:
+                self._build_hnsw(dim)
+                hnsw_built = True
+            else:
+                logger.warning("未安装 hnswlib，跳过 HNSW 图构建")
+
+        index_meta = {
+            "format": "mmap",
+            "version": 1,
+            "count": self.count,
+            "dim": dim,
+            "dtype": self.dtype,
+            "metric": "cosine",
+            "hnsw": hnsw_built,
+            "quantization": self.quantization,
+            "rescore_factor": self.rescore_factor,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        index_meta.update(meta)
+        with open(os.path.join(self.index_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(index_meta, f, ensure_ascii=False, indent=2)
+        logger.info(f"mmap索引写入完成: {self.index_dir}, 共 {self.count} 条, 维度 {dim}")
+        return index_meta
+
+    def _build_hnsw(self, dim: int):
+        vectors = np.load(os.path.join(self.index_dir, VECTORS_FILE), mmap_mode="r")
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.init_index(max_elements=self.count, ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+        for start in range(0, self.count, BLOCK_ROWS):
+            chunk = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            graph.add_items(chunk, np.arange(start, start + len(chunk)))
+        graph.save_index(os.path.join(self.index_dir, HNSW_FILE))
+
+
+class MmapVectorIndex:
+    """
+    只读的内存映射向量索引
+
+    向量矩阵通过 np.load(mmap_mode="r") 打开，多个进程打开同一索引时共享操作系统页缓存；
+    查询时按块计算批量查询与矩阵的内积并合并 top-k。
+    """
+
+    # 已打开的索引缓存，同一进程内重复打开直接复用
+    _instances: Dict[str, "MmapVectorIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, index_dir: str, use_hnsw: bool = True, hnsw_ef: int = 64, block_rows: int = BLOCK_ROWS,
+                 rescore_factor: Optional[int] = None):
+        meta_path = os.path.join(index_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            raise ValueError(f"mmap索引不存在: {index_dir}")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+
+        self.index_dir = index_dir
+        self.block_rows = block_rows
+        self.count = self.meta["count"]
+        self.dim = self.meta["dim"]
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode="r")
+
+        self._chunks_file = open(os.path.join(index_dir, CHUNKS_FILE), "rb")
+        self._chunks = mmap.mmap(self._chunks_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+        # 量化编码常驻内存用于粗排，全精度向量只在精排时按候选读取
+        self.codes = None
+        self.quantization = self.meta.get("quantization", "none")
+        self.rescore_factor = rescore_factor or self.meta.get("rescore_factor", 4)
+        if self.quantization != "none" and self.count:
+            self.codes = QuantizedCodes.load(index_dir, self.quantization)
+
+        self.graph = None
+        if use_hnsw and self.meta.get("hnsw") and HNSW_AVAILABLE:
+            self.graph = hnswlib.Index(space="ip", dim=self.dim)
+            self.graph.load_index(os.path.join(index_dir, HNSW_FILE), max_elements=self.count)
+            self.graph.set_ef(hnsw_ef)
+
+    @classmethod
+    def open(cls, index_dir: str, **kwargs) -> "MmapVectorIndex":
+        """打开索引，同一目录在进程内只加载一次"""
+        key = os.path.abspath(index_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                start = time.perf_counter()
+                cls._instances[key] = cls(index_dir, **kwargs)
+                logger.info(f"mmap索引加载完成: {index_dir}, 耗时 {(time.perf_counter() - start) * 1000:.2f} ms")
+            return cls._instances[key]
+
+    @classmethod
+    def release(cls, index_dir: str):
+        """从进程缓存中移除索引（向量库切换到新版本后旧版本不再使用）"""
+        with cls._instances_lock:
+            cls._instances.pop(os.path.abspath(index_dir), None)
+
+    def _prepare_queries(self, embeddings) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"查询向量维度 {queries.shape[1]} 与索引维度 {self.dim} 不一致")
+        return _normalize(queries)
+
+    def search(self, embeddings, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量 top-k 检索
+        :param embeddings: 形状为 (n, dim) 的查询向量
+        :return: (scores, ids)，形状均为 (n, k)，按相似度降序
+        """
+        queries = self._prepare_queries(embeddings)
+        k = min(k, self.count)
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+        if self.graph is not None:
+            ids, distances = self.graph.knn_query(queries, k=k)
+            return (1.0 - distances).astype(np.float32), ids.astype(np.int64)
+        if self.codes is not None:
+            candidates = self.codes.shortlist(queries, k * self.rescore_factor, self.block_rows)
+            return rescore(self.vectors, queries, candidates, k)
+        return self._exact_search(queries, k)
+
+    def _exact_search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.count, self.block_rows):
+            block = np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32)
+            scores = queries @ block.T
+            kk = min(k, scores.shape[1])
+            idx = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, idx, axis=1)], axis=1)
+            best_ids = np.concatenate([best_ids, idx + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+    def get_document(self, chunk_id: int) -> Document:
+        """按编号读取切片文本和元数据"""
+        start, end = int(self.offsets[chunk_id]), int(self.offsets[chunk_id + 1])
+        record = json.loads(self._chunks[start:end])
+        return Document(page_content=record["c"], metadata=record["m"])
+
+    def similarity_search_by_vectors(self, embeddings, k: int = 5) -> List[List[Tuple[Document, float]]]:
+        """批量检索，返回每个查询的 (文档, 相似度) 列表"""
+        scores, ids = self.search(embeddings, k)
+        return [
+            [(self.get_document(int(i)), float(s)) for s, i in zip(row_scores, row_ids) if i >= 0]
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k: int = 5) -> List[Document]:
+        """与 Chroma 接口一致的单向量检索"""
+        return [doc for doc, _ in self.similarity_search_by_vectors([embedding], k)[0]]